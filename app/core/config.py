@@ -1,6 +1,11 @@
 import os
+import json
+import logging
 import secrets
+import threading
+import time
 from dotenv import load_dotenv
+from app.services.write_behind import atomic_write_json
 
 # Load environment variables from .env file if it exists
 load_dotenv()
@@ -18,35 +23,135 @@ UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.getcwd(), "tmp", "user_atta
 AGENT_BASE_DIR = os.getenv("AGENT_BASE_DIR", os.path.join(os.getcwd(), "data", "agents"))
 SKILLS_BASE_DIR = os.path.join(os.getcwd(), ".gemini", "skills")
 SETTINGS_FILE = os.path.join(os.getcwd(), "data", "settings.json")
+PANDOC_PROBE_CACHE = os.path.join(os.getcwd(), "tmp", "pandoc_probe.json")
+PATTERN_SYNC_STATE = os.path.join(os.getcwd(), "tmp", "pattern_sync.json")
+MESSAGE_INDEX_DIR = os.getenv("MESSAGE_INDEX_DIR", os.path.join(os.getcwd(), "tmp", "message_index"))
 MODEL_NAME = os.getenv("MODEL_NAME", "gemini-3-pro-preview")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "NONE").upper()
 GEMINI_CMD = os.getenv("GEMINI_CMD", "gemini")
 
-import json
-import logging
+# Warm CLI process pool (0 disables pre-spawning)
+CLI_POOL_SIZE = int(os.getenv("CLI_POOL_SIZE", "0"))
+CLI_POOL_MAX_IDLE = int(os.getenv("CLI_POOL_MAX_IDLE", "4"))
+CLI_POOL_IDLE_TTL = float(os.getenv("CLI_POOL_IDLE_TTL", "300"))
 
-def get_all_global_settings():
-    if os.path.exists(SETTINGS_FILE):
+# Sticky per-session CLI workers fed over stdin instead of --resume on every turn
+CLI_STICKY_WORKERS = os.getenv("CLI_STICKY_WORKERS", "false").lower() in ("1", "true", "yes")
+CLI_STICKY_MEMORY_MB = int(os.getenv("CLI_STICKY_MEMORY_MB", "512"))
+CLI_STICKY_ARGS = os.getenv("CLI_STICKY_ARGS", "--input-format stream-json")
+
+# Storage of per-user session metadata: "json" (user_sessions.json) or "sqlite" (user_sessions.db)
+SESSION_STORE = os.getenv("SESSION_STORE", "json").lower()
+
+# Write-behind persistence of session metadata (seconds)
+USER_DATA_WRITE_DELAY = float(os.getenv("USER_DATA_WRITE_DELAY", "0.5"))
+USER_DATA_MAX_DELAY = float(os.getenv("USER_DATA_MAX_DELAY", "5"))
+
+# Attachments converted to markdown (DOCX/XLSX) at the same time, off the event loop
+UPLOAD_CONVERSION_WORKERS = int(os.getenv("UPLOAD_CONVERSION_WORKERS", "2"))
+
+# Spreadsheet attachments: rows/columns per sheet put in the markdown (0 = no limit); the rest is summarized
+XLSX_MAX_ROWS = int(os.getenv("XLSX_MAX_ROWS", "500"))
+XLSX_MAX_COLS = int(os.getenv("XLSX_MAX_COLS", "30"))
+
+# Content-addressed store behind UPLOAD_DIR (must be on the same filesystem for hard links)
+ATTACHMENT_STORE_DIR = os.getenv("ATTACHMENT_STORE_DIR", os.path.join(UPLOAD_DIR, ".cas"))
+# Unreferenced blobs are kept this long (seconds); gc runs every ATTACHMENT_GC_INTERVAL seconds (0 disables it)
+ATTACHMENT_GC_GRACE = float(os.getenv("ATTACHMENT_GC_GRACE", "3600"))
+ATTACHMENT_GC_INTERVAL = float(os.getenv("ATTACHMENT_GC_INTERVAL", "3600"))
+
+# Ghostscript compression of uploaded PDFs: concurrent runs, per-run timeout (seconds),
+# and files left alone because compressing them is not worth it (0 disables a limit)
+PDF_COMPRESS_WORKERS = int(os.getenv("PDF_COMPRESS_WORKERS", "1"))
+PDF_COMPRESS_TIMEOUT = float(os.getenv("PDF_COMPRESS_TIMEOUT", "120"))
+PDF_COMPRESS_MIN_KB = int(os.getenv("PDF_COMPRESS_MIN_KB", "64"))
+PDF_COMPRESS_MAX_PAGES = int(os.getenv("PDF_COMPRESS_MAX_PAGES", "500"))
+
+# Password hashing and passkey/wallet signature checks run in their own thread pool (0 = one thread per core);
+# a client with this many checks in flight gets 429 for the next one (0 disables the limit)
+AUTH_CRYPTO_WORKERS = int(os.getenv("AUTH_CRYPTO_WORKERS", "0"))
+AUTH_MAX_CONCURRENT_PER_IP = int(os.getenv("AUTH_MAX_CONCURRENT_PER_IP", "2"))
+# Take the client address from X-Forwarded-For (only behind a reverse proxy that sets it)
+AUTH_TRUST_FORWARDED_FOR = os.getenv("AUTH_TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes")
+
+# Batched writes of users.json for bookkeeping-only changes (passkey sign counts, pattern fingerprints), in seconds;
+# account changes are still written at once
+USERS_WRITE_DELAY = float(os.getenv("USERS_WRITE_DELAY", "1"))
+USERS_MAX_DELAY = float(os.getenv("USERS_MAX_DELAY", "10"))
+
+# Fabric pattern sync: requests to GitHub in flight at once, and retries of a failed request (with jittered backoff)
+PATTERN_SYNC_CONCURRENCY = int(os.getenv("PATTERN_SYNC_CONCURRENCY", "8"))
+PATTERN_SYNC_RETRIES = int(os.getenv("PATTERN_SYNC_RETRIES", "3"))
+
+# Global settings are parsed once and served from memory. The file's (mtime, size, inode) is
+# compared at most every SETTINGS_RECHECK_SECONDS, so an edit made outside the app is picked up;
+# writes through update_global_settings refresh the cache directly and bump the version.
+SETTINGS_RECHECK_SECONDS = float(os.getenv("SETTINGS_RECHECK_SECONDS", "1"))
+_settings_lock = threading.Lock()
+_settings_cache = {"path": None, "stamp": None, "checked": 0.0, "data": {}}
+_settings_stats = {"version": 0, "loads": 0, "hits": 0, "writes": 0}
+
+def _settings_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _read_settings(path):
+    if os.path.exists(path):
         try:
-            with open(SETTINGS_FILE, "r") as f:
+            with open(path, "r") as f:
                 return json.load(f)
         except Exception as e:
             logging.error(f"Error loading settings: {e}")
     return {}
 
+def _cached_settings():
+    """The parsed settings dict shared by all readers; callers must not change it."""
+    cache = _settings_cache
+    now = time.monotonic()
+    if cache["path"] == SETTINGS_FILE and now - cache["checked"] < SETTINGS_RECHECK_SECONDS:
+        _settings_stats["hits"] += 1
+        return cache["data"]
+    with _settings_lock:
+        stamp = _settings_stamp(SETTINGS_FILE)
+        if cache["path"] != SETTINGS_FILE or stamp != cache["stamp"]:
+            cache["data"] = _read_settings(SETTINGS_FILE)
+            cache["path"], cache["stamp"] = SETTINGS_FILE, stamp
+            _settings_stats["loads"] += 1
+            _settings_stats["version"] += 1
+        else:
+            _settings_stats["hits"] += 1
+        cache["checked"] = now
+        return cache["data"]
+
+def get_all_global_settings():
+    return dict(_cached_settings())
+
 def get_global_setting(key: str, default=None):
-    settings = get_all_global_settings()
-    return settings.get(key, default)
+    return _cached_settings().get(key, default)
+
+def update_global_settings(updates: dict):
+    """Applies several settings with one atomic write of the file."""
+    with _settings_lock:
+        settings = _read_settings(SETTINGS_FILE) # edits made outside the app since the last read are kept
+        settings.update(updates)
+        try:
+            atomic_write_json(SETTINGS_FILE, settings, indent=4)
+        except Exception as e:
+            logging.error(f"Error saving settings: {e}")
+            _settings_cache["path"] = None # reread on next use
+            return
+        _settings_cache.update(path=SETTINGS_FILE, stamp=_settings_stamp(SETTINGS_FILE), checked=time.monotonic(), data=settings)
+        _settings_stats["writes"] += 1
+        _settings_stats["version"] += 1
 
 def update_global_setting(key: str, value: str):
-    settings = get_all_global_settings()
-    settings[key] = value
-    try:
-        os.makedirs(os.path.dirname(SETTINGS_FILE), exist_ok=True)
-        with open(SETTINGS_FILE, "w") as f:
-            json.dump(settings, f, indent=4)
-    except Exception as e:
-        logging.error(f"Error saving settings: {e}")
+    update_global_settings({key: value})
+
+def get_settings_metrics():
+    return {"recheck_seconds": SETTINGS_RECHECK_SECONDS, **_settings_stats}
 
 def update_env(key: str, value: str):
     env_path = os.path.join(os.getcwd(), ".env")
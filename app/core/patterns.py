@@ -1,28 +1,253 @@
 import json
+import mmap
 import os
 import logging
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.services.write_behind import atomic_write
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 PATTERNS_FILE = os.path.join(os.path.dirname(__file__), "../../data/patterns.json")
 
-def load_patterns():
-    if os.path.exists(PATTERNS_FILE):
+EXPLANATIONS_KEY = "__explanations__"
+
+_WHITESPACE = b" \t\r\n"
+
+def _skip_ws_bytes(buf, i: int) -> int:
+    while i < len(buf) and buf[i] in _WHITESPACE:
+        i += 1
+    return i
+
+def _string_end(buf, start: int) -> int:
+    """Index just past the JSON string whose opening quote is at start."""
+    i = start + 1
+    while True:
+        quote = buf.find(b'"', i)
+        if quote < 0:
+            raise ValueError("unterminated string")
+        backslashes = 0
+        while buf[quote - 1 - backslashes] == 0x5C:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return quote + 1
+        i = quote + 1
+
+def scan_string_object(buf) -> Dict[str, Tuple[int, int]]:
+    """
+    Byte ranges of the values of a flat JSON object of strings, without decoding
+    them. Raises ValueError if buf is anything else.
+    """
+    def expect(i, char):
+        if i >= len(buf) or buf[i] != ord(char):
+            raise ValueError(f"expected {char!r} at byte {i}")
+    offsets = {}
+    i = _skip_ws_bytes(buf, 0)
+    expect(i, "{")
+    i = _skip_ws_bytes(buf, i + 1)
+    if i < len(buf) and buf[i] == ord("}"):
+        return offsets
+    while True:
+        expect(i, '"')
+        key_end = _string_end(buf, i)
+        key = json.loads(buf[i:key_end])
+        i = _skip_ws_bytes(buf, key_end)
+        expect(i, ":")
+        i = _skip_ws_bytes(buf, i + 1)
+        expect(i, '"')
+        value_end = _string_end(buf, i)
+        offsets[key] = (i, value_end)
+        i = _skip_ws_bytes(buf, value_end)
+        if i < len(buf) and buf[i] == ord(","):
+            i = _skip_ws_bytes(buf, i + 1)
+            continue
+        expect(i, "}")
+        return offsets
+
+def parse_explanations(text: str) -> List[Dict[str, str]]:
+    """The numbered "**name**: description" lines sync_all writes, in order."""
+    res = []
+    for line in text.splitlines():
+        m = re.match(r"^\d+\.\s+\*\*(?P<name>.*?)\*\*: (?P<description>.*)", line.strip())
+        if m:
+            res.append(m.groupdict())
+        elif "suggest_pattern" in line:
+            m = re.search(r"\*\*(?P<name>suggest_pattern)\*\*, (?P<description>.*)", line)
+            if m:
+                res.append(m.groupdict())
+    return res
+
+class _PatternIndex:
+    """One loaded version of the patterns file: the file's bytes plus where each body is."""
+    def __init__(self, path: str):
+        self.buf: Any = b""
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+        self.decoded: Dict[str, str] = {}
+        self.cache: "OrderedDict[str, str]" = OrderedDict()
+        self.names: List[str] = []
+        self.descriptions: Optional[List[Dict[str, str]]] = None
+        if not os.path.exists(path):
+            logger.warning(f"Patterns file {path} not found.")
+            return
         try:
-            with open(PATTERNS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(path, "rb") as f:
+                if os.name == "nt" or os.fstat(f.fileno()).st_size == 0:
+                    # A mapped file cannot be replaced on Windows, which would block pattern sync
+                    self.buf = f.read()
+                else:
+                    self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self.offsets = scan_string_object(self.buf)
+            except ValueError as e:
+                logger.warning(f"{path} is not a flat object of strings ({e}); loading it whole")
+                self.decoded = {k: v for k, v in json.loads(bytes(self.buf)).items() if isinstance(v, str)}
         except Exception as e:
-            logger.error(f"Error loading patterns from {PATTERNS_FILE}: {e}")
-            return {}
-    else:
-        logger.warning(f"Patterns file {PATTERNS_FILE} not found.")
-        return {}
+            logger.error(f"Error loading patterns from {path}: {e}")
+            self.offsets, self.decoded = {}, {}
+        self.names = sorted(k for k in (*self.offsets, *self.decoded) if k != EXPLANATIONS_KEY)
+
+    def read(self, name: str) -> Optional[str]:
+        if name in self.decoded:
+            return self.decoded[name]
+        span = self.offsets.get(name)
+        if span is None:
+            return None
+        return json.loads(self.buf[span[0]:span[1]])
+
+class PatternStore(Mapping):
+    """
+    Read-only view of data/patterns.json that keeps only pattern names in memory.
+
+    The file is memory-mapped and scanned once for the byte range of every
+    pattern; a body is decoded when it is asked for and the most recently used
+    ones are kept in an LRU cache. reload() indexes the file again and swaps the
+    new index in with a single assignment, so readers see either the old
+    patterns or the new ones, never a mix. The mapping keeps the old file's
+    content alive, which is why the file must be replaced (os.replace, as
+    publish() does) rather than rewritten in place. Nothing is read until the
+    first lookup.
+    """
+    def __init__(self, path: str, cache_size: int = 32):
+        self.path = path
+        self.cache_size = cache_size
+        self._index: Optional[_PatternIndex] = None
+        # Bumped by every reload, so derived data (the /patterns catalog) knows when it is stale
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.counters = {"loads": 0, "cache_hits": 0, "decodes": 0}
+
+    def _current(self) -> _PatternIndex:
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = _PatternIndex(self.path)
+                    self.counters["loads"] += 1
+                index = self._index
+        return index
+
+    def reload(self) -> "PatternStore":
+        index = _PatternIndex(self.path)
+        with self._lock:
+            self._index = index
+            self.generation += 1
+            self.counters["loads"] += 1
+        return self
+
+    def names(self) -> List[str]:
+        return list(self._current().names)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        index = self._current()
+        with self._lock:
+            body = index.cache.get(name)
+            if body is not None:
+                index.cache.move_to_end(name)
+                self.counters["cache_hits"] += 1
+                return body
+        body = index.read(name)
+        if body is None:
+            return default
+        self.counters["decodes"] += 1
+        if name != EXPLANATIONS_KEY:
+            with self._lock:
+                index.cache[name] = body
+                index.cache.move_to_end(name)
+                while len(index.cache) > self.cache_size:
+                    index.cache.popitem(last=False)
+        return body
+
+    def read(self, name: str) -> Optional[str]:
+        """Decodes a body without going through (or filling) the cache, for bulk reads."""
+        return self._current().read(name)
+
+    def raw(self, name: str) -> Optional[bytes]:
+        """The body's JSON string literal exactly as stored in the file (None if the file was not scanned)."""
+        index = self._current()
+        span = index.offsets.get(name)
+        return bytes(index.buf[span[0]:span[1]]) if span else None
+
+    def publish(self, bodies: Dict[str, Optional[str]]) -> Dict[str, int]:
+        """
+        Replaces the file with exactly these patterns, in this order, and reloads.
+        A None body keeps the pattern's stored text, copied from the current file
+        without decoding it. The new file is written next to the old one and moved
+        over it, so a reader sees the old catalog until the index swap.
+        """
+        written, reused = 0, 0
+        with atomic_write(self.path, "wb") as f:
+            f.write(b"{")
+            for i, (name, body) in enumerate(bodies.items()):
+                literal = self.raw(name) if body is None else None
+                if literal is None:
+                    literal = json.dumps(self.read(name) if body is None else body).encode("ascii")
+                    written += len(literal)
+                else:
+                    reused += len(literal)
+                f.write(b"\n    " + json.dumps(name).encode("ascii") + b": " + literal + (b"," if i < len(bodies) - 1 else b""))
+            f.write(b"\n}")
+        self.reload()
+        return {"bytes_encoded": written, "bytes_reused": reused}
+
+    def descriptions(self) -> List[Dict[str, str]]:
+        """Name and description of every pattern, from the explanations entry."""
+        index = self._current()
+        if index.descriptions is None:
+            index.descriptions = parse_explanations(index.read(EXPLANATIONS_KEY) or "")
+        return index.descriptions
+
+    def __getitem__(self, name: str) -> str:
+        body = self.get(name)
+        if body is None:
+            raise KeyError(name)
+        return body
+
+    def __contains__(self, name: object) -> bool:
+        index = self._current()
+        return name in index.offsets or name in index.decoded
+
+    def __iter__(self) -> Iterator[str]:
+        index = self._current()
+        return iter([*index.offsets, *index.decoded])
+
+    def __len__(self) -> int:
+        index = self._current()
+        return len(index.offsets) + len(index.decoded)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            "patterns": len(index.names) if index else None,
+            "cached": len(index.cache) if index else 0,
+            "mapped_bytes": len(index.buf) if index else 0,
+            **self.counters
+        }
 
-PATTERNS = load_patterns()
+PATTERNS = PatternStore(PATTERNS_FILE)
 
 def reload_patterns():
-    global PATTERNS
-    PATTERNS.clear()
-    PATTERNS.update(load_patterns())
-    return PATTERNS
+    return PATTERNS.reload()
@@ -0,0 +1,47 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from starlette.datastructures import State
+
+class ServiceRegistry(State):
+    """
+    app.state whose services are built on first access.
+
+    register(name, factory) makes `app.state.<name>` call factory() the first time
+    it is read; factories import their service module themselves, so neither the
+    module nor its dependencies are loaded before something needs them. Values
+    assigned directly (app.state.x = ...) behave as with a plain State.
+    """
+    def __init__(self):
+        super().__init__()
+        object.__setattr__(self, "_factories", {})
+        object.__setattr__(self, "_load_ms", {})
+        object.__setattr__(self, "_lock", threading.RLock())
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def loaded(self, name: str) -> bool:
+        return name in self._state
+
+    def __getattr__(self, key: Any) -> Any:
+        try:
+            return self._state[key]
+        except KeyError:
+            pass
+        factory = self._factories.get(key)
+        if factory is None:
+            raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{key}'")
+        with self._lock:
+            if key not in self._state:
+                start = time.perf_counter()
+                self._state[key] = factory()
+                self._load_ms[key] = round((time.perf_counter() - start) * 1000, 1)
+        return self._state[key]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            name: {"loaded": name in self._state, "load_ms": self._load_ms.get(name)}
+            for name in self._factories
+        }
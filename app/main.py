@@ -2,6 +2,7 @@ import os
 import sys
 import asyncio
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, Request
 
 # Set Windows Event Loop Policy for subprocess support
@@ -12,17 +13,19 @@ if sys.platform == 'win32':
 mimetypes.add_type('image/webp', '.webp')
 
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import URL, Headers
 from jinja2 import Environment, FileSystemLoader
 from app.core import config
+from app.core.registry import ServiceRegistry
+from app.services.crypto_executor import AuthRateLimited, CryptoExecutor
 from app.services.user_manager import UserManager
-from app.services.auth_service import AuthService
 from app.services.llm_service import GeminiAgent
-from app.services.conversion_service import FileConversionService
-from app.services.pdf_service import PDFService
+from app.services.attachment_store import AttachmentStore
 from app.services.agent_manager import AgentManager
+from app.services.pattern_catalog import PatternCatalog
+from app.core.patterns import PATTERNS
 from app.routers import auth, chat, admin
 
 from contextlib import asynccontextmanager
@@ -39,7 +42,19 @@ async def lifespan(app: FastAPI):
             print(f"WARNING: Running on {type(loop).__name__}, but ProactorEventLoop is required for subprocesses.")
         else:
             print("INFO: ProactorEventLoop is active.")
+    gc_task = None
+    if config.ATTACHMENT_GC_INTERVAL > 0:
+        gc_task = asyncio.create_task(app.state.attachment_store.gc_loop(config.ATTACHMENT_GC_INTERVAL))
     yield
+    if gc_task:
+        gc_task.cancel()
+    await app.state.agent.process_pool.close()
+    await app.state.agent.session_workers.close()
+    await app.state.agent.session_store.aclose()
+    await app.state.agent.search_index.aclose()
+    await app.state.user_manager.aclose()
+    app.state.conversion_executor.shutdown(wait=False)
+    app.state.crypto_executor.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -55,43 +70,76 @@ app.add_middleware(
 )
 
 # Security Headers Middleware
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
+# Both middlewares below are plain ASGI: they look at the scope and the response
+# start message only, so streamed bodies (the /chat SSE stream) pass straight through
+class SecurityHeadersMiddleware:
+    CSP = (
+        "default-src 'self'; "
+        "script-src 'self' 'unsafe-inline' 'unsafe-eval' cdn.jsdelivr.net cdnjs.cloudflare.com; "
+        "style-src 'self' 'unsafe-inline' cdn.jsdelivr.net cdnjs.cloudflare.com; "
+        "font-src 'self' cdn.jsdelivr.net; "
+        "img-src 'self' data: blob:; "
+        "connect-src 'self' cdn.jsdelivr.net;"
+    )
+
+    def __init__(self, app, https_only: bool = False):
+        self.app = app
+        headers = [
+            (b"x-content-type-options", b"nosniff"),
+            (b"x-frame-options", b"DENY"),
+            (b"x-xss-protection", b"1; mode=block"),
+        ]
         if https_only:
-            response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        
-        # Content Security Policy
-        csp = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' 'unsafe-eval' cdn.jsdelivr.net cdnjs.cloudflare.com; "
-            "style-src 'self' 'unsafe-inline' cdn.jsdelivr.net cdnjs.cloudflare.com; "
-            "font-src 'self' cdn.jsdelivr.net; "
-            "img-src 'self' data: blob:; "
-            "connect-src 'self' cdn.jsdelivr.net;"
-        )
-        response.headers["Content-Security-Policy"] = csp
-        return response
-
-app.add_middleware(SecurityHeadersMiddleware)
+            headers.append((b"strict-transport-security", b"max-age=31536000; includeSubDomains"))
+        headers.append((b"content-security-policy", self.CSP.encode("latin-1")))
+        self.headers = headers
+        self.names = {name for name, _ in headers}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # Replaces any the handler set, as assigning response.headers[...] did
+                message["headers"] = [(k, v) for k, v in message.get("headers", ()) if k.lower() not in self.names] + self.headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+app.add_middleware(SecurityHeadersMiddleware, https_only=https_only)
 
 # Dynamic Auth Middleware to handle LAN/External access
-class DynamicAuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if not config.ORIGIN or "localhost" in config.ORIGIN:
-            proto = request.headers.get("x-forwarded-proto", request.url.scheme)
-            host = request.headers.get("x-forwarded-host", request.url.netloc)
-            current_origin = f"{proto}://{host}"
-            current_rp_id = host.split(":")[0]
-            request.app.state.auth_service.origin = current_origin
-            request.app.state.auth_service.rp_id = current_rp_id
-        return await call_next(request)
+class DynamicAuthMiddleware:
+    """
+    Puts the WebAuthn origin and rp_id of the request in its state
+    (webauthn_origin, webauthn_rp_id). Without ORIGIN, or with a localhost one,
+    they follow the host the browser used, so passkeys work over the LAN or a
+    proxy; otherwise they are the configured ones.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            state = scope.setdefault("state", {})
+            if not config.ORIGIN or "localhost" in config.ORIGIN:
+                headers = Headers(scope=scope)
+                proto = headers.get("x-forwarded-proto") or scope.get("scheme", "http")
+                host = headers.get("x-forwarded-host") or URL(scope=scope).netloc
+                state["webauthn_origin"] = f"{proto}://{host}"
+                state["webauthn_rp_id"] = host.split(":")[0]
+            else:
+                state["webauthn_origin"] = config.ORIGIN
+                state["webauthn_rp_id"] = config.RP_ID or "localhost"
+        await self.app(scope, receive, send)
 
 app.add_middleware(DynamicAuthMiddleware)
 
+@app.exception_handler(AuthRateLimited)
+async def auth_rate_limited(request: Request, exc: AuthRateLimited):
+    return PlainTextResponse("Too many login attempts in progress, try again shortly.", status_code=429, headers={"Retry-After": str(exc.retry_after)})
+
 
 # UPLOAD_DIR
 UPLOAD_DIR = config.UPLOAD_DIR
@@ -106,21 +154,53 @@ def render(name, **ctx):
     return HTMLResponse(template.render(**ctx))
 
 # Services
-user_manager = UserManager()
-auth_service = AuthService(config.RP_ID or "localhost", config.RP_NAME, config.ORIGIN or "http://localhost:8000")
+# Services that are not needed to serve the first request are built, and their
+# modules imported, when a request first uses them
+app.state = ServiceRegistry()
+
+def build_auth_service():
+    from app.services.auth_service import AuthService
+    return AuthService(config.RP_ID or "localhost", config.RP_NAME, config.ORIGIN or "http://localhost:8000")
+
+def build_conversion_service():
+    from app.services.conversion_service import FileConversionService
+    return FileConversionService()
+
+def build_pdf_service():
+    from app.services.pdf_service import PDFService
+    return PDFService(
+        max_workers=config.PDF_COMPRESS_WORKERS,
+        timeout=config.PDF_COMPRESS_TIMEOUT,
+        min_bytes=config.PDF_COMPRESS_MIN_KB * 1024,
+        max_pages=config.PDF_COMPRESS_MAX_PAGES
+    )
+
+def build_pattern_sync():
+    from app.services.pattern_sync_service import PatternSyncService
+    return PatternSyncService(catalog=app.state.pattern_catalog)
+
+crypto_executor = CryptoExecutor()
+user_manager = UserManager(crypto=crypto_executor)
 agent = GeminiAgent()
-conversion_service = FileConversionService()
-pdf_service = PDFService()
+conversion_executor = ThreadPoolExecutor(max_workers=config.UPLOAD_CONVERSION_WORKERS, thread_name_prefix="upload-convert")
+attachment_store = AttachmentStore(config.ATTACHMENT_STORE_DIR, gc_grace=config.ATTACHMENT_GC_GRACE)
+# Writes the default agents to disk, which the CLI may read before any admin request
 agent_manager = AgentManager()
 agent_manager.initialize_defaults()
+pattern_catalog = PatternCatalog(PATTERNS, os.path.join(agent.working_dir, "prompts"))
 
 # App State
+app.state.register("auth_service", build_auth_service)
+app.state.register("conversion_service", build_conversion_service)
+app.state.register("pdf_service", build_pdf_service)
+app.state.register("pattern_sync", build_pattern_sync)
+app.state.crypto_executor = crypto_executor
 app.state.user_manager = user_manager
-app.state.auth_service = auth_service
 app.state.agent = agent
-app.state.conversion_service = conversion_service
-app.state.pdf_service = pdf_service
+app.state.conversion_executor = conversion_executor
+app.state.attachment_store = attachment_store
 app.state.agent_manager = agent_manager
+app.state.pattern_catalog = pattern_catalog
 app.state.render = render
 app.state.UPLOAD_DIR = UPLOAD_DIR
 
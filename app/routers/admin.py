@@ -8,7 +8,8 @@ import re
 import shutil
 import os
 from app.core import config
-from app.services.pattern_sync_service import PatternSyncService
+from app.core.patterns import PATTERNS
+from app.services.crypto_executor import client_address
 from app.models.agent import AgentModel
 
 router = APIRouter()
@@ -190,14 +191,19 @@ async def sync_patterns(request: Request, user=Depends(get_user)):
     if user_manager.get_role(user) != "admin":
         raise HTTPException(status_code=403, detail="Forbidden")
     
-    sync_service = PatternSyncService()
     try:
-        count = await sync_service.sync_all()
+        count = await request.app.state.pattern_sync.sync_all()
         return {"success": True, "count": count}
     except Exception as e:
         return {"success": False, "error": str(e)}
-    finally:
-        await sync_service.close()
+
+@router.get("/admin/patterns/sync")
+async def sync_patterns_status(request: Request, user=Depends(get_user)):
+    user_manager = request.app.state.user_manager
+    if user_manager.get_role(user) != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+    sync_service = request.app.state.pattern_sync
+    return {**sync_service.progress, "last_sync": sync_service.last_sync}
 
 @router.post("/admin/system/restart-setup")
 async def restart_setup(request: Request, user=Depends(get_user)):
@@ -251,10 +257,33 @@ async def update_settings(request: Request, user=Depends(get_user)):
         raise HTTPException(status_code=403, detail="Forbidden")
     
     data = await request.json()
-    for key, value in data.items():
-        config.update_global_setting(key, value)
+    config.update_global_settings(data)
     return {"success": True}
 
+@router.get("/admin/metrics")
+async def get_metrics(request: Request, user=Depends(get_user)):
+    user_manager = request.app.state.user_manager
+    if user_manager.get_role(user) != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+    agent = request.app.state.agent
+    return {
+        "cli_pool": agent.process_pool.get_metrics(),
+        "session_workers": agent.session_workers.get_metrics(),
+        "session_store": agent.session_store.get_metrics(),
+        "session_index": agent.session_index.get_metrics(),
+        "message_index": agent.message_index.get_metrics(),
+        "search_index": agent.search_index.get_metrics(),
+        "attachment_store": request.app.state.attachment_store.get_metrics(),
+        "pdf_compression": request.app.state.pdf_service.get_metrics(),
+        "patterns": PATTERNS.get_metrics(),
+        "pattern_catalog": request.app.state.pattern_catalog.get_metrics(),
+        "pattern_sync": request.app.state.pattern_sync.get_metrics(),
+        "auth_crypto": request.app.state.crypto_executor.get_metrics(),
+        "users": request.app.state.user_manager.get_metrics(),
+        "settings": config.get_settings_metrics(),
+        "services": request.app.state.get_metrics()
+    }
+
 @router.get("/admin", response_class=HTMLResponse)
 async def admin_db(request: Request, user=Depends(get_user)):
     user_manager = request.app.state.user_manager
@@ -264,7 +293,7 @@ async def admin_db(request: Request, user=Depends(get_user)):
 @router.post("/admin/user/add")
 async def adm_add(request: Request, username: str = Form(...), password: str = Form(...), role: str = Form(...), user=Depends(get_user)):
     user_manager = request.app.state.user_manager
-    if user_manager.get_role(user) == "admin": user_manager.register_user(username, password, role=role)
+    if user_manager.get_role(user) == "admin": await user_manager.register_user_async(username, password, role=role, client=client_address(request))
     return RedirectResponse("/admin", status_code=303)
 
 @router.post("/admin/user/remove")
@@ -295,7 +324,7 @@ async def adm_tog_role(request: Request, username: str = Form(...), role: str =
 @router.post("/admin/user/update-password")
 async def adm_upd(request: Request, username: str = Form(...), new_password: str = Form(...), user=Depends(get_user)):
     user_manager = request.app.state.user_manager
-    if user_manager.get_role(user) == "admin": user_manager.update_password(username, new_password)
+    if user_manager.get_role(user) == "admin": await user_manager.update_password_async(username, new_password, client=client_address(request))
     return RedirectResponse("/admin", status_code=303)
 
 # Agent Management Routes
@@ -1,15 +1,26 @@
 from fastapi import APIRouter, Request, Form, Depends, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
 from typing import Optional
+import functools
 import secrets
-from eth_account import Account
-from eth_account.messages import encode_defunct
+from app.services.crypto_executor import AuthRateLimited, client_address
 
 # We will import the global instances from main later, or use dependencies.
 # For now, we assume they are accessible via request.app.state.
 
 router = APIRouter()
 
+def recover_wallet_address(message: str, signature: str) -> str:
+    # eth_account takes about a second to import, so only the wallet routes load it
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+    return Account.recover_message(encode_defunct(text=message), signature=signature)
+
+def webauthn_target(request: Request) -> dict:
+    """rp_id and origin of this request's WebAuthn ceremony, as DynamicAuthMiddleware resolved them."""
+    state = request.scope.get("state") or {}
+    return {"rp_id": state.get("webauthn_rp_id"), "origin": state.get("webauthn_origin")}
+
 @router.get("/setup", response_class=HTMLResponse)
 async def setup_pg(request: Request):
     user_manager = request.app.state.user_manager
@@ -32,7 +43,7 @@ async def setup(request: Request, password: str = Form(...), origin: str = Form(
     config.ORIGIN = origin
     config.RP_ID = rp_id
     
-    user_manager.register_user("admin", password, role="admin")
+    await user_manager.register_user_async("admin", password, role="admin", client=client_address(request))
     return RedirectResponse("/login", status_code=303)
 
 @router.get("/login", response_class=HTMLResponse)
@@ -42,7 +53,7 @@ async def login_pg(request: Request):
 @router.post("/login")
 async def login(request: Request, username: str = Form(...), password: str = Form(...)):
     user_manager = request.app.state.user_manager
-    if user_manager.authenticate_user(username, password):
+    if await user_manager.authenticate_user_async(username, password, client=client_address(request)):
         request.session["user"] = username
         # Use absolute URL for redirect to avoid potential issues with Service Worker or proxies
         return RedirectResponse(str(request.url_for("index")), status_code=303)
@@ -51,8 +62,9 @@ async def login(request: Request, username: str = Form(...), password: str = For
 @router.post("/login/pattern")
 async def login_pat(request: Request, pattern: str = Form(...), username: Optional[str] = Form(None)):
     user_manager = request.app.state.user_manager
-    u = username if username else user_manager.get_user_by_pattern(pattern)
-    if u and (not username or user_manager.authenticate_with_pattern(u, pattern)):
+    client = client_address(request)
+    u = username if username else await user_manager.get_user_by_pattern_async(pattern, client=client)
+    if u and (not username or await user_manager.authenticate_with_pattern_async(u, pattern, client=client)):
         request.session["user"] = u
         # Use absolute URL for redirect to avoid potential issues with Service Worker or proxies
         return RedirectResponse(str(request.url_for("index")), status_code=303)
@@ -75,11 +87,13 @@ async def w3_vf(request: Request, address: str = Form(...), signature: str = For
     c = request.session.get("web3_challenge")
     if not c: return {"success": False}
     try: 
-        if Account.recover_message(encode_defunct(text=c), signature=signature).lower() == address.lower():
+        recovered = await request.app.state.crypto_executor.run("wallet_recover", recover_wallet_address, c, signature, client=client_address(request))
+        if recovered.lower() == address.lower():
             u = user_manager.get_user_by_wallet(address)
             if u:
                 request.session["user"] = u
                 return {"success": True}
+    except AuthRateLimited: raise
     except: pass
     return {"success": False}
 
@@ -87,7 +101,7 @@ async def w3_vf(request: Request, address: str = Form(...), signature: str = For
 async def upd_pat(request: Request, pattern: str = Form(...)):
     user_manager = request.app.state.user_manager
     user = request.session.get("user")
-    if user: return {"success": user_manager.set_pattern(user, pattern)}
+    if user: return {"success": await user_manager.set_pattern_async(user, pattern, client=client_address(request))}
     return {"success": False}
 
 @router.post("/user/link-wallet")
@@ -97,9 +111,11 @@ async def lnk_w3(request: Request, address: str = Form(...), signature: str = Fo
     c = request.session.get("web3_challenge")
     if not (user and c): return {"success": False}
     try:
-        if Account.recover_message(encode_defunct(text=c), signature=signature).lower() == address.lower():
+        recovered = await request.app.state.crypto_executor.run("wallet_recover", recover_wallet_address, c, signature, client=client_address(request))
+        if recovered.lower() == address.lower():
             user_manager.set_wallet_address(user, address)
             return {"success": True}
+    except AuthRateLimited: raise
     except: pass
     return {"success": False}
 
@@ -108,7 +124,7 @@ async def pk_reg_opt(request: Request):
     auth_service = request.app.state.auth_service
     user = request.session.get("user")
     if not user: raise HTTPException(401)
-    opts = auth_service.generate_registration_options(user, user)
+    opts = auth_service.generate_registration_options(user, user, rp_id=webauthn_target(request)["rp_id"])
     request.session["registration_challenge"] = auth_service.bytes_to_base64url(opts.challenge)
     return HTMLResponse(auth_service.options_to_json(opts), media_type="application/json")
 
@@ -120,9 +136,11 @@ async def pk_reg_vf(request: Request, data: dict):
     c = request.session.get("registration_challenge")
     if not (user and c): return {"success": False}
     try:
-        v = auth_service.verify_registration_response(data, c)
+        verify = functools.partial(auth_service.verify_registration_response, **webauthn_target(request))
+        v = await request.app.state.crypto_executor.run("passkey_register", verify, data, c, client=client_address(request))
         user_manager.add_passkey(user, v.credential_id, v.credential_public_key, v.sign_count)
         return {"success": True}
+    except AuthRateLimited: raise
     except: return {"success": False}
 
 @router.post("/login/passkey/options")
@@ -130,7 +148,7 @@ async def pk_log_opt(request: Request, username: Optional[str] = Form(None)):
     user_manager = request.app.state.user_manager
     auth_service = request.app.state.auth_service
     credential_ids = [pk["credential_id"] for pk in user_manager.get_passkeys(username)] if username else []
-    opts = auth_service.generate_authentication_options(credential_ids)
+    opts = auth_service.generate_authentication_options(credential_ids, rp_id=webauthn_target(request)["rp_id"])
     request.session["authentication_challenge"] = auth_service.bytes_to_base64url(opts.challenge)
     if username: request.session["authentication_username"] = username
     return HTMLResponse(auth_service.options_to_json(opts), media_type="application/json")
@@ -147,8 +165,10 @@ async def pk_log_vf(request: Request, data: dict):
     else: pk = next((p for p in user_manager.get_passkeys(u) if p["credential_id"] == cid), None)
     if not (u and pk): return {"success": False}
     try:
-        v = auth_service.verify_authentication_response(data, c, pk["public_key"], pk["sign_count"])
+        verify = functools.partial(auth_service.verify_authentication_response, **webauthn_target(request))
+        v = await request.app.state.crypto_executor.run("passkey_verify", verify, data, c, pk["public_key"], pk["sign_count"], client=client_address(request))
         user_manager.update_passkey_sign_count(u, cid, v.new_sign_count)
         request.session["user"] = u
         return {"success": True}
+    except AuthRateLimited: raise
     except: return {"success": False}
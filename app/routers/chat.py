@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Request, Form, UploadFile, File, HTTPException, Depends
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from typing import Optional
 import os
-import shutil
 import json
 import asyncio
 import re
 import uuid
 from datetime import datetime
 from app.core import config
+from app.services.upload_pipeline import UploadIngestor
 
 router = APIRouter()
 
@@ -220,42 +220,14 @@ async def set_sess_tools(session_uuid: str, request: Request, data: dict, user=D
 
 @router.get("/patterns")
 async def get_pats(request: Request):
-    agent = request.app.state.agent
-    # This logic was a bit involved in original_app.py
-    # I'll simplify or copy it.
-    from app.core.patterns import PATTERNS
-    import re
-    expl = PATTERNS.get("__explanations__", "")
-    res = []
-    
-    # Custom Prompts
-    prompts_dir = "prompts"
-    if os.path.exists(prompts_dir):
-        for filename in os.listdir(prompts_dir):
-            if filename.endswith(".md") or filename.endswith(".txt"):
-                res.append({
-                    "name": filename,
-                    "description": "User generated prompt",
-                    "type": "user"
-                })
-
-    for line in expl.splitlines():
-        m = re.match(r"^\d+\.\s+\*\*(?P<name>.*?)\*\*: (?P<description>.*)", line.strip())
-        if m: 
-            item = m.groupdict()
-            item["type"] = "system"
-            res.append(item)
-        elif "suggest_pattern" in line:
-            m = re.search(r"\*\*(?P<name>suggest_pattern)\*\*, (?P<description>.*)", line)
-            if m: 
-                item = m.groupdict()
-                item["type"] = "system"
-                res.append(item)
-    
-    if not res: 
-        res = [{"name": k, "description": "", "type": "system"} for k in agent.list_patterns()]
-        
-    return res
+    catalog = request.app.state.pattern_catalog
+    body, etag = catalog.get()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if catalog.is_fresh(request.headers.get("if-none-match"), etag):
+        catalog.counters["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    catalog.counters["served"] += 1
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/prompts/{filename}")
 async def get_prompt_content(filename: str, request: Request, user=Depends(get_user)):
@@ -287,6 +259,7 @@ async def delete_prompt(filename: str, request: Request, user=Depends(get_user))
     if os.path.exists(filepath):
         try:
             os.remove(filepath)
+            request.app.state.pattern_catalog.invalidate()
             return {"success": True}
         except Exception as e:
             raise HTTPException(500, f"Failed to delete file: {e}")
@@ -310,6 +283,7 @@ async def update_prompt(filename: str, request: Request, user=Depends(get_user))
         try:
             with open(filepath, "w", encoding="utf-8") as f:
                 f.write(content)
+            request.app.state.pattern_catalog.invalidate()
             return {"success": True}
         except Exception as e:
             raise HTTPException(500, f"Failed to update file: {e}")
@@ -337,6 +311,7 @@ async def create_prompt(request: Request, user=Depends(get_user)):
     try:
         with open(filepath, "w", encoding="utf-8") as f:
             f.write(content)
+        request.app.state.pattern_catalog.invalidate()
         return {"success": True, "filename": filename}
     except Exception as e:
         raise HTTPException(500, f"Failed to create file: {e}")
@@ -347,54 +322,29 @@ async def chat(request: Request, message: str = Form(...), file: Optional[list[U
     UPLOAD_DIR = request.app.state.UPLOAD_DIR
     if not user: raise HTTPException(401)
     
-    file_paths = []
-    if file:
-        conversion_service = request.app.state.conversion_service
-        pdf_service = request.app.state.pdf_service
-        for f_upload in file:
-            if f_upload.filename:
-                # Sanitize filename to ensure ASCII-only for CLI compatibility
-                base_name = os.path.basename(f_upload.filename)
-                safe_name = re.sub(r'[^a-zA-Z0-9._-]', '_', base_name)
-                
-                # Fallback if sanitization leaves it empty
-                if not safe_name or safe_name.replace("_", "") == "":
-                    ext = os.path.splitext(base_name)[1]
-                    safe_name = f"upload_{uuid.uuid4().hex}{ext}"
-
-                fpath = os.path.join(UPLOAD_DIR, safe_name)
-                with open(fpath, "wb") as f: 
-                    shutil.copyfileobj(f_upload.file, f)
-                
-                # Perform conversion if needed
-                if fpath.lower().endswith((".docx", ".xlsx")):
-                    try:
-                        old_fpath = fpath
-                        fpath = conversion_service.convert_to_markdown(fpath)
-                        import logging
-                        logging.getLogger(__name__).info(f"Converted {old_fpath} to {fpath}")
-                    except Exception as e:
-                        # Fallback to original file on error
-                        import logging
-                        from app.services.conversion_service import PandocMissingError, ConversionServiceError
-                        
-                        log = logging.getLogger(__name__)
-                        if isinstance(e, PandocMissingError):
-                            log.warning(f"Pandoc missing, using original file: {e}")
-                        else:
-                            log.error(f"Conversion failed, falling back to original: {e}")
-                elif fpath.lower().endswith(".pdf"):
-                    try:
-                        # Compress PDF
-                        compressed_path = os.path.join(UPLOAD_DIR, f"compressed_{os.path.basename(fpath)}")
-                        # We use a distinct name for output to avoid issues during processing
-                        fpath = await pdf_service.compress_pdf(fpath, compressed_path)
-                    except Exception as e:
-                        import logging
-                        logging.getLogger(__name__).error(f"PDF compression failed: {e}")
-                
-                file_paths.append(os.path.relpath(fpath))
-    
+    # Attachments are saved and converted in the background; the SSE stream reports their progress.
+    # Ingestion starts only on the paths that use them, so commands answered at once leave nothing running.
+    ingest_task = None
+    progress_queue: asyncio.Queue = asyncio.Queue()
+
+    def start_ingestion() -> Optional[asyncio.Task]:
+        nonlocal ingest_task
+        if file and ingest_task is None:
+            ingestor = UploadIngestor(UPLOAD_DIR, request.app.state.conversion_service, request.app.state.pdf_service, request.app.state.conversion_executor, store=request.app.state.attachment_store)
+
+            async def run_ingestion():
+                try:
+                    return await ingestor.ingest(file, progress=progress_queue.put_nowait)
+                finally:
+                    progress_queue.put_nowait(None)
+
+            ingest_task = asyncio.create_task(run_ingestion())
+        return ingest_task
+
+    async def attachments():
+        task = start_ingestion()
+        return await task if task else []
+
     # Handle model selection
     m_override = None
     if model:
@@ -414,7 +364,7 @@ async def chat(request: Request, message: str = Form(...), file: Optional[list[U
         if cmd in ["/reset", "/clear"]: return {"response": await agent.reset_chat(user)}
         if cmd == "/pro":
             m_override = "gemini-3-pro-preview"
-            if len(parts) > 1: return {"response": await agent.generate_response(user, parts[1] + (f" {parts[2]}" if len(parts) > 2 else ""), model=m_override, file_paths=file_paths)}
+            if len(parts) > 1: return {"response": await agent.generate_response(user, parts[1] + (f" {parts[2]}" if len(parts) > 2 else ""), model=m_override, file_paths=await attachments())}
             return {"response": "Model set to Pro."}
         if cmd == "/plan":
             is_plan = True
@@ -423,7 +373,7 @@ async def chat(request: Request, message: str = Form(...), file: Optional[list[U
             else:
                 return {"response": "Plan mode requires a prompt. Usage: /plan <your prompt>"}
         if cmd == "/p" or cmd == "/pattern":
-            if len(parts) >= 2: return {"response": await agent.apply_pattern(user, parts[1], parts[2] if len(parts) > 2 else "", model=m_override, file_paths=file_paths)}
+            if len(parts) >= 2: return {"response": await agent.apply_pattern(user, parts[1], parts[2] if len(parts) > 2 else "", model=m_override, file_paths=await attachments())}
         if cmd == "/yolo":
             agent.yolo_mode = not agent.yolo_mode
             return {"response": f"YOLO Mode {'ENABLED' if agent.yolo_mode else 'DISABLED'}."}
@@ -442,6 +392,17 @@ async def chat(request: Request, message: str = Form(...), file: Optional[list[U
 
         log_sse("Starting event_generator")
         try:
+            if start_ingestion():
+                while True:
+                    try:
+                        event = await asyncio.wait_for(progress_queue.get(), timeout=15.0)
+                    except asyncio.TimeoutError:
+                        yield ": heartbeat\n\n"
+                        continue
+                    if event is None:
+                        break
+                    yield f"data: {json.dumps(event)}\n\n"
+            file_paths = await attachments()
             stream = agent.generate_response_stream(user, message, model=m_override, file_paths=file_paths, plan_mode=is_plan)
             it = stream.__aiter__()
             
@@ -498,6 +459,8 @@ async def chat(request: Request, message: str = Form(...), file: Optional[list[U
             async for item in event_generator():
                 yield item
         finally:
+            if ingest_task and not ingest_task.done():
+                ingest_task.cancel()
             if agent.active_tasks.get(user) == current_task:
                 del agent.active_tasks[user]
 
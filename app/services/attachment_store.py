@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class BlobWriter:
+    """Temporary file in the store that hashes what is written to it."""
+    def __init__(self, path: str):
+        self.path = path
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = open(path, "wb")
+
+    def write(self, chunk: bytes):
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class AttachmentStore:
+    """
+    Content-addressed storage of uploaded attachments and of what is derived
+    from them (markdown conversions, compressed PDFs).
+
+        objects/ab/<sha256>             uploaded content
+        derived/<sha256(digest:kind:version)><ext>
+        tmp/                            uploads being written
+
+    Files in UPLOAD_DIR are hard links ("views") to these objects, so the same
+    content is stored once and its link count is its reference count: an object
+    whose only link is the store's own entry is unreferenced and gc() removes it
+    once it is older than the grace period. Where hard links are not supported
+    views are plain copies and only the conversion cache is kept.
+    Objects are read-only and views are replaced atomically, never rewritten.
+    """
+    def __init__(self, root: str, gc_grace: float = 3600.0):
+        self.root = root
+        self.gc_grace = gc_grace
+        self.objects_dir = os.path.join(root, "objects")
+        self.derived_dir = os.path.join(root, "derived")
+        self.tmp_dir = os.path.join(root, "tmp")
+        for d in (self.objects_dir, self.derived_dir, self.tmp_dir):
+            os.makedirs(d, exist_ok=True)
+        # Serializes linking against gc so an object cannot vanish between lookup and link
+        self._lock = threading.Lock()
+        self.counters = {
+            "stored": 0, "dedup_hits": 0, "bytes_deduped": 0,
+            "derived_hits": 0, "derived_stored": 0,
+            "gc_runs": 0, "gc_removed": 0, "gc_bytes": 0, "link_fallbacks": 0
+        }
+
+    # --- paths ---
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def derived_path(self, digest: str, kind: str, version: Any, ext: str) -> str:
+        key = hashlib.sha256(f"{digest}:{kind}:{version}".encode()).hexdigest()
+        return os.path.join(self.derived_dir, key + ext)
+
+    # --- uploads ---
+
+    def begin(self) -> BlobWriter:
+        return BlobWriter(os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part"))
+
+    def commit(self, writer: BlobWriter, view_path: str) -> str:
+        """Stores a finished upload (unless the same content is already stored) and links it at view_path."""
+        writer.close()
+        digest = writer.digest
+        obj = self.object_path(digest)
+        with self._lock:
+            if os.path.exists(obj):
+                os.remove(writer.path)
+                self.counters["dedup_hits"] += 1
+                self.counters["bytes_deduped"] += writer.size
+            else:
+                os.makedirs(os.path.dirname(obj), exist_ok=True)
+                os.replace(writer.path, obj)
+                self._seal(obj)
+                self.counters["stored"] += 1
+            self._link(obj, view_path)
+        return digest
+
+    def refcount(self, digest: str) -> int:
+        """Number of views of an object (0 if it is not stored)."""
+        try:
+            return os.stat(self.object_path(digest)).st_nlink - 1
+        except OSError:
+            return 0
+
+    # --- derived artifacts ---
+
+    def link_derived(self, digest: str, kind: str, version: Any, ext: str, view_path: str) -> bool:
+        """Links a cached artifact at view_path; False if it has not been produced yet."""
+        path = self.derived_path(digest, kind, version, ext)
+        with self._lock:
+            if not os.path.exists(path):
+                return False
+            self._link(path, view_path)
+        self.counters["derived_hits"] += 1
+        return True
+
+    def store_derived(self, digest: str, kind: str, version: Any, ext: str, produced_path: str):
+        """Adopts a freshly produced artifact (which stays in place as a view) into the cache."""
+        path = self.derived_path(digest, kind, version, ext)
+        with self._lock:
+            self._seal(produced_path)
+            self._link(produced_path, path)
+        self.counters["derived_stored"] += 1
+
+    # --- gc ---
+
+    def gc(self, grace: Optional[float] = None) -> Dict[str, int]:
+        """Removes objects and artifacts nothing links to any more, and abandoned partial uploads."""
+        cutoff = time.time() - (self.gc_grace if grace is None else grace)
+        removed, freed = 0, 0
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                with self._lock:
+                    try:
+                        st = os.stat(path)
+                        if st.st_mtime > cutoff:
+                            continue
+                        if dirpath != self.tmp_dir and st.st_nlink > 1:
+                            continue
+                        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+                        os.remove(path)
+                    except OSError:
+                        continue
+                removed += 1
+                freed += st.st_size
+        self.counters["gc_runs"] += 1
+        self.counters["gc_removed"] += removed
+        self.counters["gc_bytes"] += freed
+        if removed:
+            logger.info(f"Attachment store gc removed {removed} files ({freed} bytes)")
+        return {"removed": removed, "bytes": freed}
+
+    async def gc_loop(self, interval: float):
+        while True:
+            try:
+                await asyncio.to_thread(self.gc)
+            except Exception as e:
+                logger.error(f"Attachment store gc failed: {e}")
+            await asyncio.sleep(interval)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return dict(self.counters)
+
+    # --- helpers ---
+
+    def _seal(self, path: str):
+        if os.name == "nt":
+            # Windows refuses to replace or delete read-only files, which views are
+            return
+        try:
+            os.chmod(path, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+        except OSError:
+            pass
+
+    def _link(self, src: str, dst: str):
+        """Points dst at src's content, atomically replacing whatever dst was."""
+        try:
+            if os.path.samefile(src, dst):
+                return
+        except OSError:
+            pass
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst) or ".", suffix=".link")
+        os.close(fd)
+        os.remove(tmp)
+        try:
+            try:
+                os.link(src, tmp)
+            except OSError:
+                self.counters["link_fallbacks"] += 1
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
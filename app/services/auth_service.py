@@ -1,29 +1,22 @@
-from webauthn import (
-    generate_registration_options, 
-    verify_registration_response, 
-    generate_authentication_options, 
-    verify_authentication_response, 
-    options_to_json, 
-    base64url_to_bytes
-)
-from webauthn.helpers import bytes_to_base64url
-from webauthn.helpers.structs import (
-    PublicKeyCredentialDescriptor, 
-    AuthenticatorSelectionCriteria, 
-    UserVerificationRequirement,
-    ResidentKeyRequirement
-)
 from typing import List, Optional
 
 class AuthService:
+    """
+    WebAuthn ceremonies. webauthn is imported on first use; the server starts without it.
+
+    rp_id and origin given to a call override the configured ones, so each
+    request can use the host it came in on without changing shared state.
+    """
     def __init__(self, rp_id: str, rp_name: str, origin: str):
         self.rp_id = rp_id
         self.rp_name = rp_name
         self.origin = origin
 
-    def generate_registration_options(self, user_id: str, user_name: str):
+    def generate_registration_options(self, user_id: str, user_name: str, rp_id: Optional[str] = None):
+        from webauthn import generate_registration_options
+        from webauthn.helpers.structs import AuthenticatorSelectionCriteria, ResidentKeyRequirement, UserVerificationRequirement
         return generate_registration_options(
-            rp_id=self.rp_id,
+            rp_id=rp_id or self.rp_id,
             rp_name=self.rp_name,
             user_id=user_id.encode(),
             user_name=user_name,
@@ -33,34 +26,40 @@ class AuthService:
             )
         )
 
-    def verify_registration_response(self, credential, challenge):
+    def verify_registration_response(self, credential, challenge, rp_id: Optional[str] = None, origin: Optional[str] = None):
+        from webauthn import verify_registration_response, base64url_to_bytes
         return verify_registration_response(
             credential=credential,
             expected_challenge=base64url_to_bytes(challenge),
-            expected_origin=self.origin,
-            expected_rp_id=self.rp_id
+            expected_origin=origin or self.origin,
+            expected_rp_id=rp_id or self.rp_id
         )
 
-    def generate_authentication_options(self, credential_ids: List[str] = []):
+    def generate_authentication_options(self, credential_ids: List[str] = [], rp_id: Optional[str] = None):
+        from webauthn import generate_authentication_options, base64url_to_bytes
+        from webauthn.helpers.structs import PublicKeyCredentialDescriptor, UserVerificationRequirement
         creds = [PublicKeyCredentialDescriptor(id=base64url_to_bytes(cid)) for cid in credential_ids]
         return generate_authentication_options(
-            rp_id=self.rp_id,
+            rp_id=rp_id or self.rp_id,
             allow_credentials=creds,
             user_verification=UserVerificationRequirement.PREFERRED
         )
 
-    def verify_authentication_response(self, credential, challenge, public_key, sign_count):
+    def verify_authentication_response(self, credential, challenge, public_key, sign_count, rp_id: Optional[str] = None, origin: Optional[str] = None):
+        from webauthn import verify_authentication_response, base64url_to_bytes
         return verify_authentication_response(
             credential=credential,
             expected_challenge=base64url_to_bytes(challenge),
-            expected_origin=self.origin,
-            expected_rp_id=self.rp_id,
+            expected_origin=origin or self.origin,
+            expected_rp_id=rp_id or self.rp_id,
             credential_public_key=base64url_to_bytes(public_key),
             credential_current_sign_count=sign_count
         )
     
     def options_to_json(self, options):
+        from webauthn import options_to_json
         return options_to_json(options)
     
     def bytes_to_base64url(self, b):
+        from webauthn.helpers import bytes_to_base64url
         return bytes_to_base64url(b)
@@ -1,11 +1,18 @@
 import os
-import pypandoc
+import json
+import math
+import shutil
 import logging
-import pandas as pd
+import datetime as dt
+from typing import Any, Dict, List, Optional
+from app.core import config
 from app.core.config import UPLOAD_DIR
 
 logger = logging.getLogger(__name__)
 
+# Bump when the markdown produced for a given file changes; cached conversions are keyed by it
+CONVERSION_VERSION = 3
+
 class PandocMissingError(RuntimeError):
     """Raised when pandoc is not found on the system."""
     pass
@@ -14,15 +21,162 @@ class ConversionServiceError(RuntimeError):
     """Raised when conversion fails."""
     pass
 
-class FileConversionService:
+def _markdown_cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, dt.datetime) and value.time() == dt.time():
+        value = value.date()
+    if isinstance(value, (dt.date, dt.time)):
+        value = value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("|", "\\|").replace("\r\n", "<br>").replace("\n", "<br>")
+
+class _ColumnStats:
+    __slots__ = ("filled", "numeric", "minimum", "maximum", "total")
+
     def __init__(self):
-        self._pandoc_available = False
+        self.filled = 0
+        self.numeric = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.total = 0.0
+
+    def add(self, value: Any):
+        if value is None or value == "":
+            return
+        self.filled += 1
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+            self.numeric += 1
+            self.minimum = min(self.minimum, value)
+            self.maximum = max(self.maximum, value)
+            self.total += value
+
+    def row(self, name: str) -> List[str]:
+        if not self.numeric:
+            return [name, str(self.filled), "0", "", "", ""]
+        return [name, str(self.filled), str(self.numeric), _markdown_cell(self.minimum), _markdown_cell(self.maximum), _markdown_cell(round(self.total / self.numeric, 4))]
+
+def _table_row(cells: List[str]) -> str:
+    return "| " + " | ".join(cells) + " |\n"
+
+def xlsx_to_markdown(file_path: str, output_path: str, max_rows: int = 0, max_cols: int = 0) -> Dict[str, Any]:
+    """
+    Writes every sheet of a workbook as a markdown table, row by row, using
+    openpyxl's read-only mode so memory stays flat whatever the workbook size.
+    The first non-empty row is the header. A sheet with more than max_rows data
+    rows or max_cols columns (0 = no limit) is cut, and the rest of it is still
+    read to append per-column statistics over all of its rows and columns, the
+    columns that were cut included (marked as not shown).
+    Returns {sheet name: {"rows", "columns", "rows_shown", "columns_shown"}}.
+    """
+    import openpyxl
+
+    summary = {}
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            for sheet in workbook.worksheets:
+                out.write(f"## Sheet: {sheet.title}\n\n")
+                header: Optional[List[str]] = None
+                names: List[str] = []
+                width = shown_cols = rows = 0
+                stats: List[_ColumnStats] = []
+                for values in sheet.iter_rows(values_only=True):
+                    end = len(values)
+                    while end and (values[end - 1] is None or values[end - 1] == ""):
+                        end -= 1
+                    if not end:
+                        continue
+                    if header is None:
+                        width = end
+                        shown_cols = min(width, max_cols) if max_cols else width
+                        names = [_markdown_cell(v) or f"Column {i + 1}" for i, v in enumerate(values[:end])]
+                        header = names[:shown_cols]
+                        stats = [_ColumnStats() for _ in range(width)]
+                        out.write(_table_row(header))
+                        out.write(_table_row(["---"] * shown_cols))
+                        continue
+                    if end > width:
+                        # Columns with no header still get statistics
+                        names.extend(f"Column {i + 1}" for i in range(width, end))
+                        stats.extend(_ColumnStats() for _ in range(width, end))
+                        width = end
+                    rows += 1
+                    for column, value in zip(stats, values[:end]):
+                        column.add(value)
+                    cells = values[:shown_cols]
+                    if not max_rows or rows <= max_rows:
+                        cells = [_markdown_cell(v) for v in cells]
+                        out.write(_table_row(cells + [""] * (shown_cols - len(cells))))
+                if header is None:
+                    out.write("_(empty sheet)_\n\n")
+                    summary[sheet.title] = {"rows": 0, "columns": 0, "rows_shown": 0, "columns_shown": 0}
+                    continue
+                rows_shown = min(rows, max_rows) if max_rows else rows
+                if rows_shown < rows or shown_cols < width:
+                    out.write(f"\n_Truncated: showing {rows_shown} of {rows} rows and {shown_cols} of {width} columns. Statistics over all {rows} rows and {width} columns:_\n\n")
+                    out.write(_table_row(["Column", "Non-empty", "Numeric", "Min", "Max", "Mean"]))
+                    out.write(_table_row(["---"] * 6))
+                    for i, (name, column) in enumerate(zip(names, stats)):
+                        out.write(_table_row(column.row(name if i < shown_cols else f"{name} (not shown)")))
+                out.write("\n\n")
+                summary[sheet.title] = {"rows": rows, "columns": width, "rows_shown": rows_shown, "columns_shown": shown_cols}
+    finally:
+        workbook.close()
+    return summary
+
+class FileConversionService:
+    """
+    Converts DOCX (pandoc) and XLSX (openpyxl) attachments to markdown. Neither
+    library is imported, and pandoc is not probed, until the first conversion;
+    the probe result is kept in probe_cache_path for as long as the pandoc
+    binary on PATH stays the same, so restarts do not spawn pandoc again.
+    """
+    def __init__(self, xlsx_max_rows: int = config.XLSX_MAX_ROWS, xlsx_max_cols: int = config.XLSX_MAX_COLS, probe_cache_path: Optional[str] = config.PANDOC_PROBE_CACHE):
+        self.xlsx_max_rows = xlsx_max_rows
+        self.xlsx_max_cols = xlsx_max_cols
+        self.probe_cache_path = probe_cache_path
+        self._pandoc_available: Optional[bool] = None
+
+    @property
+    def pandoc_available(self) -> bool:
+        if self._pandoc_available is None:
+            self._pandoc_available = self._probe_pandoc()
+        return self._pandoc_available
+
+    def _probe_pandoc(self) -> bool:
+        # pypandoc may also find a bundled pandoc that is not on PATH; that case is probed every time
+        key = None
+        exe = shutil.which("pandoc")
+        if exe:
+            st = os.stat(exe)
+            key = [exe, st.st_size, st.st_mtime_ns]
+        if key and self.probe_cache_path:
+            try:
+                with open(self.probe_cache_path, "r", encoding="utf-8") as f:
+                    cached = json.load(f)
+                if cached.get("key") == key:
+                    return bool(cached.get("available"))
+            except (OSError, ValueError):
+                pass
+
+        import pypandoc
+        version = None
         try:
-            pypandoc.get_pandoc_version()
-            self._pandoc_available = True
+            version = pypandoc.get_pandoc_version()
         except OSError:
             logger.warning("Pandoc not found. DOCX conversion will fail. Please install pandoc.")
 
+        if key and self.probe_cache_path:
+            try:
+                os.makedirs(os.path.dirname(self.probe_cache_path) or ".", exist_ok=True)
+                with open(self.probe_cache_path, "w", encoding="utf-8") as f:
+                    json.dump({"key": key, "available": version is not None, "version": version}, f)
+            except OSError as e:
+                logger.warning(f"Could not cache the pandoc probe: {e}")
+        return version is not None
+
     def convert_to_markdown(self, file_path: str) -> str:
         """
         Converts a .docx or .xlsx file to markdown.
@@ -39,9 +193,10 @@ class FileConversionService:
         
         try:
             if file_ext == ".docx":
-                if not self._pandoc_available:
+                if not self.pandoc_available:
                     raise PandocMissingError("Pandoc is not available for .docx conversion.")
                 
+                import pypandoc
                 # For docx, we convert to gfm (GitHub Flavored Markdown)
                 # We explicitly do NOT use --extract-media to ensure images are not kept.
                 pypandoc.convert_file(
@@ -51,20 +206,9 @@ class FileConversionService:
                     extra_args=['--wrap=none']
                 )
             elif file_ext == ".xlsx":
-                # For xlsx, use pandas to read all sheets and convert to markdown tables
+                # For xlsx, stream the rows with openpyxl into markdown tables
                 # This does not depend on pandoc
-                all_sheets = pd.read_excel(file_path, sheet_name=None)
-                md_content = []
-                for sheet_name, df in all_sheets.items():
-                    md_content.append(f"## Sheet: {sheet_name}\n")
-                    try:
-                        md_content.append(df.to_markdown(index=False))
-                    except ImportError:
-                        md_content.append(df.to_string(index=False))
-                    md_content.append("\n\n")
-                
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write("\n".join(md_content))
+                xlsx_to_markdown(file_path, output_path, self.xlsx_max_rows, self.xlsx_max_cols)
             
             return output_path
         except (PandocMissingError, FileNotFoundError, ValueError):
@@ -0,0 +1,131 @@
+import asyncio
+import bisect
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from app.core import config
+
+class AuthRateLimited(Exception):
+    """A client already has as many authentication checks in flight as it may."""
+    def __init__(self, client: str, retry_after: int = 1):
+        super().__init__(f"Too many concurrent authentication attempts from {client}")
+        self.client = client
+        self.retry_after = retry_after
+
+def client_address(request) -> str:
+    """The address per-client limits apply to: the peer, or the first X-Forwarded-For hop when the proxy is trusted."""
+    if config.AUTH_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+class LatencyHistogram:
+    """Counts of observations per latency bucket (upper bounds in ms), plus percentiles estimated from them."""
+    BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-th observation (max_ms for the overflow bucket)."""
+        if not self.total:
+            return None
+        rank = p * self.total
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS + (None,), self.counts):
+            seen += count
+            if seen >= rank and count:
+                return float(bound) if bound is not None else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{b}ms" for b in self.BOUNDS_MS] + ["inf"]
+        return {
+            "count": self.total,
+            "avg_ms": round(self.sum_ms / self.total, 1) if self.total else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 1),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+class CryptoExecutor:
+    """
+    Runs password hashing and signature checks in a dedicated thread pool, so a
+    burst of logins queues there instead of blocking the event loop (and every
+    chat stream on it). bcrypt releases the GIL while it works, so the pool
+    gives real parallelism up to the number of cores.
+
+    Each client may have at most per_client_limit checks in flight; one more is
+    refused with AuthRateLimited, which the app answers with 429. Time spent
+    waiting for a worker and total latency are recorded per operation.
+    """
+    def __init__(self, max_workers: int = config.AUTH_CRYPTO_WORKERS, per_client_limit: int = config.AUTH_MAX_CONCURRENT_PER_IP):
+        self.max_workers = max(1, max_workers or (os.cpu_count() or 2))
+        self.per_client_limit = per_client_limit
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="auth-crypto")
+        self._in_flight: Dict[str, int] = {}
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self._wait: Dict[str, LatencyHistogram] = {}
+        self.counters = {"submitted": 0, "rejected": 0, "failed": 0}
+
+    async def run(self, op: str, fn: Callable[..., Any], *args, client: Optional[str] = None) -> Any:
+        """fn(*args) in the pool. op names the operation in the metrics; client is the caller's address."""
+        if client is not None:
+            if self.per_client_limit > 0 and self._in_flight.get(client, 0) >= self.per_client_limit:
+                self.counters["rejected"] += 1
+                raise AuthRateLimited(client)
+            self._in_flight[client] = self._in_flight.get(client, 0) + 1
+        self.counters["submitted"] += 1
+        submitted = time.perf_counter()
+        started: List[float] = []
+
+        def timed():
+            started.append(time.perf_counter())
+            return fn(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+        finally:
+            done = time.perf_counter()
+            self._latency.setdefault(op, LatencyHistogram()).observe(done - submitted)
+            if started:
+                self._wait.setdefault(op, LatencyHistogram()).observe(started[0] - submitted)
+            if client is not None:
+                remaining = self._in_flight[client] - 1
+                if remaining:
+                    self._in_flight[client] = remaining
+                else:
+                    del self._in_flight[client]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "per_client_limit": self.per_client_limit,
+            "in_flight": sum(self._in_flight.values()),
+            "clients": len(self._in_flight),
+            **self.counters,
+            "ops": {
+                op: {"latency": hist.snapshot(), "wait": self._wait[op].snapshot() if op in self._wait else None}
+                for op, hist in self._latency.items()
+            }
+        }
@@ -0,0 +1,96 @@
+from typing import Dict, Iterable, List, Optional
+
+class ForkForest:
+    """
+    The fork trees of a user's sessions (session_forks: child -> {"parent", "fork_point"}).
+
+    Parent/children adjacency gives O(component) traversals and a union-find
+    over the same links gives near-constant tree lookups, so grouping forks and
+    finding everything related to a session no longer rescan every fork entry.
+    Links are added as sessions are forked; whole trees are removed on delete.
+    """
+    def __init__(self, forks: Optional[Dict[str, Dict]] = None):
+        self._parent: Dict[str, str] = {}
+        self._children: Dict[str, Dict[str, None]] = {} # dicts as insertion-ordered sets
+        self._uf: Dict[str, str] = {}
+        self._size: Dict[str, int] = {}
+        for child, info in (forks or {}).items():
+            parent = info.get("parent") if isinstance(info, dict) else None
+            if parent:
+                self.add(child, parent)
+
+    def __len__(self) -> int:
+        return len(self._parent)
+
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self._uf
+
+    # --- union-find ---
+
+    def find(self, uuid: str) -> str:
+        """Representative of the tree a session belongs to (itself if it was never forked)."""
+        root = uuid
+        while self._uf.get(root, root) != root:
+            root = self._uf[root]
+        while uuid != root: # path compression
+            self._uf[uuid], uuid = root, self._uf[uuid]
+        return root
+
+    def _union(self, a: str, b: str):
+        for u in (a, b):
+            if u not in self._uf:
+                self._uf[u] = u
+                self._size[u] = 1
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self._size[ra] < self._size[rb]:
+            ra, rb = rb, ra
+        self._uf[rb] = ra
+        self._size[ra] += self._size.pop(rb)
+
+    # --- links ---
+
+    def add(self, child: str, parent: str):
+        old = self._parent.get(child)
+        if old == parent:
+            return
+        if old is not None:
+            # Re-parenting keeps the old union (the trees stay merged), which only over-groups
+            self._children.get(old, {}).pop(child, None)
+        self._parent[child] = parent
+        self._children.setdefault(parent, {})[child] = None
+        self._union(child, parent)
+
+    def parent(self, uuid: str) -> Optional[str]:
+        return self._parent.get(uuid)
+
+    def children(self, uuid: str) -> List[str]:
+        return list(self._children.get(uuid, ()))
+
+    def component(self, uuid: str) -> List[str]:
+        """Every session connected to uuid through fork links, uuid first."""
+        seen = {uuid: None}
+        stack = [uuid]
+        while stack:
+            u = stack.pop()
+            parent = self._parent.get(u)
+            neighbours = list(self._children.get(u, ()))
+            if parent is not None:
+                neighbours.append(parent)
+            for v in neighbours:
+                if v not in seen:
+                    seen[v] = None
+                    stack.append(v)
+        return list(seen)
+
+    def remove(self, uuids: Iterable[str]):
+        """Drops whole trees (as delete_specific_session does); removing part of a tree leaves the rest grouped."""
+        for u in uuids:
+            parent = self._parent.pop(u, None)
+            if parent is not None:
+                self._children.get(parent, {}).pop(u, None)
+            for child in self._children.pop(u, {}):
+                self._parent.pop(child, None)
+            self._uf.pop(u, None)
+            self._size.pop(u, None)
@@ -0,0 +1,113 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class Job:
+    """A queued or running unit of blocking work. Running work registers on_cancel to be interruptible."""
+    __slots__ = ("fn", "priority", "enqueued_at", "future", "cancelled", "on_cancel")
+
+    def __init__(self, fn: Callable[["Job"], Any], priority: int, future: asyncio.Future):
+        self.fn = fn
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.future = future
+        self.cancelled = False
+        self.on_cancel: Optional[Callable[[], None]] = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.on_cancel:
+            try:
+                self.on_cancel()
+            except Exception:
+                pass
+
+class JobScheduler:
+    """
+    Runs blocking jobs in worker threads, at most max_concurrency at a time.
+
+    Jobs wait in a priority queue (lower first, FIFO among equals). A caller that
+    is cancelled while waiting (e.g. the chat stream torn down by /stop) takes its
+    job with it: a queued job is dropped before it starts, a running one gets its
+    on_cancel hook called so it can kill its subprocess. The slot is only freed
+    when the job function has actually returned.
+    """
+    def __init__(self, max_concurrency: int = 1):
+        self.max_concurrency = max(1, max_concurrency)
+        self._queue: List[Tuple[int, int, Job]] = []
+        self._seq = itertools.count()
+        self._running = 0
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0}
+        self._waits: Deque[float] = deque(maxlen=500)
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, job in self._queue if not job.cancelled)
+
+    async def run(self, fn: Callable[[Job], Any], priority: int = 0) -> Any:
+        """Queues fn(job) and waits for its result."""
+        job = Job(fn, priority, asyncio.get_running_loop().create_future())
+        self.counters["submitted"] += 1
+        heapq.heappush(self._queue, (priority, next(self._seq), job))
+        self._dispatch()
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            job.cancel()
+            raise
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency and self._queue:
+            _, _, job = heapq.heappop(self._queue)
+            if job.cancelled:
+                continue
+            self._running += 1
+            self._waits.append(time.monotonic() - job.enqueued_at)
+            asyncio.get_running_loop().create_task(self._execute(job))
+
+    async def _execute(self, job: Job):
+        try:
+            result = await asyncio.to_thread(job.fn, job)
+            self.counters["completed"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            if job.cancelled:
+                logger.debug(f"Cancelled job ended with: {e!r}")
+            else:
+                self.counters["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._running -= 1
+            self._dispatch()
+
+    def _summarize(self, samples: Deque[float]) -> Dict[str, Any]:
+        if not samples:
+            return {"count": 0, "avg_ms": None, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        ordered = sorted(samples)
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+        return {
+            "count": len(ordered),
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+            "max_ms": round(ordered[-1] * 1000, 1)
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queued": self.queued,
+            **self.counters,
+            "wait": self._summarize(self._waits)
+        }
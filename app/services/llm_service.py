@@ -7,10 +7,20 @@ import shutil
 import uuid
 import subprocess
 import threading
+import time
+import sqlite3
 from datetime import datetime, timezone
 from typing import Optional, List, Dict, AsyncGenerator, Any
 from app.core.patterns import PATTERNS
 from app.core import config
+from app.services.process_pool import CLIProcessPool
+from app.services.session_workers import SessionWorkerPool
+from app.services.stream_parser import QuestionStreamParser
+from app.services.session_store import create_session_store
+from app.services.session_index import SessionIndex, describe_session
+from app.services.message_index import MessageIndex
+from app.services.search_index import SearchIndex
+from app.services.fork_forest import ForkForest
 
 FALLBACK_MODELS = {
     "gemini-3-pro": "gemini-3-pro-preview",
@@ -104,9 +114,31 @@ class GeminiAgent:
         self.working_dir = working_dir or os.getcwd()
         self.session_file = os.path.join(self.working_dir, "user_sessions.json")
         self.gemini_cmd = shutil.which(config.GEMINI_CMD) or config.GEMINI_CMD
+        self.session_store = create_session_store(
+            config.SESSION_STORE,
+            self.working_dir,
+            delay=config.USER_DATA_WRITE_DELAY,
+            max_delay=config.USER_DATA_MAX_DELAY
+        )
         self.user_data = self._load_user_data()
+        self.session_index = SessionIndex(working_dir=self.working_dir)
+        self.message_index = MessageIndex(config.MESSAGE_INDEX_DIR)
+        self.search_index = SearchIndex(os.path.join(self.working_dir, "search_index.db"))
+        self._fork_forests: Dict[str, tuple] = {}
         self.yolo_mode = False
         self.active_tasks: Dict[str, asyncio.Task] = {}
+        self.process_pool = CLIProcessPool(
+            self._spawn_cli,
+            size=config.CLI_POOL_SIZE,
+            max_idle=config.CLI_POOL_MAX_IDLE,
+            idle_ttl=config.CLI_POOL_IDLE_TTL
+        )
+        self.session_workers = SessionWorkerPool(
+            self._spawn_cli,
+            enabled=config.CLI_STICKY_WORKERS,
+            memory_budget_mb=config.CLI_STICKY_MEMORY_MB,
+            extra_args=config.CLI_STICKY_ARGS.split()
+        )
         
         # Ensure prompts directory exists
         prompts_dir = os.path.join(self.working_dir, "prompts")
@@ -114,40 +146,11 @@ class GeminiAgent:
             os.makedirs(prompts_dir, exist_ok=True)
 
     def _load_user_data(self) -> Dict:
-        if os.path.exists(self.session_file):
-            try:
-                with open(self.session_file, "r") as f:
-                    data = json.load(f)
-                    if not data: return {}
-                    if isinstance(next(iter(data.values())), str):
-                        return {uid: {"active_session": suid, "sessions": [suid], "session_tools": {}} for uid, suid in data.items()}
-                    for uid in data:
-                        if "sessions" not in data[uid]: data[uid]["sessions"] = []
-                        if "active_session" not in data[uid]: data[uid]["active_session"] = None
-                        if "session_tools" not in data[uid]: data[uid]["session_tools"] = {}
-                        if "session_tags" not in data[uid]: data[uid]["session_tags"] = {}
-                        if "pending_tools" not in data[uid]: data[uid]["pending_tools"] = []
-                        if "pinned_sessions" not in data[uid]: data[uid]["pinned_sessions"] = []
-                        if "session_metadata" not in data[uid]: data[uid]["session_metadata"] = {}
-                        if "settings" not in data[uid]:
-                            data[uid]["settings"] = {
-                                "show_mic": True,
-                                "interactive_mode": True,
-                                "copy_formatted": False,
-                                "default_model": "gemini-3-pro-preview"
-                            }
-                        else:
-                            # Ensure defaults for existing settings objects
-                            if "copy_formatted" not in data[uid]["settings"]:
-                                data[uid]["settings"]["copy_formatted"] = False
-                            if "default_model" not in data[uid]["settings"]:
-                                data[uid]["settings"]["default_model"] = "gemini-3-pro-preview"
-                    return data
-            except: return {}
-        return {}
-
-    def _save_user_data(self):
-        with open(self.session_file, "w") as f: json.dump(self.user_data, f, indent=2)
+        return self.session_store.load()
+
+    def _save_user_data(self, user_id: Optional[str] = None):
+        # Batched and written off the event loop; user_id limits the write to that user where the backend supports it
+        self.session_store.save(self.user_data, user_id)
 
     def get_user_settings(self, user_id: str) -> Dict:
         if user_id not in self.user_data:
@@ -190,7 +193,7 @@ class GeminiAgent:
             }
             
         self.user_data[user_id]["settings"].update(settings)
-        self._save_user_data()
+        self._save_user_data(user_id)
 
     async def _create_subprocess(self, args, **kwargs):
         try:
@@ -220,6 +223,33 @@ class GeminiAgent:
             else:
                 raise
 
+    async def _spawn_cli(self, args):
+        return await self._create_subprocess(
+            args, 
+            stdin=asyncio.subprocess.PIPE, 
+            stdout=asyncio.subprocess.PIPE, 
+            stderr=asyncio.subprocess.PIPE, 
+            cwd=self.working_dir
+        )
+
+    def _build_cli_args(self, session_uuid: Optional[str], enabled_tools: List[str], model: Optional[str], plan_mode: bool, file_paths: Optional[List[str]] = None) -> List[str]:
+        args = [self.gemini_cmd, "--output-format", "stream-json"]
+        args.extend(["--allowed-tools", ",".join(enabled_tools) if enabled_tools else "none"])
+        
+        if plan_mode:
+            args.extend(["--approval-mode", "plan"])
+        else:
+            args.extend(["--approval-mode", "default"])
+            
+        if self.yolo_mode: args.append("--yolo")
+        if session_uuid: args.extend(["--resume", session_uuid])
+        if model: args.extend(["--model", model])
+        args.extend(["--include-directories", self.working_dir])
+        if file_paths:
+            for fp in file_paths:
+                args.append(f"@{fp}")
+        return args
+
     def toggle_pin(self, user_id: str, session_uuid: str) -> bool:
         if user_id not in self.user_data:
             self.user_data[user_id] = {"active_session": None, "sessions": [], "session_tools": {}, "pending_tools": [], "pinned_sessions": [], "session_metadata": {}}
@@ -234,7 +264,7 @@ class GeminiAgent:
             user_info["pinned_sessions"].append(session_uuid)
             res = True
         
-        self._save_user_data()
+        self._save_user_data(user_id)
         return res
 
     def get_session_tools(self, user_id: str, session_uuid: str) -> List[str]:
@@ -251,10 +281,10 @@ class GeminiAgent:
         else:
             if "session_tools" not in self.user_data[user_id]: self.user_data[user_id]["session_tools"] = {}
             self.user_data[user_id]["session_tools"][session_uuid] = tools
-        self._save_user_data()
+        self._save_user_data(user_id)
 
     def list_patterns(self) -> List[str]:
-        return sorted([k for k in PATTERNS.keys() if k != "__explanations__"])
+        return PATTERNS.names()
 
     async def apply_pattern(self, user_id: str, pattern_name: str, input_text: str, model: Optional[str] = None, file_paths: Optional[List[str]] = None) -> str:
         # Check if it's a custom prompt file
@@ -344,6 +374,12 @@ class GeminiAgent:
         return False
 
     async def _get_latest_session_uuid(self) -> Optional[str]:
+        try:
+            res = await asyncio.to_thread(self.session_index.latest_session)
+            if res:
+                return res
+        except Exception as e:
+            global_log(f"Session index lookup failed: {str(e)}")
         try:
             global_log("Executing --list-sessions...")
             proc = await self._create_subprocess([self.gemini_cmd, "--list-sessions"], stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, cwd=self.working_dir)
@@ -406,38 +442,37 @@ class GeminiAgent:
             enabled_tools = self.get_session_tools(user_id, session_uuid or "pending")
             log_debug(f"Enabled tools for this run: {enabled_tools}")
             
-            args = [self.gemini_cmd, "--output-format", "stream-json"]
-            args.extend(["--allowed-tools", ",".join(enabled_tools) if enabled_tools else "none"])
-            
-            if plan_mode:
-                args.extend(["--approval-mode", "plan"])
-            else:
-                args.extend(["--approval-mode", "default"])
-                
-            if self.yolo_mode: args.append("--yolo")
-            if session_uuid: args.extend(["--resume", session_uuid])
-            if current_model: args.extend(["--model", current_model])
-            args.extend(["--include-directories", self.working_dir])
-            if file_paths:
-                for fp in file_paths:
-                    args.append(f"@{fp}")
+            args = self._build_cli_args(session_uuid, enabled_tools, current_model, plan_mode, file_paths)
             
             log_debug(f"Attempt {attempt}: Running command {' '.join(args)}")
             
             should_fallback = False
             high_demand_detected = False
             proc = None
+            worker = None
+            turn_completed = False
+            kept_alive = False
             stderr_buffer = []
             try:
-                proc = await self._create_subprocess(
-                    args, 
-                    stdin=asyncio.subprocess.PIPE, 
-                    stdout=asyncio.subprocess.PIPE, 
-                    stderr=asyncio.subprocess.PIPE, 
-                    cwd=self.working_dir
-                )
+                started_at = time.monotonic()
+                first_byte_seen = False
+                # Sticky mode keeps the CLI alive between turns; a session already mid-turn elsewhere gets a one-shot process
+                if self.session_workers.enabled and not self.session_workers.is_busy(session_uuid):
+                    worker_key = tuple(self._build_cli_args(None, enabled_tools, current_model, plan_mode))
+                    worker = self.session_workers.get(session_uuid, worker_key)
+                    if worker is None:
+                        worker = await self.session_workers.start(self._build_cli_args(session_uuid, enabled_tools, current_model, plan_mode), worker_key)
+                    worker.begin_turn()
+                    proc, warm = worker.proc, worker.turns > 0
+                else:
+                    # Attachments are passed as extra argv entries, so those runs never match a warm worker
+                    proc, warm = await self.process_pool.acquire(args, reuse=not file_paths)
+                log_debug(f"Using {'warm' if warm else 'cold'} CLI process")
                 
-                if prompt:
+                if prompt and worker:
+                    log_debug("Sending prompt to session worker...")
+                    await worker.send(prompt + "".join(f" @{fp}" for fp in (file_paths or [])))
+                elif prompt:
                     log_debug("Writing prompt to stdin...")
                     async def write_to_stdin(proc, data):
                         if hasattr(proc.stdin, 'drain'): # asyncio.StreamWriter
@@ -467,18 +502,23 @@ class GeminiAgent:
                             try: proc.terminate()
                             except: pass
                 
-                stderr_task = asyncio.create_task(capture_stderr(proc.stderr))
+                if worker:
+                    stderr_task = None
+                    stderr_buffer = worker.stderr_lines
+                else:
+                    stderr_task = asyncio.create_task(capture_stderr(proc.stderr))
 
                 log_debug("Starting to read stdout")
-                current_message_content = ""
-                json_buffer = ""
-                in_json_block = False
+                question_parser = QuestionStreamParser()
 
                 while True:
                     line = await proc.stdout.readline()
                     if not line:
                         log_debug("Stdout closed (EOF)")
                         break
+                    if not first_byte_seen:
+                        first_byte_seen = True
+                        self.process_pool.record_ttfb(time.monotonic() - started_at, warm)
                     line_str = line.decode(errors='replace').strip()
                     if not line_str: continue
                     
@@ -495,84 +535,19 @@ class GeminiAgent:
                         
                         # Handle interactive questioning protocol
                         if data.get("type") == "message" and data.get("role") == "assistant":
-                            content = data.get("content", "")
-                            
-                            # Add to global buffer for full detection
-                            current_message_content += content
-                            
-                            # Logic to hide JSON and potential markdown backticks from the stream
-                            cleaned_content = ""
-                            for char in content:
-                                if (char == '{' or char == '`') and not in_json_block:
-                                    # Potential start of JSON or markdown block
-                                    in_json_block = True
-                                    json_buffer = char
-                                elif in_json_block:
-                                    json_buffer += char
-                                    # We check for the end of a potential JSON block or markdown block
-                                    # If it ends with } or ` we might be at the end.
-                                    if char == '}' or char == '`':
-                                        # Let's see if we have a complete question JSON (potentially wrapped)
-                                        # We use a greedy check in the buffer
-                                        if '"type": "question"' in json_buffer or '"type":"question"' in json_buffer:
-                                            # We need to decide if this block is COMPLETE.
-                                            # If it's wrapped in backticks, we wait for the closing backticks.
-                                            # For now, if we see a valid JSON question, we consider it "absorbed"
-                                            # but we only clear the buffer if it's truly complete.
-                                            
-                                            # Simple heuristic: if it's a valid JSON, it's absorbed.
-                                            try:
-                                                # Try to extract JSON from the buffer (might have backticks)
-                                                inner_json_match = re.search(r"\{\s*\"type\"\s*:\s*\"question\".*?\}", json_buffer, re.DOTALL)
-                                                if inner_json_match:
-                                                    # Check if it's balanced (minimal check)
-                                                    json_text = inner_json_match.group(0)
-                                                    json.loads(json_text)
-                                                    
-                                                    # If it was wrapped in backticks, and we just saw a backtick, 
-                                                    # or it wasn't wrapped and we just saw }, then it's done.
-                                                    is_wrapped = json_buffer.startswith('```')
-                                                    if (is_wrapped and json_buffer.endswith('```')) or (not is_wrapped and json_buffer.endswith('}')):
-                                                        in_json_block = False
-                                                        json_buffer = ""
-                                            except:
-                                                pass # Not complete yet
-                                        else:
-                                            # Not a question yet, or ever. 
-                                            # If the buffer is getting too large or we are sure it's not a question, release it.
-                                            # For now, if it ends with ` and doesn't look like our JSON, release it.
-                                            if char == '`':
-                                                if len(json_buffer) > 10 and not ('"type"' in json_buffer):
-                                                    cleaned_content += json_buffer
-                                                    in_json_block = False
-                                                    json_buffer = ""
-                                            elif char == '}' and not ('"type"' in json_buffer):
-                                                cleaned_content += json_buffer
-                                                in_json_block = False
-                                                json_buffer = ""
-                                else:
-                                    cleaned_content += char
-                            
+                            # Question cards (optionally in ```json fences) are cut out of the visible text
+                            cleaned_content, questions = question_parser.feed(data.get("content", ""))
+                            for question_data in questions:
+                                yield question_data
                             data["content"] = cleaned_content
-
-                            # Global buffer handles full detection and yielding
-                            # We update the regex to optionally swallow surrounding backticks and newlines
-                            question_pattern = r"(?:```(?:json)?\s*)?\{\s*\"type\"\s*:\s*\"question\".*?\}(?:\s*```)?"
-                            question_match = re.search(question_pattern, current_message_content, re.DOTALL)
-                            if question_match:
-                                try:
-                                    full_match_text = question_match.group(0)
-                                    # Extract JUST the JSON part for parsing
-                                    json_only_match = re.search(r"\{\s*\"type\"\s*:\s*\"question\".*?\}", full_match_text, re.DOTALL)
-                                    if json_only_match:
-                                        question_data = json.loads(json_only_match.group(0))
-                                        yield question_data
-                                        current_message_content = current_message_content.replace(full_match_text, "")
-                                except: pass
                             
                             # If we have nothing to show yet (still buffering JSON/markdown), don't yield this chunk's message
-                            if not data["content"] and in_json_block:
+                            if not cleaned_content and (questions or question_parser.is_buffering):
                                 continue
+                        elif data.get("type") == "result":
+                            tail = question_parser.flush()
+                            if tail:
+                                yield {"type": "message", "role": "assistant", "content": tail}
 
                         # Truncate large tool outputs
                         if data.get("type") == "tool_result" and "output" in data:
@@ -620,12 +595,7 @@ class GeminiAgent:
                                 # Handle pending fork
                                 pending_fork = self.user_data[user_id].get("pending_fork")
                                 if pending_fork:
-                                    if "session_forks" not in self.user_data[user_id]:
-                                        self.user_data[user_id]["session_forks"] = {}
-                                    self.user_data[user_id]["session_forks"][new_id] = {
-                                        "parent": pending_fork["parent"],
-                                        "fork_point": pending_fork["fork_point"]
-                                    }
+                                    self._record_fork(user_id, new_id, pending_fork["parent"], pending_fork["fork_point"])
                                     if pending_fork.get("title"):
                                         if "custom_titles" not in self.user_data[user_id]:
                                             self.user_data[user_id]["custom_titles"] = {}
@@ -643,7 +613,7 @@ class GeminiAgent:
                                     del self.user_data[user_id]["pending_fork"]
                                     log_debug(f"Applied pending fork info to session {new_id}")
 
-                                self._save_user_data()
+                                self._save_user_data(user_id)
                                 session_uuid = new_id
                         
                         # Check for capacity error in JSON chunks
@@ -659,9 +629,18 @@ class GeminiAgent:
                                 break
                         
                         yield data
+                        if worker and data.get("type") == "result":
+                            # End of this turn; the worker stays alive for the next prompt
+                            turn_completed = True
+                            break
                     except json.JSONDecodeError:
                         yield {"type": "raw", "content": line_str}
                 
+                if not should_fallback and not high_demand_detected:
+                    tail = question_parser.flush()
+                    if tail:
+                        yield {"type": "message", "role": "assistant", "content": tail}
+
                 if should_fallback:
                     try:
                         if proc.returncode is None:
@@ -670,9 +649,22 @@ class GeminiAgent:
                     except: pass
                     continue 
 
-                await proc.wait()
-                await stderr_task
-                log_debug(f"Process exited with code {proc.returncode}")
+                if worker and turn_completed:
+                    high_demand_detected = high_demand_detected or worker.high_demand
+                    self.session_workers.release(worker, session_uuid)
+                    kept_alive = True
+                    exit_code = 0
+                    log_debug(f"Turn completed, session worker kept alive for {session_uuid}")
+                else:
+                    await proc.wait()
+                    if stderr_task: await stderr_task
+                    if worker: high_demand_detected = high_demand_detected or worker.high_demand
+                    exit_code = proc.returncode
+                    log_debug(f"Process exited with code {exit_code}")
+
+                if session_uuid and exit_code == 0:
+                    # The CLI has written this turn to the chat file; fold it into the search index off the request path
+                    self.search_index.schedule(session_uuid, self.session_index.resolve)
                 
                 if high_demand_detected:
                     yield {
@@ -688,7 +680,7 @@ class GeminiAgent:
                     yield {"type": "plan_status", "status": "completed", "message": "Plan complete. Review proposed changes below."}
                 
                 # Check for capacity error in stderr if process failed
-                if proc.returncode != 0 and not should_fallback:
+                if exit_code != 0 and not should_fallback:
                     err_text = "\n".join(stderr_buffer).lower()
                     if any(k in err_text for k in CAPACITY_KEYWORDS) and attempt < max_attempts:
                         fallback = FALLBACK_MODELS.get(current_model)
@@ -700,7 +692,11 @@ class GeminiAgent:
                             continue 
 
                     # If not a capacity error, yield generic exit code error
-                    yield {"type": "error", "content": f"Exit code {proc.returncode}"}
+                    yield {"type": "error", "content": f"Exit code {exit_code}"}
+                elif self.process_pool.enabled and not worker:
+                    # Warm a worker for the next turn only now, so a resumed session is loaded with this turn included
+                    next_tools = self.get_session_tools(user_id, session_uuid or "pending")
+                    self.process_pool.replenish(self._build_cli_args(session_uuid, next_tools, current_model, plan_mode))
                 
                 break 
 
@@ -709,11 +705,13 @@ class GeminiAgent:
                 yield {"type": "error", "content": f"Exception: {repr(e)}"}
                 break
             finally:
-                if proc and proc.returncode is None:
+                if proc and proc.returncode is None and not kept_alive:
                     try:
                         proc.terminate()
                         await proc.wait()
                     except: pass
+                if worker and not kept_alive:
+                    self.session_workers.discard(worker)
 
     async def generate_response(self, user_id: str, prompt: str, model: Optional[str] = None, file_paths: Optional[List[str]] = None, resume_session: Optional[str] = "AUTO") -> str:
         full_response = ""
@@ -731,7 +729,7 @@ class GeminiAgent:
             if "custom_titles" not in self.user_data[user_id]:
                 self.user_data[user_id]["custom_titles"] = {}
             self.user_data[user_id]["custom_titles"][uuid] = new_title
-            self._save_user_data()
+            self._save_user_data(user_id)
             return True
         return False
 
@@ -740,7 +738,7 @@ class GeminiAgent:
             if "session_tags" not in self.user_data[user_id]:
                 self.user_data[user_id]["session_tags"] = {}
             self.user_data[user_id]["session_tags"][uuid] = tags
-            self._save_user_data()
+            self._save_user_data(user_id)
             return True
         return False
 
@@ -761,7 +759,7 @@ class GeminiAgent:
     async def get_user_sessions(self, user_id: str, limit: Optional[int] = None, offset: int = 0, tags: Optional[List[str]] = None) -> Dict[str, Any]:
         if user_id not in self.user_data:
             self.user_data[user_id] = {"active_session": None, "sessions": [], "session_tools": {}, "pending_tools": [], "pinned_sessions": [], "session_metadata": {}}
-            self._save_user_data()
+            self._save_user_data(user_id)
         
         user_info = self.user_data[user_id]
         uuids = user_info.get("sessions", [])
@@ -775,6 +773,20 @@ class GeminiAgent:
         # Check if we have metadata for all sessions
         missing_metadata = [u for u in uuids if u not in session_metadata]
         
+        if missing_metadata:
+            # Read title/time from the chat files; the CLI listing is only needed for sessions without one
+            try:
+                headers = await asyncio.to_thread(self.session_index.lookup, missing_metadata)
+            except Exception as e:
+                global_log(f"Session index lookup failed: {str(e)}")
+                headers = {}
+            if len(headers) == len(missing_metadata):
+                for u, header in headers.items():
+                    session_metadata[u] = describe_session(header)
+                user_info["session_metadata"] = session_metadata
+                self._save_user_data(user_id)
+                missing_metadata = []
+        
         all_sessions = []
         
         if not missing_metadata:
@@ -865,7 +877,7 @@ class GeminiAgent:
                     self.user_data[user_id]["session_tags"] = session_tags
                     self.user_data[user_id]["pinned_sessions"] = pinned_uuids
                 
-                self._save_user_data()
+                self._save_user_data(user_id)
                 all_sessions = cli_sessions
                 all_sessions = all_sessions[::-1]
                 
@@ -875,32 +887,21 @@ class GeminiAgent:
         
         # --- Grouping Logic: Display them as one (the latest fork) ---
         
-        def get_root(u):
-            """Find the root session UUID for a given session."""
-            visited = set()
-            curr = u
-            while curr in session_forks and session_forks[curr].get("parent") and curr not in visited:
-                visited.add(curr)
-                curr = session_forks[curr]["parent"]
-            return curr
-
         # Map root -> latest session in that group found in all_sessions
         # all_sessions is already ordered by time (newest first) because of [::-1]
+        forest = self._fork_forest(user_id)
         grouped_sessions = []
-        seen_roots = set()
+        latest_by_root = {}
         
         for sess in all_sessions:
-            root_uuid = get_root(sess["uuid"])
-            if root_uuid not in seen_roots:
+            root_uuid = forest.find(sess["uuid"])
+            latest = latest_by_root.get(root_uuid)
+            if latest is None:
                 grouped_sessions.append(sess)
-                seen_roots.add(root_uuid)
-            else:
+                latest_by_root[root_uuid] = sess
+            elif sess["active"]:
                 # If any fork in the group is active, the latest one shows it
-                if sess["active"]:
-                    for gs in grouped_sessions:
-                        if get_root(gs["uuid"]) == root_uuid:
-                            gs["has_active_fork"] = True
-                            break
+                latest["has_active_fork"] = True
 
         # Common Pagination Logic
         pinned = [s for s in grouped_sessions if s["pinned"]]
@@ -927,71 +928,65 @@ class GeminiAgent:
         all_sessions = sessions_data.get("pinned", []) + sessions_data.get("history", [])
         if not all_sessions: return []
         
-        query = query.lower()
-        results = []
-        
-        home = os.path.expanduser("~")
-        gemini_tmp_base = os.path.join(home, ".gemini", "tmp")
-        
-        for sess in all_sessions:
-            match = False
-            # Check title
-            if query in sess.get("title", "").lower():
-                match = True
-            
-            if not match:
-                # Check messages and attachments in the JSON file
-                uuid_start = sess["uuid"].split('-')[0]
-                import glob
-                search_path = os.path.join(gemini_tmp_base, "*", "chats", f"*{uuid_start}*.json")
-                files = glob.glob(search_path)
-                if files:
-                    try:
-                        with open(files[0], 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            for msg in data.get("messages", []):
-                                content_text = self._get_text_content(msg.get("content", ""))
-                                if query in content_text.lower():
-                                    match = True; break
-                    except: pass
-            
-            if match:
+        # Titles are per user, so they are matched here; message contents come from the full-text index
+        needle = query.lower()
+        results = [sess for sess in all_sessions if needle in sess.get("title", "").lower()]
+        title_matches = {sess["uuid"] for sess in results}
+        by_uuid = {sess["uuid"]: sess for sess in all_sessions}
+
+        # Resolving may rescan the chat directories, so it runs off the loop like the search itself
+        paths = await asyncio.to_thread(self.session_index.resolve_many, list(by_uuid))
+
+        def search_contents():
+            self.search_index.sync(paths)
+            return self.search_index.search(query, paths)
+
+        try:
+            hits = await asyncio.to_thread(search_contents)
+        except sqlite3.Error as e:
+            global_log(f"Search index unavailable, scanning chat files: {str(e)}", level="ERROR")
+            hits = await asyncio.to_thread(self._scan_session_contents, needle, {u: p for u, p in paths.items() if u not in title_matches})
+
+        # Title matches first, then sessions ranked by their best matching message
+        for hit in hits:
+            sess = by_uuid[hit["uuid"]]
+            if "snippet" in hit:
+                sess["match"] = {"raw_index": hit["raw_index"], "snippet": hit["snippet"], "highlights": hit["highlights"]}
+            if hit["uuid"] not in title_matches:
                 results.append(sess)
         
         return results
 
+    def _scan_session_contents(self, needle: str, paths: Dict[str, str]) -> List[Dict]:
+        """Substring scan of whole chat files (session uuid -> path), used only when the search index cannot be opened."""
+        hits = []
+        for session_uuid, path in paths.items():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                for msg in data.get("messages", []):
+                    if needle in self._get_text_content(msg.get("content", "")).lower():
+                        hits.append({"uuid": session_uuid}); break
+            except: pass
+        return hits
+
     async def get_session_messages(self, session_uuid: str, limit: Optional[int] = None, offset: int = 0) -> Dict:
         try:
-            uuid_start = session_uuid.split('-')[0]
-            home = os.path.expanduser("~")
-            gemini_tmp_base = os.path.join(home, ".gemini", "tmp")
-            if not os.path.exists(gemini_tmp_base): return {"messages": [], "total": 0}
-            import glob
-            search_path = os.path.join(gemini_tmp_base, "*", "chats", f"*{uuid_start}*.json")
-            files = glob.glob(search_path)
-            if not files: return {"messages": [], "total": 0}
-            files.sort(key=os.path.getmtime, reverse=True)
-            with open(files[0], 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                all_messages = data.get("messages", [])
-                total = len(all_messages)
-                if limit is not None:
-                    start = max(0, total - offset - limit); end = max(0, total - offset)
-                    messages_to_process = all_messages[start:end]
-                else: 
-                    start = 0
-                    messages_to_process = all_messages
-                messages = []
-                for idx, msg in enumerate(messages_to_process):
-                    content = msg.get("content", "")
-                    content_text = self._get_text_content(content)
-                    if not content_text or content_text.strip() == "": continue
-                    messages.append({
-                        "role": "user" if msg.get("type") == "user" else "bot", 
-                        "content": content_text,
-                        "raw_index": start + idx
-                    })
-                return {"messages": messages, "total": total}
+            path = await asyncio.to_thread(self.session_index.resolve, session_uuid)
+            if not path: return {"messages": [], "total": 0}
+            # Seeks to the requested page through the message offsets index instead of parsing the whole file
+            start, messages_to_process, total = await asyncio.to_thread(self.message_index.read_page, path, limit, offset)
+            messages = []
+            for idx, msg in enumerate(messages_to_process):
+                content = msg.get("content", "")
+                content_text = self._get_text_content(content)
+                if not content_text or content_text.strip() == "": continue
+                messages.append({
+                    "role": "user" if msg.get("type") == "user" else "bot", 
+                    "content": content_text,
+                    "raw_index": start + idx
+                })
+            return {"messages": messages, "total": total}
         except Exception as e:
             print(f"Error loading session messages: {str(e)}")
             return {"messages": [], "total": 0}
@@ -999,7 +994,7 @@ class GeminiAgent:
     async def switch_session(self, user_id: str, uuid: str) -> bool:
         if user_id in self.user_data and uuid in self.user_data[user_id]["sessions"]:
             self.user_data[user_id]["active_session"] = uuid
-            self._save_user_data()
+            self._save_user_data(user_id)
             return True
         return False
 
@@ -1026,19 +1021,13 @@ class GeminiAgent:
                     "tools": list(user_info.get("session_tools", {}).get(original_uuid, []))
                 }
                 
-                self._save_user_data()
+                self._save_user_data(user_id)
                 return "pending" # Frontend will handle this
 
-            uuid_start = original_uuid.split('-')[0]
-            home = os.path.expanduser("~")
-            gemini_tmp_base = os.path.join(home, ".gemini", "tmp")
-            import glob
-            search_path = os.path.join(gemini_tmp_base, "*", "chats", f"*{uuid_start}*.json")
-            files = glob.glob(search_path)
-            if not files: return None
-            files.sort(key=os.path.getmtime, reverse=True)
+            original_path = await asyncio.to_thread(self.session_index.resolve, original_uuid)
+            if not original_path: return None
             
-            with open(files[0], 'r', encoding='utf-8') as f:
+            with open(original_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             
             # Truncate messages. message_index is 0-based.
@@ -1052,12 +1041,13 @@ class GeminiAgent:
             data["lastUpdated"] = data["startTime"]
             
             # Save to new file in the same directory as original
-            original_dir = os.path.dirname(files[0])
+            original_dir = os.path.dirname(original_path)
             new_filename = f"session-{datetime.now(timezone.utc).strftime('%Y-%m-%dT%H-%M')}-{new_uuid[:8]}.json"
             new_path = os.path.join(original_dir, new_filename)
             
             with open(new_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2)
+            self.search_index.schedule(new_uuid, lambda _: new_path)
             
             # Update user_data
             user_info = self.user_data[user_id]
@@ -1076,24 +1066,44 @@ class GeminiAgent:
                 user_info["session_tools"][new_uuid] = list(user_info["session_tools"][original_uuid])
             
             # Track fork relationship
-            if "session_forks" not in user_info:
-                user_info["session_forks"] = {}
-            user_info["session_forks"][new_uuid] = {
-                "parent": original_uuid,
-                "fork_point": message_index
-            }
+            self._record_fork(user_id, new_uuid, original_uuid, message_index)
             
             # Also inherit metadata (original title etc)
             if "session_metadata" in user_info and original_uuid in user_info["session_metadata"]:
                 user_info["session_metadata"][new_uuid] = dict(user_info["session_metadata"][original_uuid])
             
-            self._save_user_data()
+            self._save_user_data(user_id)
             return new_uuid
             
         except Exception as e:
             global_log(f"Error cloning session {original_uuid}: {str(e)}", level="ERROR")
             return None
 
+    def _fork_forest(self, user_id: str) -> ForkForest:
+        """
+        The user's ForkForest, kept in step with session_forks by _record_fork and
+        delete_specific_session. It is rebuilt if session_forks was replaced or
+        changed size behind its back (e.g. reloaded or edited directly).
+        """
+        forks = self.user_data[user_id].get("session_forks", {})
+        cached = self._fork_forests.get(user_id)
+        if cached and cached[0] is forks and cached[1] == len(forks):
+            return cached[2]
+        forest = ForkForest(forks)
+        self._remember_fork_forest(user_id, forest)
+        return forest
+
+    def _remember_fork_forest(self, user_id: str, forest: ForkForest):
+        forks = self.user_data[user_id].get("session_forks", {})
+        self._fork_forests[user_id] = (forks, len(forks), forest)
+
+    def _record_fork(self, user_id: str, child: str, parent: str, fork_point: int):
+        forks = self.user_data[user_id].setdefault("session_forks", {})
+        forest = self._fork_forest(user_id)
+        forks[child] = {"parent": parent, "fork_point": fork_point}
+        forest.add(child, parent)
+        self._remember_fork_forest(user_id, forest)
+
     def get_session_forks(self, user_id: str, session_uuid: str) -> Dict[int, List[str]]:
         """
         Get all forks related to this session, organized by fork point.
@@ -1114,17 +1124,18 @@ class GeminiAgent:
         parent_uuid = my_info["parent"] if my_info else None
         my_fork_point = my_info["fork_point"] if my_info else None
 
+        forest = self._fork_forest(user_id)
+
         # 1. Any children of the current session
-        for u, info in forks_info.items():
-            if info["parent"] == session_uuid:
-                add_to_map(info["fork_point"], u)
+        for u in forest.children(session_uuid):
+            add_to_map(forks_info[u]["fork_point"], u)
         
         # 2. If we have a parent, we are a fork at 'my_fork_point'
         # The parent is a "branch" at that point, and so are our siblings
         if parent_uuid:
             add_to_map(my_fork_point, parent_uuid)
-            for u, info in forks_info.items():
-                if u != session_uuid and info["parent"] == parent_uuid and info["fork_point"] == my_fork_point:
+            for u in forest.children(parent_uuid):
+                if u != session_uuid and forks_info[u]["fork_point"] == my_fork_point:
                     add_to_map(my_fork_point, u)
             
         return fork_map
@@ -1155,22 +1166,9 @@ class GeminiAgent:
         """Sync title/tags across all related forks."""
         if user_id not in self.user_data: return
         user_info = self.user_data[user_id]
-        forks_info = user_info.get("session_forks", {})
         
-        # Find the root of the tree or just collect all related
-        related_uuids = {session_uuid}
-        
-        # Simple iterative search to find all connected nodes in the fork tree
-        changed = True
-        while changed:
-            changed = False
-            for u, info in forks_info.items():
-                if u in related_uuids and info["parent"] not in related_uuids:
-                    related_uuids.add(info["parent"])
-                    changed = True
-                if info["parent"] in related_uuids and u not in related_uuids:
-                    related_uuids.add(u)
-                    changed = True
+        # All sessions connected to this one in the fork tree
+        related_uuids = self._fork_forest(user_id).component(session_uuid)
         
         # Apply updates
         for u in related_uuids:
@@ -1181,48 +1179,35 @@ class GeminiAgent:
                 if "session_tags" not in user_info: user_info["session_tags"] = {}
                 user_info["session_tags"][u] = tags
                 
-        self._save_user_data()
+        self._save_user_data(user_id)
 
     async def new_session(self, user_id: str):
         self.user_data.setdefault(user_id, {})["active_session"] = None
         self.user_data[user_id].pop("pending_fork", None)
-        self._save_user_data()
+        self._save_user_data(user_id)
 
     async def delete_specific_session(self, user_id: str, uuid: str) -> bool:
         if user_id not in self.user_data or uuid not in self.user_data[user_id]["sessions"]:
             return False
             
         user_info = self.user_data[user_id]
-        forks_info = user_info.get("session_forks", {})
         
         # Find all related sessions in the tree
-        related_uuids = {uuid}
-        changed = True
-        while changed:
-            changed = False
-            for u, info in forks_info.items():
-                parent = info.get("parent")
-                if u in related_uuids and parent and parent not in related_uuids:
-                    related_uuids.add(parent)
-                    changed = True
-                if parent in related_uuids and u not in related_uuids:
-                    related_uuids.add(u)
-                    changed = True
+        forest = self._fork_forest(user_id)
+        related_uuids = forest.component(uuid)
 
         success = True
-        for target_uuid in list(related_uuids):
+        for target_uuid in related_uuids:
             try:
                 # 1. Check if any OTHER user still has this session
-                is_tracked_by_others = False
-                for other_user_id, other_user_info in self.user_data.items():
-                    if other_user_id == user_id: continue
-                    if target_uuid in other_user_info.get("sessions", []):
-                        is_tracked_by_others = True
-                        break
+                is_tracked_by_others = bool(self.session_store.other_owners(self.user_data, user_id, target_uuid))
 
                 # 2. Only delete from CLI if no other users are tracking it
                 if not is_tracked_by_others:
+                    self.process_pool.discard_matching(target_uuid)
+                    self.session_workers.discard_session(target_uuid)
                     await (await self._create_subprocess([self.gemini_cmd, "--delete-session", target_uuid], cwd=self.working_dir)).communicate()
+                    self.search_index.schedule(target_uuid, self.session_index.resolve)
                 
                 # 3. Cleanup local tracking
                 if target_uuid in user_info["sessions"]:
@@ -1247,7 +1232,9 @@ class GeminiAgent:
                 global_log(f"Error deleting session {target_uuid}: {str(e)}", level="ERROR")
                 success = False
         
-        self._save_user_data()
+        forest.remove(related_uuids)
+        self._remember_fork_forest(user_id, forest)
+        self._save_user_data(user_id)
         return success
 
     async def clear_all_session_tags(self) -> int:
@@ -1306,7 +1293,7 @@ class GeminiAgent:
             target_info.setdefault("session_tools", {})[session_uuid] = list(source_info["session_tools"][session_uuid])
 
         # 5. Save user_sessions.json
-        self._save_user_data()
+        self._save_user_data(target_username)
         return True
 
     async def reset_chat(self, user_id: str) -> str:
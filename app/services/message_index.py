@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.services.write_behind import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+_WS = " \t\n\r"
+
+def _skip_ws(text: str, pos: int) -> int:
+    n = len(text)
+    while pos < n and text[pos] in _WS:
+        pos += 1
+    return pos
+
+def scan_message_offsets(text: str) -> List[Tuple[int, int]]:
+    """
+    Character spans of every element of the top-level "messages" array.
+
+    The document is walked one top-level value at a time with raw_decode (C speed);
+    only the messages array is descended into, and its elements are decoded just to
+    find where each one ends.
+    """
+    decoder = json.JSONDecoder()
+    pos = _skip_ws(text, 0)
+    if text[pos:pos + 1] != "{":
+        raise ValueError("chat file is not a JSON object")
+    pos += 1
+    while True:
+        pos = _skip_ws(text, pos)
+        if text[pos] == "}":
+            return []
+        key, pos = decoder.raw_decode(text, pos)
+        pos = _skip_ws(text, pos)
+        if text[pos] != ":":
+            raise ValueError(f"expected ':' at {pos}")
+        pos = _skip_ws(text, pos + 1)
+        if key == "messages" and text[pos] == "[":
+            spans = []
+            pos = _skip_ws(text, pos + 1)
+            if text[pos] == "]":
+                return spans
+            while True:
+                _, end = decoder.raw_decode(text, pos)
+                spans.append((pos, end))
+                pos = _skip_ws(text, end)
+                if text[pos] == "]":
+                    return spans
+                if text[pos] != ",":
+                    raise ValueError(f"expected ',' at {pos}")
+                pos = _skip_ws(text, pos + 1)
+        _, pos = decoder.raw_decode(text, pos)
+        pos = _skip_ws(text, pos)
+        if text[pos] == ",":
+            pos += 1
+
+def build_sidecar(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        raw = f.read()
+    return index_bytes(path, raw, st)
+
+def index_bytes(path: str, raw: bytes, st: os.stat_result) -> Dict[str, Any]:
+    """The offsets index of raw, the contents of path as of st."""
+    text = raw.decode("utf-8")
+    spans = scan_message_offsets(text)
+    # Convert character spans to byte offsets in one pass
+    offsets = []
+    byte_pos, char_pos = 0, 0
+    for start, end in spans:
+        byte_pos += len(text[char_pos:start].encode("utf-8"))
+        byte_start = byte_pos
+        byte_pos += len(text[start:end].encode("utf-8"))
+        offsets.append((byte_start, byte_pos))
+        char_pos = end
+    return {"version": INDEX_VERSION, "path": path, "mtime_ns": st.st_mtime_ns, "size": st.st_size, "offsets": offsets}
+
+class MessageIndex:
+    """
+    Byte offsets of the messages in CLI chat files, so a page of messages is read
+    by seeking instead of parsing the whole file. The offsets are kept in a
+    sidecar file in cache_dir (never next to the chat files, which the CLI owns)
+    and rebuilt only when the chat file's mtime or size change.
+    """
+    def __init__(self, cache_dir: str, memory_entries: int = 64):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"builds": 0, "sidecar_hits": 0, "memory_hits": 0}
+
+    def _sidecar_path(self, path: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _remember(self, path: str, index: Dict[str, Any]):
+        self._memory[path] = index
+        self._memory.move_to_end(path)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write_sidecar(self, sidecar: str, index: Dict[str, Any]):
+        try:
+            atomic_write_json(sidecar, index)
+        except OSError as e:
+            logger.warning(f"Could not write message index {sidecar}: {e}")
+
+    def get(self, path: str) -> Dict[str, Any]:
+        """The offsets index for a chat file, built if missing or stale."""
+        st = os.stat(path)
+        def fresh(index):
+            return index and index.get("version") == INDEX_VERSION and index["mtime_ns"] == st.st_mtime_ns and index["size"] == st.st_size
+        with self._lock:
+            index = self._memory.get(path)
+            if fresh(index):
+                self.counters["memory_hits"] += 1
+                self._memory.move_to_end(path)
+                return index
+            sidecar = self._sidecar_path(path)
+            try:
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = None
+            if fresh(index) and index.get("path") == path:
+                self.counters["sidecar_hits"] += 1
+            else:
+                index = build_sidecar(path)
+                self.counters["builds"] += 1
+                self._write_sidecar(sidecar, index)
+            self._remember(path, index)
+            return index
+
+    def _read(self, path: str, bounds: Callable[[int], Tuple[int, int]]) -> Tuple[int, List[Dict[str, Any]], int]:
+        """
+        Reads messages [start, end) = bounds(total), with total, bounds and offsets
+        all taken from one index. Returns (start, messages, total).
+        """
+        for attempt in range(2):
+            index = self.get(path)
+            offsets = index["offsets"]
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if (st.st_mtime_ns, st.st_size) != (index["mtime_ns"], index["size"]):
+                    continue # rewritten since the index was taken; get() rebuilds it
+                start, end = bounds(len(offsets))
+                if start >= end:
+                    return start, [], len(offsets)
+                first, last = offsets[start][0], offsets[end - 1][1]
+                f.seek(first)
+                blob = f.read(last - first)
+            try:
+                return start, [json.loads(blob[s - first:e - first]) for s, e in offsets[start:end]], len(offsets)
+            except ValueError:
+                continue # changed between the stat and the read
+        # Still changing: index the bytes just read and slice those, so bounds and data agree
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            raw = f.read()
+        index = index_bytes(path, raw, st)
+        with self._lock:
+            self.counters["builds"] += 1
+            self._remember(path, index)
+        offsets = index["offsets"]
+        start, end = bounds(len(offsets))
+        return start, [json.loads(raw[s:e]) for s, e in offsets[start:max(start, end)]], len(offsets)
+
+    def read_range(self, path: str, start: int, end: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Messages [start, end) of a chat file and the total message count."""
+        _, messages, total = self._read(path, lambda total: (max(0, start), min(end, total)))
+        return messages, total
+
+    def read_page(self, path: str, limit: Optional[int], offset: int = 0) -> Tuple[int, List[Dict[str, Any]], int]:
+        """A page counted from the end, as the chat UI loads it: returns (first_index, messages, total)."""
+        def bounds(total):
+            if limit is None:
+                return 0, total
+            return max(0, total - offset - limit), max(0, total - offset)
+        return self._read(path, bounds)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"cached": len(self._memory), **self.counters}
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.patterns import PatternStore
+
+logger = logging.getLogger(__name__)
+
+class PatternCatalog:
+    """
+    The /patterns response (custom prompts, then system patterns with their
+    descriptions), built and serialized once and served with a strong ETag.
+
+    It is rebuilt when the pattern store has been reloaded, when the prompts
+    directory's mtime changes (a prompt was added, removed or renamed) or after
+    invalidate(), which pattern sync and the prompt routes call.
+    """
+    def __init__(self, patterns: PatternStore, prompts_dir: str):
+        self.patterns = patterns
+        self.prompts_dir = prompts_dir
+        self._version: Optional[Tuple[Any, ...]] = None
+        self._body = b"[]"
+        self._etag = ""
+        self._invalidations = 0
+        self.counters = {"builds": 0, "served": 0, "not_modified": 0}
+
+    def invalidate(self):
+        self._invalidations += 1
+
+    def _current_version(self) -> Tuple[Any, ...]:
+        try:
+            prompts_mtime = os.stat(self.prompts_dir).st_mtime_ns
+        except OSError:
+            prompts_mtime = None
+        return (self.patterns.generation, prompts_mtime, self._invalidations)
+
+    def _build(self) -> List[Dict[str, str]]:
+        res = []
+        try:
+            filenames = sorted(os.listdir(self.prompts_dir))
+        except OSError:
+            filenames = []
+        for filename in filenames:
+            if filename.endswith(".md") or filename.endswith(".txt"):
+                res.append({"name": filename, "description": "User generated prompt", "type": "user"})
+
+        for item in self.patterns.descriptions():
+            res.append({**item, "type": "system"})
+
+        if not res:
+            res = [{"name": k, "description": "", "type": "system"} for k in self.patterns.names()]
+        return res
+
+    def get(self) -> Tuple[bytes, str]:
+        """The serialized catalog and its ETag, rebuilt first if anything it depends on changed."""
+        version = self._current_version()
+        if version != self._version:
+            body = json.dumps(self._build(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self._body = body
+            self._etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            self._version = version
+            self.counters["builds"] += 1
+        return self._body, self._etag
+
+    def is_fresh(self, if_none_match: Optional[str], etag: str) -> bool:
+        """Whether an If-None-Match header names etag (weak comparison, as RFC 9110 prescribes for it)."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"bytes": len(self._body), **self.counters}
@@ -1,32 +1,122 @@
-import httpx
 import json
 import os
 import re
 import asyncio
-from typing import Dict, List, Any
-from app.core.patterns import PATTERNS_FILE, reload_patterns
+import hashlib
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core import config
+from app.core.patterns import PATTERNS, EXPLANATIONS_KEY, PatternStore
+from app.services.write_behind import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Responses worth another attempt; anything else is final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def _body_hash(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
 
 class PatternSyncService:
+    """
+    Syncs the Fabric patterns from GitHub into the pattern store's file.
+
+    At most `concurrency` requests are in flight; 429/5xx responses and network
+    errors are retried with jittered exponential backoff (honouring Retry-After).
+    The ETag/Last-Modified of the pattern list and of every pattern are kept in
+    state_path together with a hash of the body they produced, so the next sync
+    sends conditional requests and a 304 reuses the stored body. Validators are
+    only trusted while the stored body still has that hash.
+
+    The result is diffed against the store by content hash (added, changed,
+    removed). Nothing is written when nothing changed; otherwise the store
+    publishes a new file in which only added and changed bodies are encoded and
+    swaps it in atomically. `progress` describes the running (or last) sync, for
+    the admin page to poll, and `last_sync` holds the statistics of the last one.
+    """
     GITHUB_API_URL = "https://api.github.com/repos/danielmiessler/Fabric/contents/data/patterns"
     RAW_URL_BASE = "https://raw.githubusercontent.com/danielmiessler/Fabric/main/data/patterns"
 
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+    def __init__(self, catalog=None, store: PatternStore = PATTERNS, concurrency: int = config.PATTERN_SYNC_CONCURRENCY,
+                 retries: int = config.PATTERN_SYNC_RETRIES, state_path: Optional[str] = config.PATTERN_SYNC_STATE,
+                 api_url: Optional[str] = None, raw_url_base: Optional[str] = None, backoff: float = 0.5, max_backoff: float = 30.0):
+        self.catalog = catalog
+        self.store = store
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self.state_path = state_path
+        self.api_url = api_url or self.GITHUB_API_URL
+        self.raw_url_base = raw_url_base or self.RAW_URL_BASE
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Both are created per sync, on the loop running it
+        self.client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._running = False
+        self.progress: Dict[str, Any] = {"running": False, "stage": "idle"}
+        self.counters = {"runs": 0, "published": 0, "unchanged": 0, "errors": 0}
+        # Statistics of the last sync (also kept in the state file across restarts)
+        self.last_sync: Optional[Dict[str, Any]] = self._load_state().get("last_sync")
+
+    # --- HTTP ---
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return min(self.backoff * (2 ** attempt), self.max_backoff) * random.uniform(0.5, 1.5)
+
+    async def _get(self, url: str, validators: Optional[Dict[str, str]] = None):
+        """GET with conditional headers, bounded by the semaphore and retried on transient failures."""
+        import httpx
+        headers = {}
+        if validators:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        attempt = 0
+        while True:
+            response = None
+            try:
+                async with self._semaphore:
+                    response = await self.client.get(url, headers=headers)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    raise
+            delay = self._retry_delay(attempt, response)
+            attempt += 1
+            self.progress["retries"] = self.progress.get("retries", 0) + 1
+            await asyncio.sleep(delay)
 
-    async def fetch_pattern_list(self) -> List[str]:
-        response = await self.client.get(self.GITHUB_API_URL)
+    @staticmethod
+    def _validators(response) -> Dict[str, str]:
+        return {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified")
+        }
+
+    async def fetch_pattern_list(self, cached: Optional[Dict[str, Any]] = None) -> Tuple[List[str], Dict[str, Any]]:
+        """Pattern names and the list's state entry; a 304 reuses the cached names."""
+        response = await self._get(self.api_url, cached if cached and cached.get("names") else None)
+        if response.status_code == 304:
+            return cached["names"], cached
         if response.status_code != 200:
             raise Exception(f"Failed to fetch pattern list: {response.status_code}")
-        
+
         items = response.json()
-        return [item["name"] for item in items if item["type"] == "dir"]
+        names = [item["name"] for item in items if item["type"] == "dir"]
+        return names, {**self._validators(response), "names": names}
 
-    async def fetch_pattern_content(self, pattern_name: str) -> str:
-        url = f"{self.RAW_URL_BASE}/{pattern_name}/system.md"
-        response = await self.client.get(url)
-        if response.status_code != 200:
-            return ""
-        return response.text
+    async def fetch_pattern_content(self, pattern_name: str, validators: Optional[Dict[str, str]] = None):
+        url = f"{self.raw_url_base}/{pattern_name}/system.md"
+        return await self._get(url, validators)
+
+    # --- content ---
 
     def sanitize_content(self, content: str) -> str:
         # Remove instructions that mention running fabric commands
@@ -36,38 +126,6 @@ class PatternSyncService:
         content = re.sub(r'fabric\s+', 'Gemini ', content, flags=re.IGNORECASE)
         return content
 
-    async def sync_all(self):
-        pattern_names = await self.fetch_pattern_list()
-        new_patterns = {}
-        explanations = []
-
-        # Limit to first 50 for now to avoid hitting rate limits or taking too long
-        # The user said "include the rest", but there are hundreds.
-        # I'll try to get them all but maybe in batches if needed.
-        # Actually, I'll just go for it and see.
-        
-        tasks = []
-        for name in pattern_names:
-            tasks.append(self.fetch_pattern_content(name))
-        
-        contents = await asyncio.gather(*tasks)
-
-        for name, content in zip(pattern_names, contents):
-            if content:
-                sanitized = self.sanitize_content(content)
-                new_patterns[name] = sanitized
-                # Try to extract a short description (first sentence of IDENTITY and PURPOSE or similar)
-                desc = self.extract_description(sanitized)
-                explanations.append(f"{len(explanations)+1}. **{name}**: {desc}")
-
-        new_patterns["__explanations__"] = "\n".join(explanations)
-
-        with open(PATTERNS_FILE, "w", encoding="utf-8") as f:
-            json.dump(new_patterns, f, indent=4)
-        
-        reload_patterns()
-        return len(new_patterns) - 1 # exclude __explanations__
-
     def extract_description(self, content: str) -> str:
         # Look for the section between # IDENTITY and PURPOSE and the next header
         match = re.search(r'# IDENTITY and PURPOSE\n\n(.*?)(?=\n# |\Z)', content, re.DOTALL)
@@ -83,5 +141,134 @@ class PatternSyncService:
             return desc
         return "No description available."
 
+    # --- state ---
+
+    def _load_state(self) -> Dict[str, Any]:
+        if self.state_path:
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if isinstance(state, dict):
+                    return state
+            except (OSError, ValueError):
+                pass
+        return {"list": None, "patterns": {}}
+
+    def _save_state(self, state: Dict[str, Any]):
+        if not self.state_path:
+            return
+        try:
+            atomic_write_json(self.state_path, state)
+        except OSError as e:
+            logger.warning(f"Could not save pattern sync state: {e}")
+
+    # --- sync ---
+
+    async def _sync_pattern(self, name: str, cached: Optional[Dict[str, Any]]) -> Tuple[str, Optional[str], Optional[Dict[str, Any]], Optional[str]]:
+        """
+        (outcome, body, state entry, hash of the stored body) of one pattern;
+        outcome is fetched, not_modified, kept, missing or failed.
+        """
+        current = self.store.read(name)
+        current_hash = _body_hash(current) if current is not None else None
+        trusted = cached if cached and current_hash and cached.get("sha256") == current_hash else None
+        try:
+            response = await self.fetch_pattern_content(name, trusted)
+        except Exception as e:
+            logger.warning(f"Fetching pattern {name} failed: {e}")
+            return ("kept" if current is not None else "failed"), current, trusted, current_hash
+        if response.status_code == 304 and trusted:
+            return "not_modified", current, trusted, current_hash
+        if response.status_code == 200:
+            body = self.sanitize_content(response.text)
+            return "fetched", body, {**self._validators(response), "sha256": _body_hash(body)}, current_hash
+        if response.status_code in RETRY_STATUSES and current is not None:
+            return "kept", current, trusted, current_hash # GitHub is struggling; keep what we have
+        return ("missing" if response.status_code == 404 else "failed"), None, None, current_hash
+
+    async def sync_all(self, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> int:
+        import httpx
+        if self._running:
+            raise RuntimeError("A pattern sync is already running")
+        self._running = True
+        self.client = httpx.AsyncClient(timeout=30.0)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+        self.progress = {"running": True, "stage": "list", "total": 0, "done": 0, "fetched": 0,
+                         "not_modified": 0, "kept": 0, "missing": 0, "failed": 0, "retries": 0}
+
+        def report(**changes):
+            self.progress.update(changes)
+            if progress:
+                progress(dict(self.progress))
+
+        try:
+            state = self._load_state()
+            pattern_names, list_state = await self.fetch_pattern_list(state.get("list"))
+            report(stage="patterns", total=len(pattern_names))
+
+            async def sync_one(name):
+                result = await self._sync_pattern(name, state.get("patterns", {}).get(name))
+                report(done=self.progress["done"] + 1, **{result[0]: self.progress[result[0]] + 1})
+                return result
+
+            results = await asyncio.gather(*(sync_one(name) for name in pattern_names))
+
+            # Diff by content hash: only added and changed bodies are encoded into the new file
+            bodies: Dict[str, Optional[str]] = {}
+            added, changed = [], []
+            new_state = {"list": list_state, "patterns": {}}
+            explanations = []
+            for name, (outcome, body, entry, previous_hash) in zip(pattern_names, results):
+                if not body:
+                    continue
+                new_hash = entry["sha256"] if entry else _body_hash(body)
+                if previous_hash is None:
+                    added.append(name)
+                elif previous_hash != new_hash:
+                    changed.append(name)
+                bodies[name] = body if previous_hash != new_hash else None
+                if entry:
+                    new_state["patterns"][name] = entry
+                # Try to extract a short description (first sentence of IDENTITY and PURPOSE or similar)
+                desc = self.extract_description(body)
+                explanations.append(f"{len(explanations)+1}. **{name}**: {desc}")
+            removed = [name for name in self.store.names() if name not in bodies]
+            explanations_text = "\n".join(explanations)
+
+            sync_stats = {
+                "finished_at": None, "added": added, "changed": changed, "removed": removed,
+                "unchanged": len(bodies) - len(added) - len(changed), "published": False,
+                "bytes_encoded": 0, "bytes_reused": 0, "requests_not_modified": self.progress["not_modified"],
+                "failed": self.progress["failed"], "retries": self.progress["retries"]
+            }
+            if added or changed or removed or explanations_text != self.store.read(EXPLANATIONS_KEY):
+                report(stage="writing")
+                bodies[EXPLANATIONS_KEY] = explanations_text
+                sync_stats.update(self.store.publish(bodies), published=True)
+                if self.catalog:
+                    self.catalog.invalidate()
+            sync_stats["seconds"] = round(time.monotonic() - started, 2)
+            sync_stats["finished_at"] = time.time()
+            self.last_sync = sync_stats
+            new_state["last_sync"] = sync_stats
+            self._save_state(new_state)
+            self.counters["runs"] += 1
+            self.counters["published" if sync_stats["published"] else "unchanged"] += 1
+            report(running=False, stage="done", changed=sync_stats["published"], seconds=sync_stats["seconds"])
+            return len(bodies) - (EXPLANATIONS_KEY in bodies)
+        except Exception as e:
+            self.counters["errors"] += 1
+            report(running=False, stage="error", error=str(e))
+            raise
+        finally:
+            await self.close()
+            self._running = False
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.counters, "progress": self.progress, "last_sync": self.last_sync}
+
     async def close(self):
-        await self.client.aclose()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
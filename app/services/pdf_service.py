@@ -1,4 +1,6 @@
 import os
+import re
+import mmap
 import shutil
 import asyncio
 import logging
@@ -6,10 +8,15 @@ import uuid
 import sys
 import subprocess
 from datetime import datetime
+from typing import Optional
 from app.core import config
+from app.services.job_scheduler import JobScheduler
 
 logger = logging.getLogger(__name__)
 
+# Bump when the Ghostscript settings change; cached compressed PDFs are keyed by it
+COMPRESSION_VERSION = 1
+
 def global_log(msg, level="INFO"):
     if config.LOG_LEVEL == "NONE":
         return
@@ -20,8 +27,35 @@ def global_log(msg, level="INFO"):
         print(f"[{ts}] [{level}] [PDFService] {msg}")
     except: pass
 
+_PAGES_COUNT_RE = re.compile(rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b")
+
+def estimate_page_count(path: str) -> Optional[int]:
+    """
+    Page count from the /Count of the page tree, without parsing the PDF.
+    None when it cannot be found (e.g. the page tree sits in a compressed object stream).
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            counts = [int(a or b) for a, b in _PAGES_COUNT_RE.findall(data)]
+    # The root of the page tree counts every page
+    return max(counts) if counts else None
+
 class PDFService:
-    def __init__(self):
+    """
+    Ghostscript compression of uploaded PDFs. Runs go through a JobScheduler so
+    only max_workers Ghostscript processes exist at a time; the others queue,
+    smaller files first. A run is killed when it exceeds `timeout` seconds or when
+    its caller is cancelled (the chat was stopped). Files smaller than min_bytes
+    or with more than max_pages pages (0 disables either check) are not compressed.
+    """
+    def __init__(self, max_workers: int = 1, timeout: float = 120.0, min_bytes: int = 0, max_pages: int = 0):
+        self.timeout = timeout
+        self.min_bytes = min_bytes
+        self.max_pages = max_pages
+        self.scheduler = JobScheduler(max_workers)
+        self.counters = {"compressed": 0, "not_smaller": 0, "errors": 0, "timeouts": 0, "skipped_size": 0, "skipped_pages": 0}
         self.gs_path = self._find_ghostscript()
         if self.gs_path:
             global_log(f"Ghostscript found at: {self.gs_path}", level="INFO")
@@ -39,13 +73,52 @@ class PDFService:
     def is_gs_available(self):
         return self.gs_path is not None
 
+    async def _skip_reason(self, input_path: str, size: int) -> Optional[str]:
+        if size < self.min_bytes:
+            self.counters["skipped_size"] += 1
+            return f"{size} bytes is below the {self.min_bytes} byte minimum"
+        if self.max_pages:
+            try:
+                # A regex scan of the whole file: kept off the event loop like Ghostscript itself
+                pages = await asyncio.to_thread(estimate_page_count, input_path)
+            except (OSError, ValueError):
+                pages = None
+            if pages and pages > self.max_pages:
+                self.counters["skipped_pages"] += 1
+                return f"{pages} pages exceed the {self.max_pages} page limit"
+        return None
+
+    def _run_ghostscript(self, cmd, job):
+        """Runs in a scheduler thread; returns (returncode, stderr)."""
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        job.on_cancel = proc.kill
+        if job.cancelled:
+            proc.kill()
+        try:
+            _, stderr = proc.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+        return proc.returncode, stderr
+
+    def _is_gs_safe_path(self, path: str) -> bool:
+        """Whether Ghostscript can be given this path as is (no temporary alias needed)."""
+        name = os.path.basename(path)
+        # A leading - or @ would be read as an option or an argument file
+        if not name or name[0] in "-@":
+            return False
+        # Only the Windows build has trouble with non-ASCII paths
+        return sys.platform != "win32" or path.isascii()
+
     async def compress_pdf(self, input_path: str, output_path: str) -> str:
         """
         Compresses a PDF file using Ghostscript.
         Returns the path to the compressed file if successful and smaller,
         otherwise returns the original input_path.
         
-        Uses synchronous subprocess.run in a thread for maximum reliability on Windows.
+        Ghostscript is run with a synchronous subprocess in a scheduler thread for
+        maximum reliability on Windows.
         """
         if not self.is_gs_available():
             return input_path
@@ -54,15 +127,30 @@ class PDFService:
             global_log(f"Input file not found: {input_path}", level="ERROR")
             return input_path
 
-        # Create safe temporary paths to avoid encoding issues with Ghostscript on Windows
+        original_size = os.path.getsize(input_path)
+        reason = await self._skip_reason(input_path, original_size)
+        if reason:
+            global_log(f"Skipping compression of {input_path}: {reason}", level="INFO")
+            return input_path
+
         base_dir = os.path.dirname(input_path)
         safe_id = uuid.uuid4().hex
-        safe_in_path = os.path.join(base_dir, f"gs_in_{safe_id}.pdf")
-        safe_out_path = os.path.join(base_dir, f"gs_out_{safe_id}.pdf")
+        safe_in_path = None
+        # Output goes to a temporary name next to its destination and is renamed into place
+        # only if it is smaller, so the final path is never left holding a larger file
+        safe_out_path = os.path.join(os.path.dirname(output_path) or base_dir, f"gs_out_{safe_id}.pdf")
         
         try:
-            # Copy input to safe path
-            shutil.copy2(input_path, safe_in_path)
+            if self._is_gs_safe_path(input_path):
+                gs_input = input_path
+            else:
+                # Ghostscript on Windows mangles non-ASCII paths: give it an ASCII name for the same file
+                safe_in_path = os.path.join(base_dir, f"gs_in_{safe_id}.pdf")
+                try:
+                    os.link(input_path, safe_in_path)
+                except OSError:
+                    shutil.copy2(input_path, safe_in_path)
+                gs_input = safe_in_path
             
             # Ghostscript command for ebook quality (150 dpi)
             cmd = [
@@ -74,21 +162,20 @@ class PDFService:
                 "-dQUIET",
                 "-dBATCH",
                 f"-sOutputFile={safe_out_path}",
-                safe_in_path
+                gs_input
             ]
 
-            global_log(f"Starting compression (sync thread): {input_path}", level="INFO")
+            global_log(f"Queueing compression: {input_path}", level="INFO")
             
-            # Using asyncio.to_thread to run the synchronous subprocess call
+            # The synchronous subprocess runs in a scheduler thread.
             # This bypasses all Proactor/Selector event loop issues on Windows.
-            def run_sync():
-                return subprocess.run(cmd, capture_output=True, text=False)
+            # Smaller files go first: priority is the order of magnitude of the size.
+            returncode, stderr = await self.scheduler.run(lambda job: self._run_ghostscript(cmd, job), priority=original_size.bit_length())
 
-            result = await asyncio.to_thread(run_sync)
-
-            if result.returncode != 0:
-                stderr_text = result.stderr.decode(errors='replace')
-                global_log(f"Ghostscript failed with return code {result.returncode}: {stderr_text}", level="ERROR")
+            if returncode != 0:
+                stderr_text = stderr.decode(errors='replace')
+                global_log(f"Ghostscript failed with return code {returncode}: {stderr_text}", level="ERROR")
+                self.counters["errors"] += 1
                 return input_path
 
             if not os.path.exists(safe_out_path):
@@ -96,7 +183,6 @@ class PDFService:
                 return input_path
 
             # Compare sizes
-            original_size = os.path.getsize(input_path)
             compressed_size = os.path.getsize(safe_out_path)
             
             reduction = original_size - compressed_size
@@ -106,19 +192,29 @@ class PDFService:
                 
                 # Move safe output to final destination
                 shutil.move(safe_out_path, output_path)
+                self.counters["compressed"] += 1
                 return output_path
             else:
                 global_log(f"Compression did not reduce size ({original_size} -> {compressed_size}). Keeping original.", level="INFO")
+                self.counters["not_smaller"] += 1
                 return input_path
 
+        except subprocess.TimeoutExpired:
+            global_log(f"Ghostscript timed out after {self.timeout}s: {input_path}", level="ERROR")
+            self.counters["timeouts"] += 1
+            return input_path
         except Exception as e:
             global_log(f"Error during PDF compression: {repr(e)}", level="ERROR")
+            self.counters["errors"] += 1
             return input_path
         finally:
             # Clean up temp files
-            if os.path.exists(safe_in_path):
+            if safe_in_path and os.path.exists(safe_in_path):
                 try: os.remove(safe_in_path)
                 except: pass
             if os.path.exists(safe_out_path):
                 try: os.remove(safe_out_path)
                 except: pass
+
+    def get_metrics(self):
+        return {"gs_available": self.is_gs_available(), **self.counters, "queue": self.scheduler.get_metrics()}
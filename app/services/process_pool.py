@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, ...]
+
+class CLIProcessPool:
+    """
+    Keeps pre-spawned Gemini CLI processes warm so a chat turn does not pay the
+    Node/CLI boot cost before the first token.
+
+    Workers are keyed by their full argument list (model, approval mode, allowed
+    tools, resumed session...). A spawned CLI blocks on stdin until the prompt is
+    written, so an idle worker is simply a process nobody has written to yet.
+    With size == 0 the pool is disabled and every acquire() cold-starts.
+    """
+    def __init__(self, spawn: Callable[[List[str]], Awaitable[Any]], size: int = 0, max_idle: int = 4, idle_ttl: float = 300.0):
+        self.spawn = spawn
+        self.size = max(0, size)
+        self.max_idle = max(0, max_idle)
+        self.idle_ttl = idle_ttl
+        self._idle: Dict[PoolKey, Deque[Tuple[float, Any]]] = {}
+        self._refills: Dict[PoolKey, asyncio.Task] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self.counters = {"hits": 0, "misses": 0, "spawned": 0, "discarded": 0}
+        self._ttfb: Dict[str, Deque[float]] = {"warm": deque(maxlen=500), "cold": deque(maxlen=500)}
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and self.max_idle > 0
+
+    def idle_count(self) -> int:
+        return sum(len(b) for b in self._idle.values())
+
+    def _is_healthy(self, proc, spawned_at: float) -> bool:
+        if getattr(proc, "returncode", None) is not None:
+            return False
+        if time.monotonic() - spawned_at > self.idle_ttl:
+            return False
+        stdout = getattr(proc, "stdout", None)
+        at_eof = getattr(stdout, "at_eof", None)
+        if callable(at_eof) and at_eof() is True:
+            return False
+        return True
+
+    def _discard(self, proc):
+        self.counters["discarded"] += 1
+        try:
+            if getattr(proc, "returncode", None) is None:
+                proc.terminate()
+        except Exception:
+            pass
+
+    async def acquire(self, args: List[str], reuse: bool = True) -> Tuple[Any, bool]:
+        """Returns (process, warm). Falls back to a cold spawn when no healthy worker matches."""
+        if self.enabled and reuse:
+            key = tuple(args)
+            bucket = self._idle.get(key)
+            while bucket:
+                spawned_at, proc = bucket.popleft()
+                if self._is_healthy(proc, spawned_at):
+                    if not bucket:
+                        self._idle.pop(key, None)
+                    self.counters["hits"] += 1
+                    return proc, True
+                self._discard(proc)
+            self._idle.pop(key, None)
+            self.counters["misses"] += 1
+        proc = await self.spawn(list(args))
+        return proc, False
+
+    def replenish(self, args: List[str]):
+        """Schedules a background spawn so the next request with these args starts warm."""
+        if not self.enabled:
+            return
+        key = tuple(args)
+        if key in self._refills and not self._refills[key].done():
+            return
+        try:
+            self._refills[key] = asyncio.get_running_loop().create_task(self._refill(key))
+        except RuntimeError:
+            pass
+
+    async def _refill(self, key: PoolKey):
+        try:
+            self.prune()
+            bucket = self._idle.setdefault(key, deque())
+            while len(bucket) < self.size:
+                if self.idle_count() >= self.max_idle:
+                    if not self._evict_oldest(exclude=key):
+                        break
+                proc = await self.spawn(list(key))
+                self.counters["spawned"] += 1
+                bucket.append((time.monotonic(), proc))
+            if not bucket:
+                self._idle.pop(key, None)
+            self._ensure_reaper()
+        except Exception as e:
+            logger.warning(f"CLI pool refill failed: {e}")
+        finally:
+            self._refills.pop(key, None)
+
+    def _evict_oldest(self, exclude: Optional[PoolKey] = None) -> bool:
+        oldest_key, oldest_at = None, None
+        for key, bucket in self._idle.items():
+            if key == exclude or not bucket:
+                continue
+            if oldest_at is None or bucket[0][0] < oldest_at:
+                oldest_key, oldest_at = key, bucket[0][0]
+        if oldest_key is None:
+            return False
+        _, proc = self._idle[oldest_key].popleft()
+        if not self._idle[oldest_key]:
+            del self._idle[oldest_key]
+        self._discard(proc)
+        return True
+
+    def prune(self):
+        """Drops idle workers that exited or outlived the idle TTL."""
+        for key in list(self._idle.keys()):
+            healthy = deque()
+            for spawned_at, proc in self._idle[key]:
+                if self._is_healthy(proc, spawned_at):
+                    healthy.append((spawned_at, proc))
+                else:
+                    self._discard(proc)
+            if healthy:
+                self._idle[key] = healthy
+            else:
+                del self._idle[key]
+
+    def discard_matching(self, token: str):
+        """Terminates idle workers whose arguments contain token (e.g. a deleted session UUID)."""
+        for key in [k for k in self._idle if token in k]:
+            for _, proc in self._idle.pop(key):
+                self._discard(proc)
+
+    def _ensure_reaper(self):
+        if self._reaper and not self._reaper.done():
+            return
+        if not self._idle:
+            return
+        self._reaper = asyncio.get_running_loop().create_task(self._reap())
+
+    async def _reap(self):
+        interval = max(1.0, self.idle_ttl / 2)
+        while self._idle:
+            await asyncio.sleep(interval)
+            self.prune()
+
+    def record_ttfb(self, seconds: float, warm: bool):
+        self._ttfb["warm" if warm else "cold"].append(seconds)
+
+    def _summarize(self, samples: Deque[float]) -> Dict[str, Any]:
+        if not samples:
+            return {"count": 0, "avg_ms": None, "p50_ms": None, "p95_ms": None}
+        ordered = sorted(samples)
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+        return {
+            "count": len(ordered),
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95)
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "size": self.size,
+            "max_idle": self.max_idle,
+            "idle_ttl": self.idle_ttl,
+            "idle": self.idle_count(),
+            **self.counters,
+            "ttfb": {
+                "warm": self._summarize(self._ttfb["warm"]),
+                "cold": self._summarize(self._ttfb["cold"])
+            }
+        }
+
+    async def close(self):
+        for task in list(self._refills.values()):
+            task.cancel()
+        if self._reaper:
+            self._reaper.cancel()
+        for bucket in self._idle.values():
+            for _, proc in bucket:
+                self._discard(proc)
+        self._idle.clear()
@@ -0,0 +1,268 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.session_index import content_text
+
+logger = logging.getLogger(__name__)
+
+# A session is one FTS row: its messages joined by this separator (which the tokenizer skips),
+# with blank messages kept as empty segments so a segment's position is its message index
+MESSAGE_SEP = "\x1e"
+SNIPPET_CHARS = 160
+SNIPPET_RESULTS = 50
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def fold(text: str) -> str:
+    """Case and diacritics folding, matching the index's unicode61 tokenizer (remove_diacritics 2)."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+@functools.lru_cache(maxsize=4096)
+def _fold_char(ch: str) -> str:
+    folded = fold(ch)
+    return folded[0] if folded else ch
+
+def _fold_same_length(text: str) -> str:
+    # One character per character, so match offsets in the folded text are offsets in the original
+    if text.isascii():
+        return text.lower()
+    return "".join(_fold_char(ch) for ch in text)
+
+@functools.lru_cache(maxsize=256)
+def _hit_pattern(terms: Tuple[str, ...]) -> "re.Pattern":
+    return re.compile(r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")\w*")
+
+def query_terms(query: str) -> List[str]:
+    return [fold(t) for t in _TOKEN_RE.findall(query)]
+
+def build_match_query(query: str) -> Optional[str]:
+    """Every word of the query as a quoted prefix term ("foo"* "bar"*), or None if it has no words."""
+    terms = _TOKEN_RE.findall(query)
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+def locate_message(content: str, terms: List[str]) -> Tuple[int, str]:
+    """The first message of an indexed session that contains every query term (else any of them): (index, text)."""
+    patterns = [_hit_pattern((t,)) for t in terms]
+    first_any = None
+    for i, text in enumerate(content.split(MESSAGE_SEP)):
+        if not text:
+            continue
+        folded = _fold_same_length(text)
+        # The substring test is much cheaper than the word-boundary regex and rules out most messages
+        found = [t in folded and p.search(folded) is not None for t, p in zip(terms, patterns)]
+        if all(found):
+            return i, text
+        if first_any is None and any(found):
+            first_any = (i, text)
+    return first_any or (0, "")
+
+def make_snippet(text: str, terms: List[str], width: int = SNIPPET_CHARS) -> Tuple[str, List[List[int]]]:
+    """
+    About `width` characters of text around the first hit, cut at word
+    boundaries, and the [start, end) offsets (in code points) of every word in
+    it that starts with a query term. Built in Python from the stored message,
+    which is far cheaper than FTS5's snippet() when many rows match.
+    """
+    hit_re = _hit_pattern(tuple(terms)) if terms else None
+    m = hit_re.search(_fold_same_length(text)) if hit_re else None
+    pos = m.start() if m else 0
+    lo, hi = max(0, pos - width // 4), min(len(text), pos - width // 4 + width)
+    if lo > 0:
+        space = text.find(" ", lo, pos)
+        lo = space + 1 if space >= 0 else lo
+    if hi < len(text):
+        space = text.rfind(" ", max(lo, pos), hi)
+        hi = space if space > pos else hi
+    snippet = ("…" if lo > 0 else "") + " ".join(text[lo:hi].split()) + ("…" if hi < len(text) else "")
+    highlights = [[h.start(), h.end()] for h in hit_re.finditer(_fold_same_length(snippet))] if hit_re else []
+    return snippet, highlights
+
+class SearchIndex:
+    """
+    Full-text index (SQLite FTS5) of the CLI's chat files, so /sessions/search
+    no longer reads every chat file on each keystroke.
+
+    Each session is one row, so ranking (bm25) and prefix matching work on
+    sessions directly and cost the same however many messages match. A session
+    is reindexed when its chat file's mtime or size differ from what was
+    indexed: after each turn, on clone, and at search time for files the CLI
+    changed behind our back. The database is opened on first use.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending: Set[asyncio.Task] = set()
+        self.counters = {"indexed_sessions": 0, "indexed_messages": 0, "searches": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS docs (
+                    doc_id INTEGER PRIMARY KEY,
+                    session_uuid TEXT NOT NULL UNIQUE,
+                    path TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+                    content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    # --- updates ---
+
+    def index_session(self, session_uuid: str, path: str, force: bool = False) -> bool:
+        """Indexes a session's chat file unless it is unchanged since the last time; returns whether it was read."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.remove(session_uuid)
+            return False
+        state = (path, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT doc_id, path, mtime_ns, size FROM docs WHERE session_uuid = ?", (session_uuid,)).fetchone()
+        if row and not force and row[1:] == state:
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                messages = json.load(f).get("messages", [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not index chat file {path}: {e}")
+            return False
+        texts = [content_text(msg.get("content", "")) if isinstance(msg, dict) else "" for msg in messages]
+        content = MESSAGE_SEP.join(t.replace(MESSAGE_SEP, " ") if t.strip() else "" for t in texts)
+        with self._lock:
+            # Another thread may have indexed this session while the file was being read
+            row = conn.execute("SELECT doc_id, path, mtime_ns, size FROM docs WHERE session_uuid = ?", (session_uuid,)).fetchone()
+            if row and not force and row[1:] == state:
+                return False
+            conn.execute("BEGIN")
+            try:
+                if row:
+                    doc_id = row[0]
+                    conn.execute("DELETE FROM sessions_fts WHERE rowid = ?", (doc_id,))
+                    conn.execute("UPDATE docs SET path = ?, mtime_ns = ?, size = ? WHERE doc_id = ?", (*state, doc_id))
+                else:
+                    doc_id = conn.execute("INSERT INTO docs (session_uuid, path, mtime_ns, size) VALUES (?, ?, ?, ?)", (session_uuid, *state)).lastrowid
+                conn.execute("INSERT INTO sessions_fts (rowid, content) VALUES (?, ?)", (doc_id, content))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self.counters["indexed_sessions"] += 1
+        self.counters["indexed_messages"] += len(messages)
+        return True
+
+    def remove(self, session_uuid: str):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT doc_id FROM docs WHERE session_uuid = ?", (session_uuid,)).fetchone()
+            if not row:
+                return
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM sessions_fts WHERE rowid = ?", (row[0],))
+                conn.execute("DELETE FROM docs WHERE doc_id = ?", (row[0],))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def sync(self, paths: Dict[str, str]) -> int:
+        """Reindexes the sessions (uuid -> chat file) whose files changed since they were indexed."""
+        with self._lock:
+            conn = self._connect()
+            known = {u: (p, m, s) for u, p, m, s in conn.execute("SELECT session_uuid, path, mtime_ns, size FROM docs")}
+        count = 0
+        for session_uuid, path in paths.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if known.get(session_uuid) != (path, st.st_mtime_ns, st.st_size):
+                count += self.index_session(session_uuid, path)
+        return count
+
+    def schedule(self, session_uuid: str, resolve: Callable[[str], Optional[str]]):
+        """Reindexes a session in a worker thread without blocking the caller; resolve maps the UUID to its chat file."""
+        def run():
+            try:
+                path = resolve(session_uuid)
+                if path:
+                    self.index_session(session_uuid, path)
+                else:
+                    self.remove(session_uuid)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Could not update search index for {session_uuid}: {e}")
+        try:
+            task = asyncio.get_running_loop().create_task(asyncio.to_thread(run))
+        except RuntimeError:
+            run()
+            return
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    # --- queries ---
+
+    def search(self, query: str, session_uuids: Iterable[str], snippets: int = SNIPPET_RESULTS) -> List[Dict[str, Any]]:
+        """
+        The given sessions that contain every word of the query (each word is a
+        prefix term), best first (bm25). The first `snippets` results also carry
+        the index of the matching message, a snippet and the highlight offsets
+        in it; the rest are not read back from the index.
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+        with self._lock:
+            conn = self._connect()
+            self.counters["searches"] += 1
+            wanted = set(session_uuids)
+            docs = {doc_id: u for doc_id, u in conn.execute("SELECT doc_id, session_uuid FROM docs") if u in wanted}
+            ranked = [(doc_id, score) for doc_id, score in conn.execute(
+                "SELECT rowid, bm25(sessions_fts) FROM sessions_fts WHERE sessions_fts MATCH ? ORDER BY bm25(sessions_fts)", (match,)
+            ) if doc_id in docs]
+            top = [doc_id for doc_id, _ in ranked[:snippets]]
+            contents = dict(conn.execute(f"SELECT rowid, content FROM sessions_fts WHERE rowid IN ({','.join('?' * len(top))})", top)) if top else {}
+        terms = query_terms(query)
+        results = []
+        for doc_id, score in ranked:
+            hit = {"uuid": docs[doc_id], "score": score}
+            if doc_id in contents:
+                raw_index, text = locate_message(contents[doc_id], terms)
+                snippet, highlights = make_snippet(text, terms)
+                hit.update(raw_index=raw_index, snippet=snippet, highlights=highlights)
+            results.append(hit)
+        return results
+
+    def get_metrics(self) -> Dict[str, Any]:
+        metrics = {"pending_updates": len(self._pending), **self.counters}
+        if self._conn is not None:
+            with self._lock:
+                metrics["documents"] = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        return metrics
+
+    async def aclose(self):
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,343 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEAD_BYTES = 16 * 1024
+TAIL_BYTES = 4 * 1024
+MAX_HEAD_BYTES = 4 * 1024 * 1024
+TITLE_MAX_LEN = 100
+
+_STRING = r'"((?:[^"\\]|\\.)*)"'
+_FIELD_RES = {k: re.compile(rf'"{k}"\s*:\s*{_STRING}') for k in ("sessionId", "startTime", "lastUpdated")}
+# Only a top-level summary (the last key of the document) counts, not one inside a tool call
+_SUMMARY_RE = re.compile(rf'"summary"\s*:\s*{_STRING}\s*\}}\s*$')
+_MESSAGES_RE = re.compile(r'"messages"\s*:\s*\[')
+_SKIP_RE = re.compile(r'[\s,]*')
+_UUID_RE = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+def _unescape(value: str) -> str:
+    try:
+        return json.loads(f'"{value}"')
+    except ValueError:
+        return value
+
+def content_text(content: Any) -> str:
+    """Plain text of a message's content (a string or a list of parts)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(p["text"] if isinstance(p, dict) and "text" in p else p if isinstance(p, str) else "" for p in content)
+    return str(content)
+
+def format_relative_time(timestamp: Optional[str], now: Optional[datetime] = None) -> str:
+    """Same wording as `gemini --list-sessions`."""
+    if not timestamp:
+        return "Unknown"
+    try:
+        then = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return "Unknown"
+    if then.tzinfo is None:
+        then = then.replace(tzinfo=timezone.utc)
+    seconds = int(((now or datetime.now(timezone.utc)) - then).total_seconds())
+    minutes, hours, days = seconds // 60, seconds // 3600, seconds // 86400
+    if days > 0: return f"{days} day{'s' if days != 1 else ''} ago"
+    if hours > 0: return f"{hours} hour{'s' if hours != 1 else ''} ago"
+    if minutes > 0: return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
+    return "Just now"
+
+def read_chat_header(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Reads sessionId, startTime, lastUpdated and the first user message of a CLI
+    chat file without parsing the whole document. Only the first bytes are
+    decoded (more if the first user message is larger), plus the tail for
+    fields written after the messages array.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        want = HEAD_BYTES
+        while True:
+            f.seek(0)
+            text = f.read(want).decode("utf-8", errors="ignore")
+            complete = want >= size
+            m = _MESSAGES_RE.search(text)
+            head = text[:m.start()] if m else text
+            header = {}
+            for key in ("sessionId", "startTime", "lastUpdated"):
+                fm = _FIELD_RES[key].search(head)
+                if fm: header[key] = _unescape(fm.group(1))
+            first_user, done = None, m is None and complete
+            if m:
+                decoder = json.JSONDecoder()
+                pos = m.end()
+                while True:
+                    pos = _SKIP_RE.match(text, pos).end()
+                    if pos >= len(text) or text[pos] == "]":
+                        done = pos < len(text) or complete
+                        break
+                    try:
+                        msg, pos = decoder.raw_decode(text, pos)
+                    except ValueError:
+                        done = complete
+                        break
+                    if isinstance(msg, dict) and msg.get("type") == "user":
+                        first_user = content_text(msg.get("content", ""))
+                        done = True
+                        break
+            if done or want >= MAX_HEAD_BYTES:
+                break
+            want *= 4
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read().decode("utf-8", errors="ignore")
+        sm = _SUMMARY_RE.search(tail)
+        if sm: header["summary"] = _unescape(sm.group(1))
+        if "lastUpdated" not in header:
+            matches = list(_FIELD_RES["lastUpdated"].finditer(tail))
+            if matches: header["lastUpdated"] = _unescape(matches[-1].group(1))
+    if "sessionId" not in header:
+        return None
+    header["firstUserMessage"] = first_user
+    return header
+
+def describe_session(header: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, str]:
+    """The session_metadata entry get_user_sessions caches: the CLI's display title and relative time."""
+    title = header.get("summary") or header.get("firstUserMessage") or "Empty conversation"
+    title = re.sub(r"\s+", " ", title).strip()
+    if len(title) > TITLE_MAX_LEN:
+        title = title[:TITLE_MAX_LEN - 3] + "..."
+    return {
+        "original_title": title,
+        "time": format_relative_time(header.get("lastUpdated") or header.get("startTime"), now)
+    }
+
+class SessionIndex:
+    """
+    Reads session metadata straight from the CLI's chat files under
+    ~/.gemini/tmp/*/chats instead of spawning `gemini --list-sessions`.
+
+    Chat files are indexed by the UUID prefix in their file name. The index is
+    built once and kept current by polling directory mtimes (at most every
+    poll_interval seconds, or immediately on a miss), so only directories whose
+    listing changed are rescanned. Headers are cached per file and re-read only
+    when mtime or size change.
+
+    Callers run it from worker threads (asyncio.to_thread, the search indexer),
+    so the index and the header cache are only touched under one re-entrant
+    lock; resolving takes it once around its refreshes and header reads.
+    """
+    def __init__(self, base_dir: Optional[str] = None, working_dir: Optional[str] = None, poll_interval: float = 2.0):
+        self._base_dir = base_dir
+        self.working_dir = working_dir
+        self.poll_interval = poll_interval
+        self._headers: Dict[str, Tuple[int, int, Optional[Dict[str, Any]]]] = {}
+        self._by_prefix: Dict[str, Set[str]] = {}
+        self._dir_state: Dict[str, Tuple[int, Set[str]]] = {}
+        self._dirs: List[str] = []
+        self._indexed_base: Optional[str] = None
+        self._base_mtime: Optional[int] = None
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+        self.counters = {"header_reads": 0, "cache_hits": 0, "dir_scans": 0}
+
+    @property
+    def base_dir(self) -> str:
+        return self._base_dir or os.path.join(os.path.expanduser("~"), ".gemini", "tmp")
+
+    def project_chat_dir(self) -> Optional[str]:
+        """The chats directory the CLI uses for working_dir (sha256 of the project root)."""
+        if not self.working_dir:
+            return None
+        project_hash = hashlib.sha256(os.path.abspath(self.working_dir).encode("utf-8")).hexdigest()
+        return os.path.join(self.base_dir, project_hash, "chats")
+
+    def chat_dirs(self) -> List[str]:
+        try:
+            projects = os.scandir(self.base_dir)
+        except OSError:
+            return []
+        with projects:
+            return [os.path.join(p.path, "chats") for p in projects if p.is_dir() and os.path.isdir(os.path.join(p.path, "chats"))]
+
+    @staticmethod
+    def _name_key(name: str) -> str:
+        # CLI files end with the first 8 hex digits of the UUID; other tools put the whole UUID in the name
+        m = _UUID_RE.search(name)
+        if m:
+            return m.group(0).split("-")[0].lower()
+        return name[:-5].rsplit("-", 1)[-1].lower()
+
+    # --- path index ---
+
+    def _reset(self):
+        self._by_prefix.clear()
+        self._dir_state.clear()
+        self._dirs = []
+        self._base_mtime = None
+
+    def _forget(self, path: str):
+        paths = self._by_prefix.get(self._name_key(os.path.basename(path)))
+        if paths:
+            paths.discard(path)
+        self._headers.pop(path, None)
+
+    def _drop_dir(self, d: str):
+        _, names = self._dir_state.pop(d, (None, set()))
+        for name in names:
+            self._forget(os.path.join(d, name))
+
+    def _scan_dir(self, d: str):
+        try:
+            mtime = os.stat(d).st_mtime_ns
+        except OSError:
+            self._drop_dir(d)
+            return
+        state = self._dir_state.get(d)
+        if state and state[0] == mtime:
+            return
+        self.counters["dir_scans"] += 1
+        old_names = state[1] if state else set()
+        names = set()
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.name.endswith(".json") and e.is_file():
+                        names.add(e.name)
+        except OSError:
+            self._drop_dir(d)
+            return
+        for name in names - old_names:
+            self._by_prefix.setdefault(self._name_key(name), set()).add(os.path.join(d, name))
+        for name in old_names - names:
+            self._forget(os.path.join(d, name))
+        self._dir_state[d] = (mtime, names)
+
+    def refresh(self, force: bool = False):
+        """Brings the path index up to date; only directories whose mtime changed are listed again."""
+        with self._lock:
+            self._refresh(force)
+
+    def _refresh(self, force: bool):
+        now = time.monotonic()
+        if not force and self._indexed_base is not None and now - self._last_refresh < self.poll_interval:
+            return
+        self._last_refresh = now
+        base = self.base_dir
+        if base != self._indexed_base:
+            self._reset()
+            self._indexed_base = base
+        try:
+            base_mtime = os.stat(base).st_mtime_ns
+        except OSError:
+            self._reset()
+            return
+        if base_mtime != self._base_mtime:
+            self._dirs = self.chat_dirs()
+            self._base_mtime = base_mtime
+        current = set(self._dirs)
+        for d in [d for d in self._dir_state if d not in current]:
+            self._drop_dir(d)
+        for d in self._dirs:
+            self._scan_dir(d)
+
+    def _candidates(self, session_uuid: str) -> List[Tuple[int, str, Optional[Dict[str, Any]]]]:
+        matches = []
+        for path in list(self._by_prefix.get(session_uuid.split("-")[0].lower(), ())):
+            try:
+                st = os.stat(path)
+            except OSError:
+                self._forget(path) # disappeared since the last scan
+                continue
+            header = self._header(path, st)
+            if (header and header["sessionId"] == session_uuid) or (not header and session_uuid in os.path.basename(path)):
+                matches.append((st.st_mtime_ns, path, header))
+        matches.sort(key=lambda m: m[0], reverse=True)
+        return matches
+
+    def _resolve_many(self, uuids: Iterable[str]) -> Dict[str, Tuple[str, Optional[Dict[str, Any]]]]:
+        with self._lock:
+            return self._resolve_locked(uuids)
+
+    def _resolve_locked(self, uuids: Iterable[str]) -> Dict[str, Tuple[str, Optional[Dict[str, Any]]]]:
+        self._refresh(False)
+        wanted = list(dict.fromkeys(uuids))
+        found = {}
+        for attempt in range(2):
+            for u in wanted:
+                if u in found: continue
+                matches = self._candidates(u)
+                if matches:
+                    found[u] = (matches[0][1], matches[0][2])
+            if len(found) == len(wanted) or attempt:
+                break
+            # A miss may be a file created since the last poll
+            self._refresh(True)
+        return found
+
+    def resolve(self, session_uuid: str) -> Optional[str]:
+        """Path of the newest chat file of a session, or None."""
+        found = self._resolve_many([session_uuid]).get(session_uuid)
+        return found[0] if found else None
+
+    def resolve_many(self, uuids: Iterable[str]) -> Dict[str, str]:
+        """Paths of the newest chat files of several sessions; unknown sessions are left out."""
+        return {u: path for u, (path, _) in self._resolve_many(uuids).items()}
+
+    # --- headers ---
+
+    def header(self, path: str, stat: Optional[os.stat_result] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._header(path, stat)
+
+    def _header(self, path: str, stat: Optional[os.stat_result]) -> Optional[Dict[str, Any]]:
+        try:
+            st = stat or os.stat(path)
+        except OSError:
+            self._headers.pop(path, None)
+            return None
+        cached = self._headers.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            self.counters["cache_hits"] += 1
+            return cached[2]
+        try:
+            header = read_chat_header(path)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning(f"Could not read chat header {path}: {e}")
+            header = None
+        self.counters["header_reads"] += 1
+        self._headers[path] = (st.st_mtime_ns, st.st_size, header)
+        return header
+
+    def lookup(self, uuids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Headers for the given session UUIDs; sessions without a readable chat file are left out."""
+        return {u: dict(header, path=path) for u, (path, header) in self._resolve_many(uuids).items() if header}
+
+    def latest_session(self) -> Optional[str]:
+        """Most recently started session of working_dir's project, like the last line of --list-sessions."""
+        with self._lock:
+            self._refresh(False)
+            project_dir = self.project_chat_dir()
+            dirs = [project_dir] if project_dir in self._dir_state else list(self._dir_state)
+            latest = None
+            for d in dirs:
+                for name in self._dir_state[d][1]:
+                    header = self._header(os.path.join(d, name), None)
+                    if header and (latest is None or (header.get("startTime") or "") > (latest.get("startTime") or "")):
+                        latest = header
+        return latest["sessionId"] if latest else None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directories": len(self._dir_state),
+                "files": sum(len(names) for _, names in self._dir_state.values()),
+                "headers_cached": len(self._headers),
+                **self.counters
+            }
@@ -0,0 +1,379 @@
+import json
+import logging
+import os
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from app.services.write_behind import WriteBehind, WriteBehindJSON
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    "show_mic": True,
+    "interactive_mode": True,
+    "copy_formatted": False,
+    "default_model": "gemini-3-pro-preview"
+}
+
+# Per-session maps inside a user's entry, and the sessions table column that holds each
+SESSION_MAPS = (
+    ("custom_titles", "title"),
+    ("session_tools", "tools"),
+    ("session_tags", "tags"),
+    ("session_metadata", "metadata"),
+    ("session_forks", "fork"),
+)
+LIST_KEYS = ("sessions", "pinned_sessions")
+
+def normalize_user_entry(info: Dict) -> Dict:
+    if "sessions" not in info: info["sessions"] = []
+    if "active_session" not in info: info["active_session"] = None
+    if "session_tools" not in info: info["session_tools"] = {}
+    if "session_tags" not in info: info["session_tags"] = {}
+    if "pending_tools" not in info: info["pending_tools"] = []
+    if "pinned_sessions" not in info: info["pinned_sessions"] = []
+    if "session_metadata" not in info: info["session_metadata"] = {}
+    if "settings" not in info:
+        info["settings"] = dict(DEFAULT_SETTINGS)
+    else:
+        # Ensure defaults for existing settings objects
+        if "copy_formatted" not in info["settings"]:
+            info["settings"]["copy_formatted"] = False
+        if "default_model" not in info["settings"]:
+            info["settings"]["default_model"] = DEFAULT_SETTINGS["default_model"]
+    return info
+
+def normalize_user_data(data: Dict) -> Dict:
+    """Upgrades a loaded user_sessions.json, including the legacy {user_id: session_uuid} format."""
+    if not data: return {}
+    if isinstance(next(iter(data.values())), str):
+        return {uid: {"active_session": suid, "sessions": [suid], "session_tools": {}} for uid, suid in data.items()}
+    for uid in data:
+        normalize_user_entry(data[uid])
+    return data
+
+def load_json_user_data(path: str) -> Dict:
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return normalize_user_data(json.load(f))
+        except: return {}
+    return {}
+
+class JSONSessionStore(WriteBehindJSON):
+    """The whole user_data dict in one JSON file, rewritten (batched) on every change."""
+    backend = "json"
+
+    def __init__(self, path: str, delay: float = 0.5, max_delay: float = 5.0):
+        self._data: Dict = {}
+        super().__init__(path, lambda: self._data, delay, max_delay)
+
+    def load(self) -> Dict:
+        self._data = load_json_user_data(self.path)
+        return self._data
+
+    def save(self, data: Dict, user_id: Optional[str] = None):
+        self._data = data
+        self.mark_dirty()
+
+    def other_owners(self, data: Dict, user_id: str, session_uuid: str) -> Set[str]:
+        return {uid for uid, info in data.items() if uid != user_id and session_uuid in info.get("sessions", [])}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"backend": self.backend, **super().get_metrics()}
+
+class LazyUserData(dict):
+    """
+    user_data for the SQLite backend: a user's entry is read from the database the
+    first time it is touched, so only active users are held in memory.
+    """
+    def __init__(self, loader: Callable[[str], Optional[Dict]], user_ids: Iterable[str]):
+        super().__init__()
+        self._loader = loader
+        self.known: Set[str] = set(user_ids)
+        self.deleted: Set[str] = set()
+
+    def _ensure(self, user_id) -> bool:
+        if dict.__contains__(self, user_id):
+            return True
+        if user_id not in self.known:
+            return False
+        entry = self._loader(user_id)
+        if entry is None:
+            self.known.discard(user_id)
+            return False
+        dict.__setitem__(self, user_id, entry)
+        return True
+
+    def __contains__(self, user_id):
+        return dict.__contains__(self, user_id) or user_id in self.known
+
+    def __getitem__(self, user_id):
+        if not self._ensure(user_id):
+            raise KeyError(user_id)
+        return dict.__getitem__(self, user_id)
+
+    def get(self, user_id, default=None):
+        return dict.__getitem__(self, user_id) if self._ensure(user_id) else default
+
+    def __setitem__(self, user_id, value):
+        self.known.add(user_id)
+        self.deleted.discard(user_id)
+        dict.__setitem__(self, user_id, value)
+
+    def setdefault(self, user_id, default=None):
+        if not self._ensure(user_id):
+            self[user_id] = default
+        return dict.__getitem__(self, user_id)
+
+    def __delitem__(self, user_id):
+        if not self._ensure(user_id):
+            raise KeyError(user_id)
+        dict.__delitem__(self, user_id)
+        self.known.discard(user_id)
+        self.deleted.add(user_id)
+
+    _missing = object()
+
+    def pop(self, user_id, default=_missing):
+        if self._ensure(user_id):
+            value = dict.__getitem__(self, user_id)
+            del self[user_id]
+            return value
+        if default is LazyUserData._missing:
+            raise KeyError(user_id)
+        return default
+
+    def _load_all(self):
+        for user_id in list(self.known):
+            self._ensure(user_id)
+
+    def __iter__(self):
+        self._load_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        return len(self.known)
+
+    def keys(self):
+        self._load_all()
+        return dict.keys(self)
+
+    def items(self):
+        self._load_all()
+        return dict.items(self)
+
+    def values(self):
+        self._load_all()
+        return dict.values(self)
+
+UserRows = Tuple[str, Dict[str, tuple]]
+
+class SQLiteSessionStore(WriteBehind):
+    """
+    user_data in SQLite (WAL): one row per user for the user-level fields and one
+    row per (user, session) for titles, tools, tags, metadata, forks and list
+    positions. A save only rewrites the rows of the users that changed, and only
+    the rows whose content differs from what is on disk.
+    """
+    backend = "sqlite"
+
+    def __init__(self, path: str, delay: float = 0.5, max_delay: float = 5.0, legacy_json: Optional[str] = None):
+        super().__init__(delay, max_delay)
+        self.path = path
+        self.legacy_json = legacy_json
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sessions (
+                    user_id TEXT NOT NULL,
+                    session_uuid TEXT NOT NULL,
+                    position INTEGER,
+                    pin_position INTEGER,
+                    title TEXT,
+                    tools TEXT,
+                    tags TEXT,
+                    metadata TEXT,
+                    fork TEXT,
+                    PRIMARY KEY (user_id, session_uuid)
+                );
+                CREATE INDEX IF NOT EXISTS idx_sessions_uuid ON sessions(session_uuid);
+            """)
+        self._data: Dict = {}
+        self._dirty_users: Set[str] = set()
+        self._all_dirty = False
+        self._rows: Dict[str, UserRows] = {} # last state known to be on disk, per user
+        self._user_seq: Dict[str, int] = {}
+
+    # --- row mapping ---
+
+    @staticmethod
+    def _to_rows(info: Dict) -> UserRows:
+        user_fields = {k: v for k, v in info.items() if k not in LIST_KEYS and k not in dict(SESSION_MAPS)}
+        rows: Dict[str, list] = {}
+        def row(session_uuid):
+            if session_uuid not in rows:
+                rows[session_uuid] = [None] * (2 + len(SESSION_MAPS))
+            return rows[session_uuid]
+        for i, session_uuid in enumerate(info.get("sessions", [])):
+            row(session_uuid)[0] = i
+        for i, session_uuid in enumerate(info.get("pinned_sessions", [])):
+            row(session_uuid)[1] = i
+        for col, (key, _) in enumerate(SESSION_MAPS, start=2):
+            for session_uuid, value in (info.get(key) or {}).items():
+                row(session_uuid)[col] = json.dumps(value)
+        return json.dumps(user_fields), {k: tuple(v) for k, v in rows.items()}
+
+    @staticmethod
+    def _from_rows(user_json: str, rows: Iterable[tuple]) -> Dict:
+        info = json.loads(user_json)
+        sessions, pinned = [], []
+        maps: Dict[str, Dict] = {key: {} for key, _ in SESSION_MAPS}
+        for session_uuid, position, pin_position, *values in rows:
+            if position is not None: sessions.append((position, session_uuid))
+            if pin_position is not None: pinned.append((pin_position, session_uuid))
+            for (key, _), value in zip(SESSION_MAPS, values):
+                if value is not None:
+                    maps[key][session_uuid] = json.loads(value)
+        info["sessions"] = [u for _, u in sorted(sessions)]
+        info["pinned_sessions"] = [u for _, u in sorted(pinned)]
+        for key, values in maps.items():
+            if values or key not in ("custom_titles", "session_forks"):
+                info[key] = values
+        return normalize_user_entry(info)
+
+    # --- loading ---
+
+    def _load_user(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            user = self._conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if not user:
+                return None
+            cols = ", ".join(col for _, col in SESSION_MAPS)
+            rows = self._conn.execute(f"SELECT session_uuid, position, pin_position, {cols} FROM sessions WHERE user_id = ?", (user_id,)).fetchall()
+            self._rows[user_id] = (user[0], {r[0]: tuple(r[1:]) for r in rows})
+        return self._from_rows(user[0], rows)
+
+    def load(self) -> LazyUserData:
+        with self._lock:
+            empty = self._conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+        if empty and self.legacy_json and os.path.exists(self.legacy_json):
+            count = self.migrate_from_json(self.legacy_json)
+            logger.info(f"Migrated {count} users from {self.legacy_json} to {self.path}")
+        with self._lock:
+            user_ids = [r[0] for r in self._conn.execute("SELECT user_id FROM users")]
+        self._data = LazyUserData(self._load_user, user_ids)
+        return self._data
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """One-shot import of a user_sessions.json (either format). Existing rows of the same users are replaced."""
+        data = load_json_user_data(json_path)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for user_id, info in data.items():
+                    self._apply(user_id, self._to_rows(info), None)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(data)
+
+    # --- saving ---
+
+    def save(self, data: Dict, user_id: Optional[str] = None):
+        self._data = data
+        if user_id is None:
+            self._all_dirty = True
+        else:
+            self._dirty_users.add(user_id)
+        self.mark_dirty()
+
+    def _snapshot(self):
+        data = self._data
+        if self._all_dirty:
+            users = set(dict.keys(data)) | set(getattr(data, "deleted", ())) | set(self._rows)
+        else:
+            users = self._dirty_users
+        self._dirty_users = set()
+        self._all_dirty = False
+        payload = []
+        for user_id in users:
+            info = dict.get(data, user_id)
+            if info is not None:
+                payload.append((user_id, self._to_rows(info)))
+            elif user_id not in getattr(data, "known", ()):
+                payload.append((user_id, None)) # removed from user_data
+        return payload
+
+    def _apply(self, user_id: str, state: Optional[UserRows], old: Optional[UserRows]):
+        conn = self._conn
+        if state is None:
+            conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            self._rows.pop(user_id, None)
+            return
+        user_json, rows = state
+        old_json, old_rows = old if old else (None, {})
+        if old is None:
+            conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        if user_json != old_json:
+            conn.execute("INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)", (user_id, user_json))
+        changed = [(user_id, u) + r for u, r in rows.items() if old_rows.get(u) != r]
+        if changed:
+            conn.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", changed)
+        removed = [(user_id, u) for u in old_rows if u not in rows]
+        if removed:
+            conn.executemany("DELETE FROM sessions WHERE user_id = ? AND session_uuid = ?", removed)
+        self._rows[user_id] = state
+
+    def _persist(self, seq: int, payload):
+        self._conn.execute("BEGIN")
+        try:
+            for user_id, state in payload:
+                if self._user_seq.get(user_id, 0) > seq:
+                    continue # a newer snapshot of this user is already on disk
+                self._apply(user_id, state, self._rows.get(user_id))
+                self._user_seq[user_id] = seq
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            # Force full rewrites of these users next time
+            for user_id, _ in payload:
+                self._rows.pop(user_id, None)
+            raise
+
+    def other_owners(self, data: Dict, user_id: str, session_uuid: str) -> Set[str]:
+        owners = {uid for uid, info in dict.items(data) if session_uuid in info.get("sessions", [])}
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id FROM sessions WHERE session_uuid = ? AND position IS NOT NULL", (session_uuid,)).fetchall()
+        owners.update(uid for (uid,) in rows if not dict.__contains__(data, uid))
+        owners.discard(user_id)
+        return owners
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "users_known": len(self._data),
+            "users_loaded": dict.__len__(self._data),
+            **super().get_metrics()
+        }
+
+    async def aclose(self):
+        await super().aclose()
+        with self._lock:
+            self._conn.close()
+
+def create_session_store(backend: str, working_dir: str, delay: float = 0.5, max_delay: float = 5.0):
+    json_path = os.path.join(working_dir, "user_sessions.json")
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.path.join(working_dir, "user_sessions.db"), delay, max_delay, legacy_json=json_path)
+    if backend != "json":
+        logger.warning(f"Unknown SESSION_STORE '{backend}', using json")
+    return JSONSessionStore(json_path, delay, max_delay)
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HIGH_DEMAND_MARKER = "High demand. Retry?"
+
+class SessionWorker:
+    """A long-lived CLI process bound to one chat session. Prompts are fed over stdin, one JSON line per turn."""
+    def __init__(self, proc, key: Tuple[str, ...]):
+        self.proc = proc
+        self.key = key
+        self.session_uuid: Optional[str] = None
+        self.busy = False
+        self.turns = 0
+        self.last_used = time.monotonic()
+        self.stderr_lines: deque = deque(maxlen=200)
+        self.high_demand = False
+        self._stderr_task = None
+        if getattr(proc, "stderr", None) is not None:
+            try:
+                self._stderr_task = asyncio.get_running_loop().create_task(self._drain_stderr())
+            except RuntimeError:
+                pass
+
+    async def _drain_stderr(self):
+        # The pipe never reaches EOF between turns, so one reader lives as long as the process
+        while True:
+            line = await self.proc.stderr.readline()
+            if not line: break
+            line_str = line.decode(errors='replace').strip()
+            self.stderr_lines.append(line_str)
+            if HIGH_DEMAND_MARKER in line_str:
+                self.high_demand = True
+                self.terminate()
+
+    def is_alive(self) -> bool:
+        return getattr(self.proc, "returncode", None) is None
+
+    def begin_turn(self):
+        self.busy = True
+        self.high_demand = False
+        self.stderr_lines.clear()
+
+    async def send(self, text: str):
+        data = (json.dumps({"type": "message", "role": "user", "content": text}) + "\n").encode('utf-8')
+        stdin = self.proc.stdin
+        if hasattr(stdin, 'drain'):
+            stdin.write(data)
+            await stdin.drain()
+        else:
+            def sync_write():
+                stdin.write(data)
+                stdin.flush()
+            await asyncio.to_thread(sync_write)
+
+    def rss_bytes(self, fallback: int) -> int:
+        """Resident memory of the worker, read from /proc where available."""
+        pid = getattr(self.proc, "pid", None)
+        if isinstance(pid, int):
+            try:
+                with open(f"/proc/{pid}/statm", "r") as f:
+                    resident_pages = int(f.read().split()[1])
+                return resident_pages * os.sysconf("SC_PAGE_SIZE")
+            except (OSError, ValueError, IndexError):
+                pass
+        return fallback
+
+    def terminate(self):
+        try:
+            if self.is_alive():
+                self.proc.terminate()
+        except Exception:
+            pass
+
+    def close(self):
+        self.terminate()
+        if self._stderr_task:
+            self._stderr_task.cancel()
+
+class SessionWorkerPool:
+    """
+    Keeps one CLI process alive per active session so a turn does not replay the
+    whole session file through --resume. Idle workers are evicted least recently
+    used first once their combined resident memory exceeds the budget.
+    """
+    def __init__(self, spawn: Callable[[List[str]], Awaitable[Any]], enabled: bool = False, memory_budget_mb: int = 512, worker_estimate_mb: int = 150, extra_args: Optional[List[str]] = None):
+        self.spawn = spawn
+        self.enabled = enabled
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.worker_estimate = worker_estimate_mb * 1024 * 1024
+        self.extra_args = list(extra_args or [])
+        self._workers: "OrderedDict[str, SessionWorker]" = OrderedDict()
+        self.counters = {"reused": 0, "started": 0, "evicted": 0, "discarded": 0}
+
+    def is_busy(self, session_uuid: Optional[str]) -> bool:
+        worker = self._workers.get(session_uuid) if session_uuid else None
+        return bool(worker and worker.busy)
+
+    def get(self, session_uuid: Optional[str], key: Tuple[str, ...]) -> Optional[SessionWorker]:
+        """Returns the idle worker for a session, or None if there is none or its CLI options changed."""
+        if not session_uuid:
+            return None
+        worker = self._workers.get(session_uuid)
+        if not worker:
+            return None
+        if worker.busy:
+            return None
+        if not worker.is_alive() or worker.key != key:
+            self.discard(worker)
+            return None
+        self._workers.move_to_end(session_uuid)
+        self.counters["reused"] += 1
+        return worker
+
+    async def start(self, args: List[str], key: Tuple[str, ...]) -> SessionWorker:
+        proc = await self.spawn(list(args) + self.extra_args)
+        self.counters["started"] += 1
+        return SessionWorker(proc, key)
+
+    def release(self, worker: SessionWorker, session_uuid: Optional[str]):
+        """Marks a worker idle after a completed turn and files it under its session."""
+        worker.busy = False
+        worker.turns += 1
+        worker.last_used = time.monotonic()
+        if not session_uuid or not worker.is_alive():
+            self.discard(worker)
+            return
+        existing = self._workers.get(session_uuid)
+        if existing is not None and existing is not worker:
+            self.discard(existing)
+        worker.session_uuid = session_uuid
+        self._workers[session_uuid] = worker
+        self._workers.move_to_end(session_uuid)
+        self.enforce_budget()
+
+    def discard(self, worker: SessionWorker):
+        if worker.session_uuid and self._workers.get(worker.session_uuid) is worker:
+            del self._workers[worker.session_uuid]
+        self.counters["discarded"] += 1
+        worker.close()
+
+    def discard_session(self, session_uuid: str):
+        worker = self._workers.get(session_uuid)
+        if worker:
+            self.discard(worker)
+
+    def memory_usage(self) -> int:
+        return sum(w.rss_bytes(self.worker_estimate) for w in self._workers.values())
+
+    def enforce_budget(self):
+        usage = self.memory_usage()
+        for session_uuid in list(self._workers.keys()):
+            if usage <= self.memory_budget:
+                break
+            worker = self._workers[session_uuid]
+            if worker.busy:
+                continue
+            usage -= worker.rss_bytes(self.worker_estimate)
+            self.counters["evicted"] += 1
+            self.discard(worker)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "workers": len(self._workers),
+            "busy": sum(1 for w in self._workers.values() if w.busy),
+            "memory_mb": round(self.memory_usage() / (1024 * 1024), 1),
+            "memory_budget_mb": round(self.memory_budget / (1024 * 1024), 1),
+            **self.counters
+        }
+
+    async def close(self):
+        for worker in list(self._workers.values()):
+            worker.close()
+        self._workers.clear()
@@ -0,0 +1,263 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+# States of the question-card extractor
+S_TEXT = 0
+S_TICKS = 1       # counting backticks that may open a fence
+S_FENCE_INFO = 2  # reading the info string after ``` (e.g. "json")
+S_FENCE_GAP = 3   # whitespace between the fence line and a possible '{'
+S_JSON = 4        # inside a candidate {...} object
+S_CLOSE_GAP = 5   # whitespace after a fenced question, before the closing ```
+S_CLOSE_TICKS = 6
+
+# A question card must start like {"type": "question", with optional whitespace between tokens
+QUESTION_PREFIX = ('"type"', ':', '"question"')
+MAX_FENCE_INFO = 32
+
+_TEXT_SPECIAL = re.compile(r"[{`]")
+_JSON_SPECIAL = re.compile(r'[{}"\\]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+class QuestionStreamParser:
+    """
+    Incremental extractor for interactive question cards in assistant text.
+
+    feed() takes the next chunk of assistant content and returns the text that is
+    safe to show plus any complete question objects. Candidate JSON (optionally
+    wrapped in a ```json fence) is withheld only while it can still turn out to be
+    a question card; anything else is released as soon as that is ruled out. Each
+    character is looked at a constant number of times, so work is O(chunk).
+    """
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.state = S_TEXT
+        self.in_plain_fence = False
+        self._pending: List[str] = [] # withheld fence/gap text preceding the JSON
+        self._json: List[str] = []
+        self._fenced = False
+        self._ticks = 0
+        self._info: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._token = 0
+        self._token_pos = 0
+        self._matched = False
+
+    @property
+    def is_buffering(self) -> bool:
+        return self.state != S_TEXT
+
+    def _release(self, out: List[str]):
+        out.extend(self._pending)
+        out.extend(self._json)
+        self._pending = []
+        self._json = []
+
+    def _start_json(self, fenced: bool):
+        self.state = S_JSON
+        self._fenced = fenced
+        self._json = ["{"]
+        self._depth = 1
+        self._in_string = False
+        self._escape = False
+        self._token = 0
+        self._token_pos = 0
+        self._matched = False
+
+    def _advance_prefix(self, c: str) -> bool:
+        """Feeds one char to the question-prefix matcher. Returns False once the object cannot be a question."""
+        if self._token_pos == 0 and c.isspace():
+            return True
+        token = QUESTION_PREFIX[self._token]
+        if c != token[self._token_pos]:
+            return False
+        self._token_pos += 1
+        if self._token_pos == len(token):
+            self._token += 1
+            self._token_pos = 0
+            if self._token == len(QUESTION_PREFIX):
+                self._matched = True
+        return True
+
+    def _track(self, c: str):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+        elif c == '"':
+            self._in_string = True
+        elif c == "{":
+            self._depth += 1
+        elif c == "}":
+            self._depth -= 1
+
+    def _finish_json(self, out: List[str], questions: List[Dict]):
+        text = "".join(self._json)
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and data.get("type") == "question":
+            questions.append(data)
+            self._json = []
+            if self._fenced:
+                # Swallow the fence and the whitespace around the card
+                self._pending = []
+                self.state = S_CLOSE_GAP
+            else:
+                self._release(out)
+                self.state = S_TEXT
+        else:
+            if self._fenced:
+                self.in_plain_fence = True
+            self._release(out)
+            self.state = S_TEXT
+
+    def _feed_json(self, chunk: str, i: int, out: List[str], questions: List[Dict]) -> int:
+        n = len(chunk)
+        # The prefix check runs char by char but only over the first few tokens
+        while i < n and not self._matched:
+            c = chunk[i]
+            self._json.append(c)
+            i += 1
+            self._track(c)
+            if not self._advance_prefix(c):
+                if self._fenced:
+                    self.in_plain_fence = True
+                self._release(out)
+                self.state = S_TEXT
+                return i
+        # Confirmed question prefix: jump between structural characters until the object closes
+        start = i
+        while i < n:
+            pattern = _STRING_SPECIAL if self._in_string else _JSON_SPECIAL
+            if self._escape:
+                self._escape = False
+                i += 1
+                continue
+            m = pattern.search(chunk, i)
+            if not m:
+                i = n
+                break
+            i = m.end()
+            self._track(m.group())
+            if self._depth == 0:
+                self._json.append(chunk[start:i])
+                self._finish_json(out, questions)
+                return i
+        self._json.append(chunk[start:i])
+        return i
+
+    def feed(self, chunk: str) -> Tuple[str, List[Dict]]:
+        out: List[str] = []
+        questions: List[Dict] = []
+        i = 0
+        n = len(chunk)
+        while i < n:
+            state = self.state
+            if state == S_TEXT:
+                m = _TEXT_SPECIAL.search(chunk, i)
+                if not m:
+                    out.append(chunk[i:])
+                    break
+                out.append(chunk[i:m.start()])
+                i = m.end()
+                if m.group() == "{":
+                    self._pending = []
+                    self._start_json(fenced=False)
+                else:
+                    self._pending = ["`"]
+                    self._ticks = 1
+                    self.state = S_TICKS
+            elif state == S_TICKS:
+                c = chunk[i]
+                if c == "`":
+                    self._pending.append(c)
+                    self._ticks += 1
+                    i += 1
+                    if self._ticks == 3:
+                        if self.in_plain_fence:
+                            # Closing fence of an ordinary code block
+                            self.in_plain_fence = False
+                            self._release(out)
+                            self.state = S_TEXT
+                        else:
+                            self._info = []
+                            self.state = S_FENCE_INFO
+                else:
+                    # Inline code, not a fence
+                    self._release(out)
+                    self.state = S_TEXT
+            elif state == S_FENCE_INFO:
+                c = chunk[i]
+                info = "".join(self._info).strip().lower()
+                if c == "\n" and info in ("", "json"):
+                    self._pending.append(c)
+                    self.state = S_FENCE_GAP
+                    i += 1
+                elif c == "{" and info in ("", "json"):
+                    i += 1
+                    self._start_json(fenced=True)
+                elif c == "\n" or len(self._info) >= MAX_FENCE_INFO:
+                    self.in_plain_fence = True
+                    self._release(out)
+                    self.state = S_TEXT
+                else:
+                    self._info.append(c)
+                    self._pending.append(c)
+                    i += 1
+            elif state == S_FENCE_GAP:
+                c = chunk[i]
+                if c.isspace():
+                    self._pending.append(c)
+                    i += 1
+                elif c == "{":
+                    i += 1
+                    self._start_json(fenced=True)
+                else:
+                    self.in_plain_fence = True
+                    self._release(out)
+                    self.state = S_TEXT
+            elif state == S_JSON:
+                i = self._feed_json(chunk, i, out, questions)
+            elif state == S_CLOSE_GAP:
+                c = chunk[i]
+                if c.isspace():
+                    self._pending.append(c)
+                    i += 1
+                elif c == "`":
+                    self._pending.append(c)
+                    self._ticks = 1
+                    self.state = S_CLOSE_TICKS
+                    i += 1
+                else:
+                    self._release(out)
+                    self.state = S_TEXT
+            elif state == S_CLOSE_TICKS:
+                c = chunk[i]
+                if c == "`":
+                    self._pending.append(c)
+                    self._ticks += 1
+                    i += 1
+                    if self._ticks == 3:
+                        self._pending = []
+                        self.state = S_TEXT
+                else:
+                    self._release(out)
+                    self.state = S_TEXT
+        return "".join(out), questions
+
+    def flush(self) -> str:
+        """Returns whatever is still withheld at the end of the stream."""
+        out: List[str] = []
+        if self.state != S_CLOSE_GAP:
+            self._release(out)
+        self._reset()
+        return "".join(out)
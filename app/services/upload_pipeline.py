@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import re
+import uuid
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.attachment_store import AttachmentStore
+from app.services.conversion_service import CONVERSION_VERSION, PandocMissingError
+from app.services.pdf_service import COMPRESSION_VERSION
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+CONVERTIBLE_EXTENSIONS = (".docx", ".xlsx")
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+def safe_upload_name(filename: str) -> str:
+    """ASCII-only file name for the CLI; falls back to a random name if nothing usable is left."""
+    base_name = os.path.basename(filename)
+    safe_name = re.sub(r'[^a-zA-Z0-9._-]', '_', base_name)
+    if not safe_name or safe_name.replace("_", "") == "":
+        ext = os.path.splitext(base_name)[1]
+        safe_name = f"upload_{uuid.uuid4().hex}{ext}"
+    return safe_name
+
+class UploadIngestor:
+    """
+    Saves the attachments of a /chat request and prepares them for the CLI
+    without blocking the event loop: uploads are copied in chunks with the disk
+    writes in a thread, DOCX/XLSX conversion runs on a bounded executor, PDFs
+    go through PDFService, and all attachments are processed concurrently.
+    Progress is reported per file through an optional callback.
+
+    Content goes through an AttachmentStore: uploads are hashed while they are
+    written, identical content is stored once, and conversions and compressed
+    PDFs are reused by content hash instead of being produced again.
+    """
+    def __init__(self, upload_dir: str, conversion_service, pdf_service, executor: Optional[Executor] = None, chunk_size: int = UPLOAD_CHUNK_SIZE, store: Optional[AttachmentStore] = None):
+        self.upload_dir = upload_dir
+        self.store = store or AttachmentStore(os.path.join(upload_dir, ".cas"))
+        self.conversion_service = conversion_service
+        self.pdf_service = pdf_service
+        self.executor = executor
+        self.chunk_size = chunk_size
+
+    async def ingest(self, uploads: List[Any], progress: Optional[ProgressCallback] = None) -> List[str]:
+        """Paths (relative to the working directory) of the prepared attachments, in upload order."""
+        uploads = [u for u in uploads if u.filename]
+        names, used = [], set()
+        for upload in uploads:
+            name = safe_upload_name(upload.filename)
+            if name in used:
+                # Two attachments with the same name in one request must not be written to the same file
+                name = f"{uuid.uuid4().hex[:8]}_{name}"
+            used.add(name)
+            names.append(name)
+        paths = await asyncio.gather(*(self._ingest_one(i, upload, name, progress) for i, (upload, name) in enumerate(zip(uploads, names))))
+        return [os.path.relpath(p) for p in paths]
+
+    def _report(self, progress: Optional[ProgressCallback], index: int, upload, stage: str, **extra):
+        if progress:
+            progress({"type": "upload_progress", "index": index, "file": upload.filename, "stage": stage, **extra})
+
+    async def _ingest_one(self, index: int, upload, name: str, progress: Optional[ProgressCallback]) -> str:
+        view = os.path.join(self.upload_dir, name)
+        size = getattr(upload, "size", None)
+        received = 0
+        self._report(progress, index, upload, "receiving", received=0, size=size)
+        writer = await asyncio.to_thread(self.store.begin)
+        try:
+            while True:
+                chunk = await upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                await asyncio.to_thread(writer.write, chunk)
+                received += len(chunk)
+                self._report(progress, index, upload, "receiving", received=received, size=size)
+            digest = await asyncio.to_thread(self.store.commit, writer, view)
+        except BaseException:
+            await asyncio.to_thread(writer.discard)
+            raise
+
+        fpath = view
+        lower = view.lower()
+        if lower.endswith(CONVERTIBLE_EXTENSIONS):
+            md_view = os.path.splitext(view)[0] + ".md"
+            if await asyncio.to_thread(self.store.link_derived, digest, "markdown", CONVERSION_VERSION, ".md", md_view):
+                fpath = md_view
+            else:
+                self._report(progress, index, upload, "converting")
+                try:
+                    converted = await asyncio.get_running_loop().run_in_executor(self.executor, self._convert, digest, view, md_view)
+                    logger.info(f"Converted {view} to {converted}")
+                    fpath = converted
+                except PandocMissingError as e:
+                    logger.warning(f"Pandoc missing, using original file: {e}")
+                except Exception as e:
+                    # Fallback to original file on error
+                    logger.error(f"Conversion failed, falling back to original: {e}")
+        elif lower.endswith(".pdf"):
+            # We use a distinct name for output to avoid issues during processing
+            compressed_path = os.path.join(self.upload_dir, f"compressed_{name}")
+            if await asyncio.to_thread(self.store.link_derived, digest, "pdf-ebook", COMPRESSION_VERSION, ".pdf", compressed_path):
+                fpath = compressed_path
+            else:
+                self._report(progress, index, upload, "compressing")
+                try:
+                    fpath = await self.pdf_service.compress_pdf(view, compressed_path)
+                    if fpath == compressed_path and os.path.exists(compressed_path):
+                        await asyncio.to_thread(self.store.store_derived, digest, "pdf-ebook", COMPRESSION_VERSION, ".pdf", compressed_path)
+                except Exception as e:
+                    logger.error(f"PDF compression failed: {e}")
+
+        self._report(progress, index, upload, "done", received=received)
+        return fpath
+
+    def _convert(self, digest: str, view: str, md_view: str) -> str:
+        """Runs on the conversion executor. The converter writes next to its input, so a
+        previous view of the output is unlinked first rather than written through."""
+        if os.path.lexists(md_view):
+            os.remove(md_view)
+        converted = self.conversion_service.convert_to_markdown(view)
+        if converted == md_view and os.path.exists(md_view):
+            self.store.store_derived(digest, "markdown", CONVERSION_VERSION, ".md", md_view)
+        return converted
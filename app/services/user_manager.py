@@ -1,15 +1,52 @@
 import os
 import json
 import hashlib
+import hmac
+import secrets
 import bcrypt
-from typing import Optional, Tuple, Dict, List
-from webauthn.helpers import bytes_to_base64url
+from typing import Any, Optional, Tuple, Dict, List
+from app.core import config
+from app.services.crypto_executor import CryptoExecutor
+from app.services.write_behind import WriteBehindJSON
 
 class UserManager:
-    def __init__(self, working_dir: Optional[str] = None):
+    """
+    Users and their credentials, kept in users.json.
+
+    Usernameless pattern login goes through a fingerprint index: every pattern
+    also has a keyed HMAC stored next to its bcrypt hash ("pattern_fp"), so a
+    login looks up its one candidate and runs a single bcrypt check instead of
+    trying every user's hash. The HMAC key lives in its own file and never in
+    users.json: patterns are short, and a fingerprint is only as hard to
+    brute-force as its key is to obtain. Fingerprints carry the id of their key;
+    users whose fingerprint is missing or made with another key are still found
+    by the old scan, which gives them a fingerprint on their next successful
+    login.
+
+    Wallet and passkey logins look the user up in in-memory indexes
+    (address -> username, credential id -> (username, passkey)) that every
+    mutation keeps current. Account changes are written to users.json at once;
+    bookkeeping that can be recomputed or may lag a little (passkey sign
+    counts, fingerprint migration) is batched through a write-behind, so a
+    passkey login no longer rewrites the whole file.
+
+    The *_async methods are what request handlers use: they run bcrypt in the
+    crypto executor and read and change self.users only on the event loop.
+    """
+    def __init__(self, working_dir: Optional[str] = None, crypto: Optional[CryptoExecutor] = None):
         self.working_dir = working_dir or os.getcwd()
+        self.crypto = crypto or CryptoExecutor()
         self.users_file = os.getenv("USERS_FILE", os.path.join(self.working_dir, "users.json"))
+        self.pattern_key_file = os.getenv("PATTERN_INDEX_KEY_FILE", os.path.join(os.path.dirname(os.path.abspath(self.users_file)), ".pattern_index_key"))
+        self._pattern_key: Optional[bytes] = None
+        self._pattern_index: Optional[Dict[str, List[str]]] = None
+        # Verified against when the index has no candidate, so a miss costs what a hit costs
+        self._dummy_hash: Optional[str] = None
         self.users = self._load_users()
+        self._store = WriteBehindJSON(self.users_file, lambda: self.users, delay=config.USERS_WRITE_DELAY, max_delay=config.USERS_MAX_DELAY)
+        self._wallet_index: Dict[str, str] = {}
+        self._credential_index: Dict[str, Tuple[str, Dict]] = {}
+        self._build_indexes()
         self._ensure_admin()
 
     def _load_users(self) -> Dict:
@@ -20,13 +57,104 @@ class UserManager:
         return {}
 
     def _save_users(self):
-        with open(self.users_file, "w") as f: json.dump(self.users, f, indent=2)
+        """Writes users.json now (atomically replacing it), along with any batched changes."""
+        self._store.mark_dirty()
+        self._store.flush()
+
+    def _touch_users(self):
+        """Schedules a batched write, at most USERS_MAX_DELAY seconds away."""
+        self._store.mark_dirty()
+
+    async def aclose(self):
+        await self._store.aclose()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"users": len(self.users), "wallets": len(self._wallet_index), "credentials": len(self._credential_index), **self._store.get_metrics()}
+
+    # --- wallet and passkey indexes ---
+
+    def _build_indexes(self):
+        wallets: Dict[str, str] = {}
+        credentials: Dict[str, Tuple[str, Dict]] = {}
+        for u, d in self.users.items():
+            if d.get("wallet_address"): wallets.setdefault(d["wallet_address"], u)
+            for pk in d.get("passkeys") or []:
+                credentials.setdefault(pk["credential_id"], (u, pk))
+        self._wallet_index, self._credential_index = wallets, credentials
+
+    def _index_wallet(self, addr: Optional[str]):
+        """Points addr at its first owner again after an address was set or dropped (a scan, but only on change)."""
+        if not addr: return
+        owner = next((u for u, d in self.users.items() if d.get("wallet_address") == addr), None)
+        if owner: self._wallet_index[addr] = owner
+        else: self._wallet_index.pop(addr, None)
+
+    def _unindex_user(self, username: str, data: Dict):
+        for pk in data.get("passkeys") or []:
+            entry = self._credential_index.get(pk["credential_id"])
+            if entry and entry[0] == username: del self._credential_index[pk["credential_id"]]
+        self._index_wallet(data.get("wallet_address"))
+
+    # --- pattern fingerprint index ---
+
+    def _get_pattern_key(self) -> bytes:
+        if self._pattern_key is None:
+            try:
+                with open(self.pattern_key_file, "rb") as f:
+                    key = f.read()
+            except OSError:
+                key = b""
+            if len(key) < 32:
+                key = secrets.token_bytes(32)
+                fd = os.open(self.pattern_key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "wb") as f: f.write(key)
+            self._pattern_key = key
+        return self._pattern_key
+
+    def _pattern_key_id(self) -> str:
+        return hashlib.sha256(b"key-id:" + self._get_pattern_key()).hexdigest()[:8]
+
+    def _pattern_fingerprint(self, pattern: str) -> str:
+        digest = hmac.new(self._get_pattern_key(), self._pre_hash(pattern).encode('utf-8'), hashlib.sha256).hexdigest()
+        return f"{self._pattern_key_id()}:{digest}"
+
+    def _index_pattern(self, username: str, fingerprint: Optional[str]):
+        if self._pattern_index is None: return
+        for names in self._pattern_index.values():
+            if username in names: names.remove(username)
+        if fingerprint: self._pattern_index.setdefault(fingerprint, []).append(username)
+
+    def _get_pattern_index(self) -> Dict[str, List[str]]:
+        if self._pattern_index is None:
+            prefix = self._pattern_key_id() + ":"
+            index: Dict[str, List[str]] = {}
+            for u, d in self.users.items():
+                fp = d.get("pattern_fp")
+                if d.get("pattern") and fp and fp.startswith(prefix): index.setdefault(fp, []).append(u)
+            self._pattern_index = index
+        return self._pattern_index
+
+    def _store_pattern_fingerprint(self, username: str, pattern: str):
+        """Migrates a user whose pattern was just verified in plain text."""
+        fingerprint = self._pattern_fingerprint(pattern)
+        if self.users[username].get("pattern_fp") == fingerprint: return
+        self.users[username]["pattern_fp"] = fingerprint
+        self._index_pattern(username, fingerprint)
+        self._touch_users()
+
+    def get_pattern_index_stats(self) -> Dict[str, int]:
+        prefix = self._pattern_key_id() + ":"
+        with_pattern = [d for d in self.users.values() if d.get("pattern")]
+        indexed = sum(1 for d in with_pattern if (d.get("pattern_fp") or "").startswith(prefix))
+        return {"users_with_pattern": len(with_pattern), "indexed": indexed, "unmigrated": len(with_pattern) - indexed}
 
     def has_users(self) -> bool:
         return len(self.users) > 0
 
     def clear_all_users(self):
         self.users = {}
+        self._pattern_index = None
+        self._build_indexes()
         self._save_users()
 
     def _ensure_admin(self):
@@ -47,13 +175,25 @@ class UserManager:
 
     def register_user(self, username: str, password: str, pattern: Optional[str] = None, wallet: Optional[str] = None, role: str = "user") -> Tuple[bool, str]:
         if username in self.users: return False, "Exists"
+        return self._add_user(username, self.get_password_hash(password), pattern, self.get_password_hash(pattern) if pattern else None, wallet, role)
+
+    async def register_user_async(self, username: str, password: str, pattern: Optional[str] = None, wallet: Optional[str] = None, role: str = "user", client: Optional[str] = None) -> Tuple[bool, str]:
+        if username in self.users: return False, "Exists"
+        password_hash, pattern_hash = await self.crypto.run("hash_password", lambda: (self.get_password_hash(password), self.get_password_hash(pattern) if pattern else None), client=client)
+        if username in self.users: return False, "Exists"
+        return self._add_user(username, password_hash, pattern, pattern_hash, wallet, role)
+
+    def _add_user(self, username: str, password_hash: str, pattern: Optional[str], pattern_hash: Optional[str], wallet: Optional[str], role: str) -> Tuple[bool, str]:
         self.users[username] = {
-            "password": self.get_password_hash(password),
-            "pattern": self.get_password_hash(pattern) if pattern else None,
+            "password": password_hash,
+            "pattern": pattern_hash,
+            "pattern_fp": self._pattern_fingerprint(pattern) if pattern else None,
             "wallet_address": wallet.lower() if wallet else None,
             "role": role,
             "passkeys": []
         }
+        self._index_pattern(username, self.users[username]["pattern_fp"])
+        if wallet: self._index_wallet(wallet.lower())
         self._save_users()
         return True, "Success"
 
@@ -62,7 +202,9 @@ class UserManager:
 
     def remove_user(self, username: str) -> bool:
         if username in self.users:
-            del self.users[username]
+            data = self.users.pop(username)
+            self._index_pattern(username, None)
+            self._unindex_user(username, data)
             self._save_users()
             return True
         return False
@@ -74,6 +216,14 @@ class UserManager:
             return True
         return False
 
+    async def update_password_async(self, username: str, password: str, client: Optional[str] = None) -> bool:
+        if username not in self.users: return False
+        password_hash = await self.crypto.run("hash_password", self.get_password_hash, password, client=client)
+        if username not in self.users: return False
+        self.users[username]["password"] = password_hash
+        self._save_users()
+        return True
+
     def get_role(self, username: str) -> Optional[str]:
         return self.users.get(username, {}).get("role")
 
@@ -86,11 +236,12 @@ class UserManager:
 
     def add_passkey(self, username: str, cred_id, pub_key, sign_count: int = 0) -> bool:
         if username not in self.users: return False
+        from webauthn.helpers import bytes_to_base64url
         if isinstance(cred_id, bytes): cred_id = bytes_to_base64url(cred_id)
         if isinstance(pub_key, bytes): pub_key = bytes_to_base64url(pub_key)
-        self.users[username].setdefault("passkeys", []).append({
-            "credential_id": cred_id, "public_key": pub_key, "sign_count": sign_count
-        })
+        passkey = {"credential_id": cred_id, "public_key": pub_key, "sign_count": sign_count}
+        self.users[username].setdefault("passkeys", []).append(passkey)
+        self._credential_index.setdefault(cred_id, (username, passkey))
         self._save_users()
         return True
 
@@ -102,7 +253,7 @@ class UserManager:
         for pk in self.users[username].get("passkeys", []):
             if pk["credential_id"] == cred_id:
                 pk["sign_count"] = count
-                self._save_users()
+                self._touch_users()
                 return True
         return False
 
@@ -118,17 +269,42 @@ class UserManager:
     def authenticate_with_pattern(self, username: str, pattern: str) -> bool:
         user = self.users.get(username)
         if not user or user.get("pattern_disabled", False): return False
-        return user.get("pattern") and self.verify_password(pattern, user["pattern"])
+        if user.get("pattern") and self.verify_password(pattern, user["pattern"]):
+            self._store_pattern_fingerprint(username, pattern)
+            return True
+        return False
+
+    async def authenticate_with_pattern_async(self, username: str, pattern: str, client: Optional[str] = None) -> bool:
+        user = self.users.get(username)
+        if not user or user.get("pattern_disabled", False) or not user.get("pattern"): return False
+        if await self.crypto.run("verify_password", self.verify_password, pattern, user["pattern"], client=client):
+            if username in self.users: self._store_pattern_fingerprint(username, pattern)
+            return True
+        return False
 
     def set_pattern(self, username: str, pattern: str) -> bool:
         if username not in self.users: return False
-        self.users[username]["pattern"] = self.get_password_hash(pattern)
+        return self._set_pattern_hash(username, pattern, self.get_password_hash(pattern))
+
+    async def set_pattern_async(self, username: str, pattern: str, client: Optional[str] = None) -> bool:
+        if username not in self.users: return False
+        pattern_hash = await self.crypto.run("hash_password", self.get_password_hash, pattern, client=client)
+        if username not in self.users: return False
+        return self._set_pattern_hash(username, pattern, pattern_hash)
+
+    def _set_pattern_hash(self, username: str, pattern: str, pattern_hash: str) -> bool:
+        self.users[username]["pattern"] = pattern_hash
+        self.users[username]["pattern_fp"] = self._pattern_fingerprint(pattern)
+        self._index_pattern(username, self.users[username]["pattern_fp"])
         self._save_users()
         return True
 
     def set_wallet_address(self, username: str, addr: str) -> bool:
         if username not in self.users: return False
+        previous = self.users[username].get("wallet_address")
         self.users[username]["wallet_address"] = addr.lower()
+        self._index_wallet(previous)
+        self._index_wallet(addr.lower())
         self._save_users()
         return True
 
@@ -136,20 +312,56 @@ class UserManager:
         user = self.users.get(username)
         return user and self.verify_password(password, user["password"])
 
+    async def authenticate_user_async(self, username: str, password: str, client: Optional[str] = None) -> bool:
+        user = self.users.get(username)
+        if not user: return False
+        return await self.crypto.run("verify_password", self.verify_password, password, user["password"], client=client)
+
     def get_user_by_wallet(self, addr: str) -> Optional[str]:
-        addr = addr.lower()
-        for u, d in self.users.items():
-            if d.get("wallet_address") == addr: return u
-        return None
+        return self._wallet_index.get(addr.lower())
 
     def get_user_by_credential_id(self, cred_id) -> Tuple[Optional[str], Optional[Dict]]:
-        if isinstance(cred_id, bytes): cred_id = bytes_to_base64url(cred_id)
-        for u, d in self.users.items():
-            for pk in d.get("passkeys", []):
-                if pk["credential_id"] == cred_id: return u, pk
-        return None, None
+        if isinstance(cred_id, bytes):
+            from webauthn.helpers import bytes_to_base64url
+            cred_id = bytes_to_base64url(cred_id)
+        return self._credential_index.get(cred_id, (None, None))
 
-    def get_user_by_pattern(self, pattern: str) -> Optional[str]:
+    def _pattern_candidates(self, pattern: str) -> List[Tuple[Optional[str], Optional[str], bool]]:
+        """(username, hash, needs migration) of every user the pattern may belong to, indexed ones first."""
+        candidates = []
+        for u in self._get_pattern_index().get(self._pattern_fingerprint(pattern), []):
+            d = self.users.get(u)
+            if d and not d.get("pattern_disabled", False) and d.get("pattern"): candidates.append((u, d["pattern"], False))
+        # Users without a current fingerprint can only be found the old way
+        prefix = self._pattern_key_id() + ":"
         for u, d in self.users.items():
-            if not d.get("pattern_disabled", False) and d.get("pattern") and self.verify_password(pattern, d["pattern"]): return u
+            if d.get("pattern_disabled", False) or not d.get("pattern"): continue
+            if (d.get("pattern_fp") or "").startswith(prefix): continue
+            candidates.append((u, d["pattern"], True))
+        if not candidates:
+            # Checked against anyway, so a miss costs what a hit costs; the hash is made by _match_pattern
+            candidates.append((None, None, False))
+        return candidates
+
+    def _match_pattern(self, pattern: str, candidates: List[Tuple[Optional[str], Optional[str], bool]]) -> Optional[Tuple[str, bool]]:
+        """The bcrypt part of a pattern lookup (run in the crypto executor); touches nothing but its arguments and the dummy hash."""
+        for u, hashed, migrate in candidates:
+            if hashed is None:
+                # Two threads may both make one on first use; either hash serves
+                if self._dummy_hash is None: self._dummy_hash = self.get_password_hash(secrets.token_hex(16))
+                hashed = self._dummy_hash
+            if self.verify_password(pattern, hashed) and u is not None: return u, migrate
         return None
+
+    def _pattern_matched(self, pattern: str, match: Optional[Tuple[str, bool]]) -> Optional[str]:
+        if not match or match[0] not in self.users: return None
+        if match[1]: self._store_pattern_fingerprint(match[0], pattern)
+        return match[0]
+
+    def get_user_by_pattern(self, pattern: str) -> Optional[str]:
+        return self._pattern_matched(pattern, self._match_pattern(pattern, self._pattern_candidates(pattern)))
+
+    async def get_user_by_pattern_async(self, pattern: str, client: Optional[str] = None) -> Optional[str]:
+        candidates = self._pattern_candidates(pattern)
+        match = await self.crypto.run("verify_pattern", self._match_pattern, pattern, candidates, client=client)
+        return self._pattern_matched(pattern, match)
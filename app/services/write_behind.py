@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w") -> Iterator[IO]:
+    """
+    A file to write path's new contents to. It is a temp file in the same
+    directory, renamed over path when the block ends and removed if it raises,
+    so readers see the old file or the new one, never a partial write. The new
+    file keeps the old one's permissions; a file that did not exist is created
+    readable by its owner only (0600, as mkstemp makes it).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=os.path.splitext(path)[1] or ".tmp", dir=directory)
+    try:
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        except OSError:
+            pass
+        with os.fdopen(fd, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
+def atomic_write_json(path: str, data: Any, **dump_kwargs):
+    """json.dump to path through atomic_write."""
+    with atomic_write(path) as f:
+        json.dump(data, f, **dump_kwargs)
+
+class WriteBehind:
+    """
+    Debounced persistence of in-memory state.
+
+    mark_dirty() only records that the data changed. Inside a running event loop
+    the write is scheduled `delay` seconds after the last change, but never later
+    than `max_delay` after the first unsaved one, so a burst of edits becomes a
+    single write. _snapshot() runs on the loop (so it sees a consistent state) and
+    _persist() runs in a worker thread under a lock. Without a running loop
+    (scripts, sync tests) the write happens immediately.
+    """
+    def __init__(self, delay: float = 0.5, max_delay: float = 5.0):
+        self.delay = max(0.0, delay)
+        self.max_delay = max(self.delay, max_delay)
+        self._dirty_since: Optional[float] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.counters = {"changes": 0, "writes": 0, "errors": 0}
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty_since is not None
+
+    def _snapshot(self) -> Any:
+        raise NotImplementedError
+
+    def _persist(self, seq: int, payload: Any):
+        """Writes a snapshot. Called with the lock held; seq increases with every snapshot."""
+        raise NotImplementedError
+
+    def mark_dirty(self):
+        self.counters["changes"] += 1
+        now = time.monotonic()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._schedule(loop, now)
+
+    def _schedule(self, loop, now: float):
+        if self._task and not self._task.done():
+            # The write in flight reschedules itself when it finishes
+            return
+        if self._handle:
+            self._handle.cancel()
+        wait = min(self.delay, self._dirty_since + self.max_delay - now)
+        self._handle = loop.call_later(max(0.0, wait), self._start_write)
+
+    def _take_snapshot(self) -> Tuple[int, Any]:
+        self._seq += 1
+        payload = self._snapshot()
+        self._dirty_since = None
+        return self._seq, payload
+
+    def _write(self, seq: int, payload: Any):
+        with self._lock:
+            self._persist(seq, payload)
+            self.counters["writes"] += 1
+
+    def _start_write(self):
+        self._handle = None
+        if self._dirty_since is None:
+            return
+        seq, payload = self._take_snapshot()
+        self._task = asyncio.get_running_loop().create_task(self._write_async(seq, payload))
+
+    async def _write_async(self, seq: int, payload: Any):
+        try:
+            await asyncio.to_thread(self._write, seq, payload)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"Write-behind persist failed: {e}")
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+        finally:
+            self._task = None
+            if self._dirty_since is not None:
+                self._schedule(asyncio.get_running_loop(), time.monotonic())
+
+    def flush(self):
+        """Writes pending changes synchronously."""
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        if self._dirty_since is None:
+            return
+        seq, payload = self._take_snapshot()
+        self._write(seq, payload)
+
+    async def aclose(self):
+        """Waits for the write in flight and flushes the rest; used on shutdown."""
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        if self._dirty_since is not None:
+            seq, payload = self._take_snapshot()
+            await asyncio.to_thread(self._write, seq, payload)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"pending": self.dirty, "delay": self.delay, "max_delay": self.max_delay, **self.counters}
+
+class WriteBehindJSON(WriteBehind):
+    """Write-behind of a JSON document: serialized on the loop, then written to a temp file and renamed into place."""
+    def __init__(self, path: str, snapshot: Callable[[], Any], delay: float = 0.5, max_delay: float = 5.0):
+        super().__init__(delay, max_delay)
+        self.path = path
+        self.snapshot = snapshot
+        self._written_seq = 0
+
+    def _snapshot(self) -> str:
+        return json.dumps(self.snapshot())
+
+    def _persist(self, seq: int, payload: str):
+        if seq <= self._written_seq:
+            return # a newer snapshot already reached the disk
+        with atomic_write(self.path) as f:
+            f.write(payload)
+        self._written_seq = seq
@@ -1373,6 +1373,21 @@ document.addEventListener('DOMContentLoaded', () => {
             history = data.history || [];
         }
 
+        // Search hits carry a snippet of the best matching message with [start, end) highlight offsets
+        const escapeText = (t) => t.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+        const createSnippetHTML = (match) => {
+            if (!match || !match.snippet) return '';
+            const chars = Array.from(match.snippet); // offsets count code points
+            const part = (a, b) => escapeText(chars.slice(a, b).join(''));
+            let html = '', pos = 0;
+            for (const [start, end] of match.highlights || []) {
+                html += part(pos, start) + '<mark>' + part(start, end) + '</mark>';
+                pos = end;
+            }
+            html += part(pos);
+            return `<small class="session-snippet d-block text-truncate text-muted">${html}</small>`;
+        };
+
         const createSessionHTML = (s) => `
             <div class="list-group-item list-group-item-action bg-dark text-light session-item ${(s.active || s.has_active_fork) ? 'active-session' : ''}" data-uuid="${s.uuid}">
                 <div class="d-flex justify-content-between align-items-start">
@@ -1381,6 +1396,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         <div class="session-tags-list">
                             ${(s.tags || []).map(t => `<span class="session-tag-item">${t}</span>`).join('')}
                         </div>
+                        ${createSnippetHTML(s.match)}
                         <span class="session-time">${s.time || ''}</span>
                     </div>
                     <div class="d-flex align-items-center gap-1">
@@ -1990,6 +2006,14 @@ document.addEventListener('DOMContentLoaded', () => {
                                     label.textContent = cleanName + " (Auto-switched)";
                                     label.classList.add('text-warning'); // Highlight the change
                                 }
+                            } else if (data.type === 'upload_progress') {
+                                // Attachments are still being saved/converted on the server
+                                if (loadingId && loadingId.element) {
+                                    let status = data.stage === 'receiving' ? 'Uploading' : data.stage === 'converting' ? 'Converting' : data.stage === 'compressing' ? 'Compressing' : 'Prepared';
+                                    if (data.stage === 'receiving' && data.size) status += ` ${Math.floor(100 * data.received / data.size)}%`;
+                                    loadingId.element.innerHTML = '<div class="spinner-border spinner-border-sm text-light" role="status"><span class="visually-hidden">Loading...</span></div> ';
+                                    loadingId.element.appendChild(document.createTextNode(`${status}: ${data.file}...`));
+                                }
                             } else if (data.type === 'tool_use') {
                                 toolLogs.push({ type: 'call', name: data.tool_name, input: data.parameters });
                             } else if (data.type === 'tool_result') {
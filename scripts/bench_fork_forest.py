@@ -0,0 +1,117 @@
+"""
+Micro-benchmark for fork grouping and related-session lookups.
+
+Builds synthetic fork trees and compares what get_user_sessions,
+sync_session_updates and delete_specific_session used to do (a get_root walk
+per session, a rescan of the grouped list for active forks, a "while changed"
+fixed point over every fork entry) with ForkForest.
+
+    python scripts/bench_fork_forest.py [forks] [trees]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.fork_forest import ForkForest
+
+def synthetic_forks(n_forks, n_trees, seed=7):
+    rng = random.Random(seed)
+    roots = [f"root-{i}" for i in range(n_trees)]
+    members = {r: [r] for r in roots}
+    forks = {}
+    for i in range(n_forks):
+        tree = rng.choice(roots)
+        child = f"fork-{i}"
+        forks[child] = {"parent": rng.choice(members[tree]), "fork_point": rng.randint(0, 50)}
+        members[tree].append(child)
+    sessions = roots + list(forks)
+    rng.shuffle(sessions)
+    return forks, sessions
+
+def legacy_group(forks, sessions, active):
+    def get_root(u):
+        visited = set()
+        curr = u
+        while curr in forks and forks[curr].get("parent") and curr not in visited:
+            visited.add(curr)
+            curr = forks[curr]["parent"]
+        return curr
+    grouped, seen_roots = [], set()
+    for u in sessions:
+        root = get_root(u)
+        if root not in seen_roots:
+            grouped.append({"uuid": u})
+            seen_roots.add(root)
+        elif u in active:
+            for gs in grouped:
+                if get_root(gs["uuid"]) == root:
+                    gs["has_active_fork"] = True
+                    break
+    return grouped
+
+def forest_group(forest, sessions, active):
+    grouped, latest_by_root = [], {}
+    for u in sessions:
+        root = forest.find(u)
+        latest = latest_by_root.get(root)
+        if latest is None:
+            latest = latest_by_root[root] = {"uuid": u}
+            grouped.append(latest)
+        elif u in active:
+            latest["has_active_fork"] = True
+    return grouped
+
+def legacy_component(forks, uuid):
+    related = {uuid}
+    changed = True
+    while changed:
+        changed = False
+        for u, info in forks.items():
+            parent = info.get("parent")
+            if u in related and parent and parent not in related:
+                related.add(parent)
+                changed = True
+            if parent in related and u not in related:
+                related.add(u)
+                changed = True
+    return related
+
+def timed(fn, repeat=3):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def report(label, legacy, new):
+    print(f"{label:<34} legacy {legacy * 1000:>10.2f} ms   forest {new * 1000:>8.2f} ms   x{legacy / max(new, 1e-9):>8.1f}")
+
+def main():
+    n_forks = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_trees = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    forks, sessions = synthetic_forks(n_forks, n_trees)
+    # Every tree has an active fork somewhere, as when a user keeps branching a conversation
+    active = set(sessions[-n_trees:])
+    print(f"{n_forks} forks in {n_trees} trees, {len(sessions)} sessions")
+
+    build, forest = timed(lambda: ForkForest(forks))
+    print(f"{'build ForkForest':<34} {build * 1000:>10.2f} ms")
+
+    legacy, groups_a = timed(lambda: legacy_group(forks, sessions, active), repeat=1)
+    new, groups_b = timed(lambda: forest_group(forest, sessions, active))
+    assert [g["uuid"] for g in groups_a] == [g["uuid"] for g in groups_b]
+    report("grouping (get_user_sessions)", legacy, new)
+
+    target = sessions[len(sessions) // 2]
+    legacy, related_a = timed(lambda: legacy_component(forks, target), repeat=1)
+    new, related_b = timed(lambda: forest.component(target))
+    assert related_a == set(related_b)
+    report("related sessions (sync/delete)", legacy, new)
+
+if __name__ == "__main__":
+    main()
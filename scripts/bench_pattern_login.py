@@ -0,0 +1,79 @@
+"""
+Latency benchmark for usernameless pattern login.
+
+Builds user stores of growing size and times UserManager.get_user_by_pattern
+for the last user's pattern and for a wrong pattern, against the previous
+implementation (bcrypt.checkpw against every user's hash in turn). The new
+lookup should stay flat: one HMAC and one bcrypt check whatever the user count.
+
+    python scripts/bench_pattern_login.py [--rounds 8] [--users 1,4,16,64] [--repeat 3]
+
+--rounds is the bcrypt cost of the generated hashes; the app uses bcrypt's
+default (12), which makes every check ~16x slower than cost 8 on both sides.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import bcrypt
+from app.services.user_manager import UserManager
+
+def legacy_get_user_by_pattern(um, pattern):
+    """What get_user_by_pattern did before the fingerprint index."""
+    for u, d in um.users.items():
+        if not d.get("pattern_disabled", False) and d.get("pattern") and um.verify_password(pattern, d["pattern"]): return u
+    return None
+
+def build_users(directory, count, rounds):
+    um = UserManager(working_dir=directory)
+    for i in range(count):
+        pattern = f"{i % 9}-{(i // 9) % 9}-{i // 81}-4"
+        um.users[f"user{i}"] = {
+            "password": "x",
+            "pattern": bcrypt.hashpw(um._pre_hash(pattern).encode(), bcrypt.gensalt(rounds)).decode(),
+            "pattern_fp": um._pattern_fingerprint(pattern),
+            "role": "user",
+            "passkeys": []
+        }
+    um._save_users()
+    return um, pattern
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=8)
+    parser.add_argument("--users", default="1,4,16,64")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    # The miss path's dummy hash is generated with the default cost; match the users' cost
+    gensalt = bcrypt.gensalt
+    bcrypt.gensalt = lambda rounds=args.rounds, prefix=b"2b": gensalt(args.rounds, prefix)
+
+    print(f"bcrypt cost {args.rounds}, median of {args.repeat}")
+    print(f"{'users':>6}{'legacy hit':>14}{'legacy miss':>14}{'indexed hit':>14}{'indexed miss':>14}")
+    for count in (int(n) for n in args.users.split(",")):
+        with tempfile.TemporaryDirectory() as work:
+            um, last_pattern = build_users(work, count, args.rounds)
+            assert um.get_user_by_pattern(last_pattern) == f"user{count - 1}"
+            row = [
+                timed(lambda: legacy_get_user_by_pattern(um, last_pattern), args.repeat),
+                timed(lambda: legacy_get_user_by_pattern(um, "0-0-0-0-0"), args.repeat),
+                timed(lambda: um.get_user_by_pattern(last_pattern), args.repeat),
+                timed(lambda: um.get_user_by_pattern("0-0-0-0-0"), args.repeat),
+            ]
+            print(f"{count:>6}" + "".join(f"{ms:>11.1f} ms" for ms in row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+I/O benchmark for PDF compression of uploads.
+
+Compresses synthetic PDFs through the previous PDFService flow (copy the input
+to gs_in_<uuid>.pdf, run Ghostscript, move gs_out_<uuid>.pdf into place) and
+through the current one (Ghostscript reads the upload where it is), and reports
+the bytes read and written per upload, from the rchar/wchar counters of
+/proc/self/io (which include the Ghostscript processes once they are reaped).
+The compressed output itself is the same for both and is shown separately.
+
+    python scripts/bench_pdf_io.py [size_mb] [uploads] [--real-gs]
+
+Without --real-gs a stand-in "gs" that writes a file 60% the size of its input
+is used, so the numbers do not depend on Ghostscript being installed. Linux only.
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.pdf_service import PDFService
+
+STAND_IN_GS = """#!{python}
+import sys
+out = next(a.split("=", 1)[1] for a in sys.argv if a.startswith("-sOutputFile="))
+data = open(sys.argv[-1], "rb").read()
+open(out, "wb").write(data[:int(len(data) * 0.6)])
+"""
+
+def io_counters():
+    counters = {}
+    with open("/proc/self/io") as f:
+        for line in f:
+            key, value = line.split(":")
+            counters[key] = int(value)
+    return counters["rchar"], counters["wchar"]
+
+def legacy_compress(gs_path, input_path, output_path):
+    """What compress_pdf did before, reduced to its file handling."""
+    base_dir = os.path.dirname(input_path)
+    safe_id = uuid.uuid4().hex
+    safe_in_path = os.path.join(base_dir, f"gs_in_{safe_id}.pdf")
+    safe_out_path = os.path.join(base_dir, f"gs_out_{safe_id}.pdf")
+    try:
+        shutil.copy2(input_path, safe_in_path)
+        cmd = [gs_path, "-sDEVICE=pdfwrite", "-dCompatibilityLevel=1.4", "-dPDFSETTINGS=/ebook",
+               "-dNOPAUSE", "-dQUIET", "-dBATCH", f"-sOutputFile={safe_out_path}", safe_in_path]
+        subprocess.run(cmd, capture_output=True)
+        if os.path.getsize(safe_out_path) < os.path.getsize(input_path):
+            shutil.move(safe_out_path, output_path)
+            return output_path
+        return input_path
+    finally:
+        for path in (safe_in_path, safe_out_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+def synthetic_pdf(path, size):
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        remaining = size - 9
+        while remaining > 0:
+            chunk = os.urandom(min(remaining, 1024 * 1024))
+            f.write(chunk)
+            remaining -= len(chunk)
+
+def measure(fn, uploads, paths):
+    rchar, wchar = io_counters()
+    start = time.perf_counter()
+    out_bytes = 0
+    for i in range(uploads):
+        result = fn(paths[i], paths[i] + ".compressed.pdf")
+        if result != paths[i]:
+            out_bytes += os.path.getsize(result)
+            os.remove(result)
+    elapsed = time.perf_counter() - start
+    rchar2, wchar2 = io_counters()
+    return (rchar2 - rchar) / uploads, (wchar2 - wchar) / uploads, out_bytes / uploads, elapsed / uploads
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    size = int(float(args[0]) * 1024 * 1024) if args else 8 * 1024 * 1024
+    uploads = int(args[1]) if len(args) > 1 else 5
+    with tempfile.TemporaryDirectory() as work:
+        if "--real-gs" in sys.argv:
+            gs_path = shutil.which("gs")
+            if not gs_path:
+                sys.exit("gs not found")
+        else:
+            gs_path = os.path.join(work, "gs")
+            with open(gs_path, "w") as f:
+                f.write(STAND_IN_GS.format(python=sys.executable))
+            os.chmod(gs_path, 0o755)
+
+        paths = []
+        for i in range(uploads):
+            paths.append(os.path.join(work, f"upload_{i}.pdf"))
+            synthetic_pdf(paths[-1], size)
+
+        service = PDFService()
+        service.gs_path = gs_path
+        loop = asyncio.new_event_loop()
+        current = lambda i, o: loop.run_until_complete(service.compress_pdf(i, o))
+
+        print(f"{uploads} uploads of {size / 1024 / 1024:.1f} MiB")
+        print(f"{'':<10}{'read/upload':>20}{'written/upload':>20}{'gs output/upload':>20}{'time/upload':>14}")
+        for label, fn in (("legacy", lambda i, o: legacy_compress(gs_path, i, o)), ("current", current)):
+            read, written, out, elapsed = measure(fn, uploads, paths)
+            print(f"{label:<10}{read / 1024 / 1024:>16.2f} MiB{written / 1024 / 1024:>16.2f} MiB{out / 1024 / 1024:>16.2f} MiB{elapsed * 1000:>11.1f} ms")
+        loop.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark for session search.
+
+Generates synthetic chat files and compares the full scan search_sessions used
+to do (json.load every chat file, substring-match every message) with a query
+against SearchIndex, after the one-off indexing pass.
+
+    python scripts/bench_search.py [sessions] [messages_per_session]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.search_index import SearchIndex
+from app.services.session_index import content_text
+
+WORDS = ("deploy cluster latency python query index cache thread socket buffer parser "
+         "token stream render layout schema record commit branch merge review").split()
+# A larger vocabulary so that, as in real histories, most words occur in only some of the messages
+VOCABULARY = WORDS + [f"term{i}" for i in range(3000)]
+
+def write_sessions(base, n_sessions, n_messages):
+    rng = random.Random(42)
+    paths = {}
+    for s in range(n_sessions):
+        session_uuid = f"{s:08x}-0000-0000-0000-000000000000"
+        messages = [{"type": "user" if i % 2 == 0 else "gemini", "content": " ".join(rng.choice(VOCABULARY) for _ in range(120))} for i in range(n_messages)]
+        path = os.path.join(base, f"session-{session_uuid[:8]}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"sessionId": session_uuid, "messages": messages}, f, indent=2)
+        paths[session_uuid] = path
+    return paths
+
+def legacy_search(paths, query):
+    query = query.lower()
+    found = []
+    for session_uuid, path in paths.items():
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for msg in data.get("messages", []):
+            if query in content_text(msg.get("content", "")).lower():
+                found.append(session_uuid)
+                break
+    return found
+
+def timed(fn, repeat=5):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    n_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_messages = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    with tempfile.TemporaryDirectory() as base:
+        paths = write_sessions(base, n_sessions, n_messages)
+        size_mb = sum(os.path.getsize(p) for p in paths.values()) / (1024 * 1024)
+        index = SearchIndex(os.path.join(base, "search.db"))
+        build, _ = timed(lambda: index.sync(paths), repeat=1)
+        print(f"{n_sessions} sessions x {n_messages} messages, {size_mb:.1f} MB; initial indexing {build * 1000:.0f} ms")
+        for query in ("latency", "rend", "merge branch", "term12", "nomatch"):
+            legacy, legacy_hits = timed(lambda: legacy_search(paths, query))
+            indexed, hits = timed(lambda: (index.sync(paths), index.search(query, paths))[1])
+            print(f"{query!r:<16} legacy {legacy * 1000:>9.2f} ms ({len(legacy_hits)} hits)   "
+                  f"indexed {indexed * 1000:>8.2f} ms ({len(hits)} hits)   x{legacy / max(indexed, 1e-9):>6.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Disk I/O benchmark for global settings.
+
+Reads interactive_mode_instructions the way a chat turn does, through the
+previous config.get_global_setting (open and json.load data/settings.json on
+every call) and through the cached one, and saves an admin settings form of
+several keys the previous way (one read and rewrite per key) and with
+update_global_settings (one atomic write). Reports time, files opened and the
+bytes read and written, from the rchar/wchar counters of /proc/self/io.
+
+    python scripts/bench_settings.py [--calls 10000] [--keys 8] [--size-kb 16]
+
+Runs against a temporary settings file of --size-kb. Linux only.
+"""
+import argparse
+import builtins
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core import config
+
+def legacy_get_global_setting(key, default=None):
+    """What config.get_global_setting did before the cache."""
+    if os.path.exists(config.SETTINGS_FILE):
+        with open(config.SETTINGS_FILE, "r") as f:
+            return json.load(f).get(key, default)
+    return default
+
+def legacy_update_global_setting(key, value):
+    with open(config.SETTINGS_FILE, "r") as f:
+        settings = json.load(f)
+    settings[key] = value
+    with open(config.SETTINGS_FILE, "w") as f:
+        json.dump(settings, f, indent=4)
+
+def io_counters():
+    counters = {}
+    with open("/proc/self/io") as f:
+        for line in f:
+            key, value = line.split(":")
+            counters[key] = int(value)
+    return counters
+
+def measure(fn):
+    """Runs fn, counting files opened through open() and os.open() (which tempfile uses)."""
+    opens = [0]
+    real_open, real_os_open = builtins.open, os.open
+    def counting(real):
+        def wrapper(*args, **kwargs):
+            opens[0] += 1
+            return real(*args, **kwargs)
+        return wrapper
+    before = io_counters()
+    builtins.open, os.open = counting(real_open), counting(real_os_open)
+    start = time.perf_counter()
+    try:
+        fn()
+    finally:
+        elapsed = time.perf_counter() - start
+        builtins.open, os.open = real_open, real_os_open
+    after = io_counters()
+    return elapsed, opens[0], after["rchar"] - before["rchar"], after["wchar"] - before["wchar"]
+
+def report(label, result, per):
+    elapsed, opens, read, written = result
+    print(f"{label:<34}{elapsed / per * 1e6:>10.1f} us{opens / per:>9.2f}{read / per:>12.0f} B{written / per:>12.0f} B")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--keys", type=int, default=8)
+    parser.add_argument("--size-kb", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work:
+        config.SETTINGS_FILE = os.path.join(work, "settings.json")
+        settings = {"interactive_mode_instructions": "x" * (args.size_kb * 1024)}
+        with open(config.SETTINGS_FILE, "w") as f:
+            json.dump(settings, f, indent=4)
+        form = {f"key{i}": f"value {i}" for i in range(args.keys)}
+
+        print(f"settings file {os.path.getsize(config.SETTINGS_FILE)} bytes, recheck every {config.SETTINGS_RECHECK_SECONDS} s")
+        print(f"{'':<34}{'time':>13}{'opens':>9}{'read':>14}{'written':>14}")
+        key = "interactive_mode_instructions"
+        report("read per chat turn, legacy", measure(lambda: [legacy_get_global_setting(key) for _ in range(args.calls)]), args.calls)
+        config.get_global_setting(key) # the first call after start loads the file
+        report("read per chat turn, cached", measure(lambda: [config.get_global_setting(key) for _ in range(args.calls)]), args.calls)
+        report(f"save {args.keys} keys, legacy", measure(lambda: [legacy_update_global_setting(k, v) for k, v in form.items()]), 1)
+        report(f"save {args.keys} keys, batched", measure(lambda: config.update_global_settings(form)), 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+SSE throughput benchmark for the middleware stack.
+
+Streams a text/event-stream response of small chunks, like /chat does, through
+the previous middlewares (SecurityHeadersMiddleware and DynamicAuthMiddleware
+as BaseHTTPMiddleware subclasses) and through the current pure-ASGI ones, with
+the SessionMiddleware in front as in app.main. The app is driven directly over
+ASGI, so the numbers are the middlewares' per-chunk cost without a network in
+between.
+
+    python scripts/bench_sse.py [--chunks 20000] [--streams 4] [--repeat 3]
+
+--streams responses run concurrently; chunks/s is over all of them.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.sessions import SessionMiddleware
+from app.core import config
+from app.main import DynamicAuthMiddleware, SecurityHeadersMiddleware
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    """What SecurityHeadersMiddleware was before it became plain ASGI."""
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        csp = (
+            "default-src 'self'; "
+            "script-src 'self' 'unsafe-inline' 'unsafe-eval' cdn.jsdelivr.net cdnjs.cloudflare.com; "
+            "style-src 'self' 'unsafe-inline' cdn.jsdelivr.net cdnjs.cloudflare.com; "
+            "font-src 'self' cdn.jsdelivr.net; "
+            "img-src 'self' data: blob:; "
+            "connect-src 'self' cdn.jsdelivr.net;"
+        )
+        response.headers["Content-Security-Policy"] = csp
+        return response
+
+class LegacyDynamicAuthMiddleware(BaseHTTPMiddleware):
+    """The previous DynamicAuthMiddleware; it wrote origin and rp_id onto a shared object."""
+    async def dispatch(self, request: Request, call_next):
+        if not config.ORIGIN or "localhost" in config.ORIGIN:
+            proto = request.headers.get("x-forwarded-proto", request.url.scheme)
+            host = request.headers.get("x-forwarded-host", request.url.netloc)
+            request.app.state.auth_target = (f"{proto}://{host}", host.split(":")[0])
+        return await call_next(request)
+
+def make_app(legacy: bool, chunks: int):
+    app = FastAPI()
+
+    @app.get("/chat")
+    async def chat():
+        async def events():
+            for i in range(chunks):
+                yield f'data: {{"type": "message", "content": "token {i}"}}\n\n'
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app.add_middleware(SessionMiddleware, secret_key="bench", session_cookie="gemini_session")
+    if legacy:
+        app.add_middleware(LegacySecurityHeadersMiddleware)
+        app.add_middleware(LegacyDynamicAuthMiddleware)
+    else:
+        app.add_middleware(SecurityHeadersMiddleware)
+        app.add_middleware(DynamicAuthMiddleware)
+    return app
+
+async def stream_once(app):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/chat", "raw_path": b"/chat", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"192.168.1.5:8000")], "client": ("127.0.0.1", 50000), "server": ("192.168.1.5", 8000)
+    }
+    received = 0
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body" and message.get("body"):
+            received += 1
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            disconnected.set()
+
+    await app(scope, receive, send)
+    return received
+
+async def run(app, streams: int) -> tuple:
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(stream_once(app) for _ in range(streams)))
+    return sum(counts), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--streams", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    config.ORIGIN = None # the dynamic origin path, as on a LAN install
+
+    print(f"{args.streams} concurrent streams of {args.chunks} chunks, median of {args.repeat}")
+    results = {}
+    for label, legacy in (("BaseHTTPMiddleware", True), ("pure ASGI", False)):
+        app = make_app(legacy, args.chunks)
+        rates = []
+        for _ in range(args.repeat):
+            chunks, elapsed = asyncio.run(run(app, args.streams))
+            assert chunks == args.chunks * args.streams, chunks
+            rates.append(chunks / elapsed)
+        results[label] = statistics.median(rates)
+        print(f"{label:<20}{results[label]:>12,.0f} chunks/s{1e6 / results[label]:>10.2f} us/chunk")
+    print(f"speedup {results['pure ASGI'] / results['BaseHTTPMiddleware']:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Startup benchmark.
+
+Reports how long `import app.main` takes (cumulative figure from
+`python -X importtime`, plus the slowest modules it pulls in) and the time from
+spawning uvicorn to the first 200 response, and fails when either exceeds its
+budget so a dependency that creeps back into the import path is caught.
+
+    python scripts/bench_startup.py [--runs N] [--max-import-ms MS] [--max-ttfb-ms MS] [--path /manifest.json]
+
+Each figure is the median of N runs (default 3). Exits 1 when a budget is exceeded.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Imported on demand since the services that need them are built lazily
+HEAVY_MODULES = ("eth_account", "webauthn", "pypandoc", "openpyxl", "httpx", "pandas")
+
+def import_profile():
+    """Returns (cumulative ms of app.main, [(ms, module)] of top-level imports, heavy modules loaded)."""
+    code = f"import json, sys, app.main; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    total, modules, children = None, [], []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1]) / 1000
+        except ValueError:
+            continue # header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # A module's imports are listed before it, one level deeper
+        if depth == 1:
+            children.append((cumulative, name.strip()))
+        elif depth == 0:
+            if name.strip() == "app.main":
+                total, modules = cumulative, children
+            children = []
+    modules.sort(reverse=True)
+    return total, modules, json.loads(proc.stdout.strip().splitlines()[-1])
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def time_to_first_200(path: str, timeout: float = 30.0) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except (urllib.error.URLError, ConnectionError, OSError):
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+            time.sleep(0.01)
+        raise RuntimeError(f"no 200 from {path} within {timeout}s")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-ttfb-ms", type=float, default=None)
+    parser.add_argument("--path", default="/manifest.json")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    import_ms = statistics.median(p[0] for p in profiles)
+    ttfb_ms = statistics.median(time_to_first_200(args.path) for _ in range(args.runs))
+
+    print(f"import app.main      {import_ms:8.1f} ms (median of {args.runs})")
+    print(f"time to first 200    {ttfb_ms:8.1f} ms ({args.path})")
+    print("slowest imports of app.main:")
+    for ms, name in profiles[-1][1][:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+    heavy = profiles[-1][2]
+    print(f"heavy modules loaded at import: {', '.join(heavy) or 'none'}")
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"FAIL: import time {import_ms:.1f} ms exceeds {args.max_import_ms:.1f} ms")
+        failed = True
+    if args.max_ttfb_ms is not None and ttfb_ms > args.max_ttfb_ms:
+        print(f"FAIL: time to first 200 {ttfb_ms:.1f} ms exceeds {args.max_ttfb_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
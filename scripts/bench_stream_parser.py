@@ -0,0 +1,140 @@
+"""
+Micro-benchmark for the question-card extractor.
+
+Replays stream-json transcripts (one CLI event per line, as written by
+`gemini --output-format stream-json`) through the previous per-character parser
+and through QuestionStreamParser, and reports the time spent on assistant
+message chunks.
+
+    python scripts/bench_stream_parser.py [transcript.jsonl ...]
+
+Without arguments synthetic transcripts of increasing length are generated.
+"""
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.stream_parser import QuestionStreamParser
+
+def legacy_parse(chunks):
+    """The extractor generate_response_stream used before QuestionStreamParser, reduced to its parsing work."""
+    current_message_content = ""
+    json_buffer = ""
+    in_json_block = False
+    questions = []
+    text = []
+    for content in chunks:
+        current_message_content += content
+        cleaned_content = ""
+        for char in content:
+            if (char == '{' or char == '`') and not in_json_block:
+                in_json_block = True
+                json_buffer = char
+            elif in_json_block:
+                json_buffer += char
+                if char == '}' or char == '`':
+                    if '"type": "question"' in json_buffer or '"type":"question"' in json_buffer:
+                        try:
+                            inner_json_match = re.search(r"\{\s*\"type\"\s*:\s*\"question\".*?\}", json_buffer, re.DOTALL)
+                            if inner_json_match:
+                                json.loads(inner_json_match.group(0))
+                                is_wrapped = json_buffer.startswith('```')
+                                if (is_wrapped and json_buffer.endswith('```')) or (not is_wrapped and json_buffer.endswith('}')):
+                                    in_json_block = False
+                                    json_buffer = ""
+                        except:
+                            pass
+                    else:
+                        if char == '`':
+                            if len(json_buffer) > 10 and not ('"type"' in json_buffer):
+                                cleaned_content += json_buffer
+                                in_json_block = False
+                                json_buffer = ""
+                        elif char == '}' and not ('"type"' in json_buffer):
+                            cleaned_content += json_buffer
+                            in_json_block = False
+                            json_buffer = ""
+            else:
+                cleaned_content += char
+        text.append(cleaned_content)
+        question_pattern = r"(?:```(?:json)?\s*)?\{\s*\"type\"\s*:\s*\"question\".*?\}(?:\s*```)?"
+        question_match = re.search(question_pattern, current_message_content, re.DOTALL)
+        if question_match:
+            try:
+                full_match_text = question_match.group(0)
+                json_only_match = re.search(r"\{\s*\"type\"\s*:\s*\"question\".*?\}", full_match_text, re.DOTALL)
+                if json_only_match:
+                    questions.append(json.loads(json_only_match.group(0)))
+                    current_message_content = current_message_content.replace(full_match_text, "")
+            except: pass
+    return "".join(text), questions
+
+def incremental_parse(chunks):
+    parser = QuestionStreamParser()
+    text = []
+    questions = []
+    for content in chunks:
+        cleaned, found = parser.feed(content)
+        text.append(cleaned)
+        questions.extend(found)
+    text.append(parser.flush())
+    return "".join(text), questions
+
+def load_transcript(path):
+    chunks = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("type") == "message" and event.get("role") == "assistant":
+                chunks.append(event.get("content", ""))
+    return chunks
+
+def synthetic_transcript(n_chunks):
+    """Markdown prose with code blocks and inline JSON, ending in a fenced question card."""
+    pieces = [
+        "Here is the next step of the analysis. ",
+        "We call `compute()` with the defaults, ",
+        "```python\nconfig = {'retries': 3, 'timeout': 30}\n```\n",
+        "and the service answers {\"status\": \"ok\", \"items\": [1, 2, 3]}. ",
+        "Γεια σου κόσμε, the results look consistent.\n",
+    ]
+    chunks = [pieces[i % len(pieces)] for i in range(n_chunks)]
+    question = {"type": "question", "question": "Continue?", "options": ["Yes", "No"], "allow_multiple": False}
+    card = "```json\n" + json.dumps(question) + "\n```\n"
+    chunks.extend(card[i:i + 16] for i in range(0, len(card), 16))
+    chunks.append("Let me know.")
+    return chunks
+
+def bench(name, chunks, repeat=3):
+    size_kb = sum(len(c) for c in chunks) / 1024
+    results = {}
+    for label, fn in (("legacy", legacy_parse), ("incremental", incremental_parse)):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, questions = fn(chunks)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = (best, len(questions))
+    legacy, incremental = results["legacy"][0], results["incremental"][0]
+    print(f"{name:<28} {len(chunks):>7} chunks {size_kb:>9.1f} KB   legacy {legacy * 1000:>9.2f} ms   "
+          f"incremental {incremental * 1000:>8.2f} ms   x{legacy / max(incremental, 1e-9):>6.1f}   "
+          f"questions {results['legacy'][1]}/{results['incremental'][1]}")
+
+def main():
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            bench(os.path.basename(path), load_transcript(path))
+    else:
+        for n in (100, 1000, 5000, 20000):
+            bench(f"synthetic-{n}", synthetic_transcript(n))
+
+if __name__ == "__main__":
+    main()
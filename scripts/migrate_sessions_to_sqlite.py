@@ -0,0 +1,28 @@
+"""
+One-shot import of user_sessions.json into the SQLite session store.
+
+    python scripts/migrate_sessions_to_sqlite.py [user_sessions.json] [user_sessions.db]
+
+Both the current format and the legacy {user_id: session_uuid} format are
+accepted. Users already in the database are replaced by the JSON version.
+Afterwards start the app with SESSION_STORE=sqlite.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.session_store import SQLiteSessionStore
+
+def main():
+    json_path = sys.argv[1] if len(sys.argv) > 1 else "user_sessions.json"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(json_path)), "user_sessions.db")
+    if not os.path.exists(json_path):
+        print(f"{json_path} not found")
+        sys.exit(1)
+    store = SQLiteSessionStore(db_path)
+    count = store.migrate_from_json(json_path)
+    print(f"Imported {count} users from {json_path} into {db_path}")
+
+if __name__ == "__main__":
+    main()
@@ -51,17 +51,32 @@ def recombine():
 
     # 4. Read components
     config_code = strip_local_imports(get_file_content('app/core/config.py'))
+    registry_code = strip_local_imports(get_file_content('app/core/registry.py'))
     patterns_code = strip_local_imports(get_file_content('app/core/patterns.py'))
     # Fix PATTERNS_FILE path for bundled app
     patterns_code = patterns_code.replace('os.path.join(os.path.dirname(__file__), "../../data/patterns.json")', 'os.path.join(os.getcwd(), "data", "patterns.json")')
     patterns_code += "\n# Ensure data directory exists\nos.makedirs(os.path.dirname(PATTERNS_FILE), exist_ok=True)\n"
     
-    user_manager_code = strip_local_imports(get_file_content('app/services/user_manager.py'))
+    crypto_executor_code = clean_config_ref(strip_local_imports(get_file_content('app/services/crypto_executor.py')))
+    user_manager_code = clean_config_ref(strip_local_imports(get_file_content('app/services/user_manager.py')))
     auth_service_code = clean_config_ref(strip_local_imports(get_file_content('app/services/auth_service.py')))
+    process_pool_code = strip_local_imports(get_file_content('app/services/process_pool.py'))
+    session_workers_code = strip_local_imports(get_file_content('app/services/session_workers.py'))
+    stream_parser_code = strip_local_imports(get_file_content('app/services/stream_parser.py'))
+    write_behind_code = strip_local_imports(get_file_content('app/services/write_behind.py'))
+    session_store_code = strip_local_imports(get_file_content('app/services/session_store.py'))
+    session_index_code = strip_local_imports(get_file_content('app/services/session_index.py'))
+    message_index_code = strip_local_imports(get_file_content('app/services/message_index.py'))
+    search_index_code = strip_local_imports(get_file_content('app/services/search_index.py'))
+    fork_forest_code = strip_local_imports(get_file_content('app/services/fork_forest.py'))
     llm_service_code = clean_config_ref(strip_local_imports(get_file_content('app/services/llm_service.py')))
-    sync_service_code = strip_local_imports(get_file_content('app/services/pattern_sync_service.py'))
+    sync_service_code = clean_config_ref(strip_local_imports(get_file_content('app/services/pattern_sync_service.py')))
+    pattern_catalog_code = strip_local_imports(get_file_content('app/services/pattern_catalog.py'))
     conversion_service_code = clean_config_ref(strip_local_imports(get_file_content('app/services/conversion_service.py')))
+    job_scheduler_code = strip_local_imports(get_file_content('app/services/job_scheduler.py'))
     pdf_service_code = clean_config_ref(strip_local_imports(get_file_content('app/services/pdf_service.py')))
+    attachment_store_code = strip_local_imports(get_file_content('app/services/attachment_store.py'))
+    upload_pipeline_code = strip_local_imports(get_file_content('app/services/upload_pipeline.py'))
     agent_model_code = strip_local_imports(get_file_content('app/models/agent.py'))
     agent_manager_code = clean_config_ref(strip_local_imports(get_file_content('app/services/agent_manager.py')))
     
@@ -80,27 +95,24 @@ def recombine():
     combined = []
     
     # Headers
-    combined.append("import json, os, mimetypes, hashlib, asyncio, re, secrets, shutil, uvicorn, bcrypt, subprocess, sys, base64, httpx, pypandoc, pandas as pd")
+    combined.append("import json, os, mimetypes, hashlib, asyncio, re, secrets, shutil, uvicorn, bcrypt, subprocess, sys, base64")
     combined.append("from typing import Dict, Optional, List, Tuple, Any")
     combined.append("from pydantic import BaseModel")
     combined.append("from fastapi import FastAPI, Request, Form, UploadFile, File, HTTPException, Depends, APIRouter")
     combined.append("from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, FileResponse")
     combined.append("from fastapi.staticfiles import StaticFiles")
     combined.append("from starlette.middleware.sessions import SessionMiddleware")
-    combined.append("from starlette.middleware.base import BaseHTTPMiddleware")
+    combined.append("from starlette.datastructures import URL, Headers")
     combined.append("from jinja2 import Environment, FileSystemLoader, Template")
-    combined.append("from eth_account.messages import encode_defunct")
-    combined.append("from eth_account import Account")
-    combined.append("import webauthn")
-    combined.append("from webauthn.helpers.structs import AuthenticatorSelectionCriteria, UserVerificationRequirement, PublicKeyCredentialDescriptor, ResidentKeyRequirement")
-    combined.append("from webauthn import generate_registration_options, verify_registration_response, generate_authentication_options, verify_authentication_response, options_to_json, base64url_to_bytes")
-    combined.append("from webauthn.helpers import bytes_to_base64url")
     combined.append("\n")
 
     # Configuration and Data
     combined.append("# --- CONFIGURATION ---")
     combined.append(config_code)
     combined.append("\n")
+    # Heavy libraries (webauthn, eth_account, pypandoc, openpyxl, httpx) are imported where they are used
+    combined.append(registry_code)
+    combined.append("\n")
     combined.append("# --- PATTERNS ---")
     combined.append(patterns_code)
     combined.append("\n")
@@ -116,18 +128,46 @@ def recombine():
 
     # Services
     combined.append("# --- SERVICES ---")
+    combined.append(crypto_executor_code)
+    combined.append("\n")
+    combined.append(write_behind_code)
+    combined.append("\n")
     combined.append(user_manager_code)
     combined.append("\n")
     combined.append(auth_service_code)
     combined.append("\n")
+    combined.append(process_pool_code)
+    combined.append("\n")
+    combined.append(session_workers_code)
+    combined.append("\n")
+    combined.append(stream_parser_code)
+    combined.append("\n")
+    combined.append(session_store_code)
+    combined.append("\n")
+    combined.append(session_index_code)
+    combined.append("\n")
+    combined.append(message_index_code)
+    combined.append("\n")
+    combined.append(search_index_code)
+    combined.append("\n")
+    combined.append(fork_forest_code)
+    combined.append("\n")
     combined.append(llm_service_code)
     combined.append("\n")
     combined.append(sync_service_code)
     combined.append("\n")
+    combined.append(pattern_catalog_code)
+    combined.append("\n")
     combined.append(conversion_service_code)
     combined.append("\n")
+    combined.append(job_scheduler_code)
+    combined.append("\n")
     combined.append(pdf_service_code)
     combined.append("\n")
+    combined.append(attachment_store_code)
+    combined.append("\n")
+    combined.append(upload_pipeline_code)
+    combined.append("\n")
     combined.append(agent_manager_code)
     combined.append("\n")
 
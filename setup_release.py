@@ -58,7 +58,7 @@ def setup():
     deps = [
         "python-dotenv", "fastapi", "uvicorn", "python-multipart",
         "jinja2", "bcrypt", "itsdangerous", "eth-account", "webauthn", "httpx",
-        "pypandoc", "pandas", "openpyxl", "tabulate"
+        "pypandoc", "openpyxl"
     ]
     
     print("Installing dependencies...")
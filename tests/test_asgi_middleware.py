@@ -0,0 +1,51 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app.core import config
+from app.main import DynamicAuthMiddleware, SecurityHeadersMiddleware
+from app.routers.auth import webauthn_target
+
+def make_app(https_only=False):
+    app = FastAPI()
+
+    @app.get("/target")
+    async def target(request: Request):
+        return webauthn_target(request)
+
+    @app.get("/own-csp")
+    async def own_csp():
+        return PlainTextResponse("x", headers={"Content-Security-Policy": "default-src *", "X-Custom": "1"})
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"data: {i}\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    app.add_middleware(SecurityHeadersMiddleware, https_only=https_only)
+    app.add_middleware(DynamicAuthMiddleware)
+    return app
+
+def test_headers_replace_the_handlers_own():
+    response = TestClient(make_app()).get("/own-csp")
+    assert response.headers.get_list("content-security-policy") == [SecurityHeadersMiddleware.CSP]
+    assert response.headers["x-custom"] == "1" and response.headers["x-frame-options"] == "DENY"
+    assert "strict-transport-security" not in response.headers
+    assert "strict-transport-security" in TestClient(make_app(https_only=True)).get("/own-csp").headers
+
+def test_streamed_responses_get_headers_and_whole_body():
+    with TestClient(make_app()).stream("GET", "/stream") as response:
+        assert response.headers["x-content-type-options"] == "nosniff"
+        assert "".join(response.iter_text()) == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+
+def test_webauthn_target_follows_the_host(monkeypatch):
+    monkeypatch.setattr(config, "ORIGIN", None)
+    client = TestClient(make_app())
+    assert client.get("/target", headers={"host": "192.168.1.5:8000"}).json() == {"rp_id": "192.168.1.5", "origin": "http://192.168.1.5:8000"}
+    forwarded = {"x-forwarded-proto": "https", "x-forwarded-host": "agent.example.org"}
+    assert client.get("/target", headers=forwarded).json() == {"rp_id": "agent.example.org", "origin": "https://agent.example.org"}
+
+    monkeypatch.setattr(config, "ORIGIN", "https://agent.example.com")
+    monkeypatch.setattr(config, "RP_ID", "agent.example.com")
+    assert client.get("/target", headers=forwarded).json() == {"rp_id": "agent.example.com", "origin": "https://agent.example.com"}
@@ -0,0 +1,68 @@
+import io
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from starlette.datastructures import UploadFile
+from app.services.attachment_store import AttachmentStore
+from app.services.upload_pipeline import UploadIngestor
+
+def make_upload(name, data):
+    return UploadFile(io.BytesIO(data), filename=name, size=len(data))
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = AttachmentStore(str(tmp_path / "cas"))
+    digests = []
+    for name in ("a.txt", "b.txt"):
+        writer = store.begin()
+        writer.write(b"same ")
+        writer.write(b"bytes")
+        digests.append(store.commit(writer, str(tmp_path / name)))
+
+    assert digests[0] == digests[1]
+    assert os.path.samefile(tmp_path / "a.txt", tmp_path / "b.txt")
+    assert (tmp_path / "b.txt").read_bytes() == b"same bytes"
+    assert store.refcount(digests[0]) == 2
+    assert store.get_metrics()["dedup_hits"] == 1
+    assert os.listdir(store.tmp_dir) == []
+
+def test_gc_removes_only_unreferenced_objects(tmp_path):
+    store = AttachmentStore(str(tmp_path / "cas"))
+    kept, dropped = [], []
+    for name, data, bucket in (("keep.txt", b"keep", kept), ("drop.txt", b"drop", dropped)):
+        writer = store.begin()
+        writer.write(data)
+        bucket.append(store.commit(writer, str(tmp_path / name)))
+    os.remove(tmp_path / "drop.txt")
+
+    assert store.gc(grace=3600) == {"removed": 0, "bytes": 0} # still within the grace period
+    assert store.gc(grace=-1) == {"removed": 1, "bytes": 4}
+    assert os.path.exists(store.object_path(kept[0]))
+    assert not os.path.exists(store.object_path(dropped[0]))
+
+@pytest.mark.asyncio
+async def test_repeat_uploads_reuse_conversions_and_compressed_pdfs(tmp_path):
+    conversion = MagicMock()
+    def convert(path):
+        out = os.path.splitext(path)[0] + ".md"
+        with open(out, "w") as f:
+            f.write("# table")
+        return out
+    conversion.convert_to_markdown.side_effect = convert
+    pdf = MagicMock()
+    async def compress(in_p, out_p):
+        with open(out_p, "wb") as f:
+            f.write(b"%PDF small")
+        return out_p
+    pdf.compress_pdf = AsyncMock(side_effect=compress)
+    ingestor = UploadIngestor(str(tmp_path), conversion, pdf)
+
+    first = await ingestor.ingest([make_upload("sheet.xlsx", b"xlsx bytes"), make_upload("doc.pdf", b"%PDF big")])
+    events = []
+    second = await ingestor.ingest([make_upload("copy.xlsx", b"xlsx bytes"), make_upload("doc.pdf", b"%PDF big")], progress=events.append)
+
+    assert conversion.convert_to_markdown.call_count == 1
+    assert pdf.compress_pdf.await_count == 1
+    assert [os.path.basename(p) for p in second] == ["copy.md", "compressed_doc.pdf"]
+    assert open(second[0]).read() == "# table"
+    assert os.path.samefile(first[0], second[0])
+    assert {e["stage"] for e in events} == {"receiving", "done"}
@@ -54,3 +54,57 @@ def test_convert_invalid_extension(conversion_service):
 def test_convert_non_existent_file(conversion_service):
     with pytest.raises(FileNotFoundError):
         conversion_service.convert_to_markdown("non_existent.docx")
+
+def make_workbook(path, rows, title="Data"):
+    import openpyxl
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = title
+    for row in rows:
+        sheet.append(row)
+    workbook.create_sheet("Empty")
+    workbook.save(path)
+
+def test_xlsx_is_streamed_to_markdown_table(tmp_path):
+    xlsx_path = str(tmp_path / "small.xlsx")
+    make_workbook(xlsx_path, [["Name", "Qty", None], ["a|b", 2.0, None], [None, None, None], ["line\nbreak", 3, None]])
+
+    md_path = FileConversionService(xlsx_max_rows=0, xlsx_max_cols=0).convert_to_markdown(xlsx_path)
+    content = open(md_path, encoding="utf-8").read()
+
+    assert content.startswith("## Sheet: Data\n\n| Name | Qty |\n| --- | --- |\n| a\\|b | 2 |\n| line<br>break | 3 |\n")
+    assert "## Sheet: Empty\n\n_(empty sheet)_" in content
+    assert "Truncated" not in content
+
+def test_xlsx_caps_rows_and_columns_with_statistics(tmp_path):
+    from app.services.conversion_service import xlsx_to_markdown
+    xlsx_path = str(tmp_path / "big.xlsx")
+    md_path = str(tmp_path / "big.md")
+    make_workbook(xlsx_path, [["id", "value", "note", "extra"]] + [[i, i * 1.5, f"n{i}", "x"] for i in range(1, 101)])
+
+    summary = xlsx_to_markdown(xlsx_path, md_path, max_rows=10, max_cols=3)
+    content = open(md_path, encoding="utf-8").read()
+
+    assert summary["Data"] == {"rows": 100, "columns": 4, "rows_shown": 10, "columns_shown": 3}
+    assert "| 10 | 15 | n10 |" in content and "| 11 |" not in content
+    assert "showing 10 of 100 rows and 3 of 4 columns" in content
+    assert "| value | 100 | 100 | 1.5 | 150 | 75.75 |" in content
+    assert "| note | 100 | 0 |  |  |  |" in content
+    assert "| extra (not shown) | 100 | 0 |  |  |  |" in content # cut columns are still summarized
+
+def test_xlsx_statistics_cover_columns_wider_than_the_header(tmp_path):
+    from app.services.conversion_service import xlsx_to_markdown
+    xlsx_path = str(tmp_path / "wide.xlsx")
+    md_path = str(tmp_path / "wide.md")
+    make_workbook(xlsx_path, [["id"], [1, 5], [2, 7, "z"]])
+
+    summary = xlsx_to_markdown(xlsx_path, md_path, max_cols=1)
+    content = open(md_path, encoding="utf-8").read()
+    assert summary["Data"]["columns"] == 3
+    assert "| Column 2 (not shown) | 2 | 2 | 5 | 7 | 6 |" in content
+    assert "| Column 3 (not shown) | 1 | 0 |  |  |  |" in content
+
+def test_conversion_module_does_not_import_pandas():
+    import subprocess, sys
+    code = "import sys, app.services.conversion_service; sys.exit('pandas' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
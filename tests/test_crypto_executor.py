@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+import bcrypt
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.crypto_executor import AuthRateLimited, CryptoExecutor, LatencyHistogram
+from app.services.user_manager import UserManager
+
+@pytest.mark.asyncio
+async def test_per_client_limit():
+    crypto = CryptoExecutor(max_workers=4, per_client_limit=2)
+    release = threading.Event()
+    a1 = asyncio.create_task(crypto.run("op", release.wait, client="10.0.0.1"))
+    a2 = asyncio.create_task(crypto.run("op", release.wait, client="10.0.0.1"))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(AuthRateLimited):
+        await crypto.run("op", release.wait, client="10.0.0.1")
+    other = asyncio.create_task(crypto.run("op", lambda: "ok", client="10.0.0.2"))
+    assert await other == "ok"
+
+    release.set()
+    await asyncio.gather(a1, a2)
+    assert await crypto.run("op", lambda: 1, client="10.0.0.1") == 1
+    metrics = crypto.get_metrics()
+    assert metrics["rejected"] == 1 and metrics["in_flight"] == 0 and metrics["ops"]["op"]["latency"]["count"] == 4
+    crypto.shutdown()
+
+@pytest.mark.asyncio
+async def test_login_burst_does_not_block_the_loop(tmp_path, monkeypatch):
+    gensalt = bcrypt.gensalt
+    monkeypatch.setattr(bcrypt, "gensalt", lambda rounds=10, prefix=b"2b": gensalt(10, prefix))
+    um = UserManager(working_dir=str(tmp_path), crypto=CryptoExecutor(max_workers=2, per_client_limit=0))
+    um.register_user("alice", "secret")
+
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(um.authenticate_user_async("alice", "secret" if i % 2 else "wrong", client=f"ip{i}") for i in range(8)))
+    elapsed = time.perf_counter() - start
+    ticker_task.cancel()
+
+    assert results == [False, True] * 4
+    # The loop kept ticking while eight bcrypt checks ran
+    assert ticks >= elapsed / 0.005 * 0.5
+    assert um.crypto.get_metrics()["ops"]["verify_password"]["wait"]["count"] == 8
+
+def test_histogram_percentiles():
+    hist = LatencyHistogram()
+    for ms in [0.5] * 50 + [30] * 45 + [7000] * 5:
+        hist.observe(ms / 1000)
+    snap = hist.snapshot()
+    assert snap["count"] == 100 and snap["buckets"]["le_1ms"] == 50 and snap["buckets"]["le_50ms"] == 45 and snap["buckets"]["inf"] == 5
+    assert snap["p50_ms"] == 1.0 and snap["p95_ms"] == 50.0 and snap["p99_ms"] == 7000.0
+
+def test_login_over_the_limit_gets_429(tmp_path):
+    original = app.state.user_manager
+    um = UserManager(working_dir=str(tmp_path), crypto=CryptoExecutor(per_client_limit=1))
+    app.state.user_manager = um
+    try:
+        client = TestClient(app)
+        um.crypto._in_flight["testclient"] = 1 # a check from this client is still running
+        response = client.post("/login", data={"username": "alice", "password": "x"})
+        assert response.status_code == 200 # unknown user: no check needed, so no limit either
+        um.users["alice"] = {"password": um.get_password_hash("x"), "role": "user", "passkeys": []}
+        response = client.post("/login", data={"username": "alice", "password": "x"}, follow_redirects=False)
+        assert response.status_code == 429 and response.headers["retry-after"] == "1"
+        del um.crypto._in_flight["testclient"]
+        response = client.post("/login", data={"username": "alice", "password": "x"}, follow_redirects=False)
+        assert response.status_code == 303
+    finally:
+        app.state.user_manager = original
+
+@pytest.mark.asyncio
+async def test_pattern_miss_hashes_off_the_loop(tmp_path, monkeypatch):
+    um = UserManager(working_dir=str(tmp_path), crypto=CryptoExecutor(max_workers=1, per_client_limit=0))
+    loop_thread = threading.get_ident()
+    hashed_on = []
+    get_password_hash = um.get_password_hash
+    monkeypatch.setattr(um, "get_password_hash", lambda p: hashed_on.append(threading.get_ident()) or get_password_hash(p))
+
+    assert await um.get_user_by_pattern_async("1-2-3") is None
+    assert await um.get_user_by_pattern_async("4-5-6") is None
+    assert len(hashed_on) == 1 and hashed_on[0] != loop_thread # the dummy hash is made once, in the executor
@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import AsyncMock
+from app.services.fork_forest import ForkForest
+from app.services.llm_service import GeminiAgent
+
+def test_find_and_component():
+    forest = ForkForest({
+        "b": {"parent": "a", "fork_point": 1},
+        "c": {"parent": "b", "fork_point": 3},
+        "d": {"parent": "a", "fork_point": 1},
+        "y": {"parent": "x", "fork_point": 0},
+        "orphan": {"parent": None, "fork_point": -1}
+    })
+    assert forest.find("c") == forest.find("d") == forest.find("a")
+    assert forest.find("y") != forest.find("a")
+    assert forest.find("unknown") == "unknown"
+    assert sorted(forest.component("c")) == ["a", "b", "c", "d"]
+    assert forest.component("orphan") == ["orphan"]
+    assert forest.children("a") == ["b", "d"]
+    assert forest.parent("c") == "b"
+
+    forest.remove(forest.component("a"))
+    assert forest.component("b") == ["b"]
+    assert len(forest) == 1
+
+def test_deep_chain_has_no_recursion_limit():
+    forks = {f"s{i}": {"parent": f"s{i - 1}", "fork_point": i} for i in range(1, 5000)}
+    forest = ForkForest(forks)
+    assert forest.find("s4999") == forest.find("s0")
+    assert len(forest.component("s2500")) == 5000
+
+def make_agent(tmp_path):
+    agent = GeminiAgent(working_dir=str(tmp_path))
+    agent._create_subprocess = AsyncMock(return_value=AsyncMock(communicate=AsyncMock(return_value=(b"", b""))))
+    agent.user_data["u1"] = {
+        "active_session": "c",
+        "sessions": ["a", "b", "c", "x"],
+        "pinned_sessions": [],
+        "session_metadata": {u: {"original_title": u, "time": "now"} for u in "abcx"},
+        "session_forks": {"b": {"parent": "a", "fork_point": 1}}
+    }
+    return agent
+
+@pytest.mark.asyncio
+async def test_grouping_sync_and_delete_follow_recorded_forks(tmp_path):
+    agent = make_agent(tmp_path)
+    # A fork recorded after the forest was built is picked up incrementally
+    agent._fork_forest("u1")
+    agent._record_fork("u1", "c", "b", 4)
+
+    data = await agent.get_user_sessions("u1")
+    assert [s["uuid"] for s in data["history"]] == ["x", "c"]
+    assert agent.get_session_forks("u1", "b") == {4: ["c"], 1: ["a"]}
+
+    await agent.sync_session_updates("u1", "a", title="Renamed")
+    assert agent.user_data["u1"]["custom_titles"] == {"a": "Renamed", "b": "Renamed", "c": "Renamed"}
+
+    assert await agent.delete_specific_session("u1", "b")
+    assert agent.user_data["u1"]["sessions"] == ["x"]
+    assert agent.user_data["u1"]["session_forks"] == {}
+    assert agent._fork_forest("u1").component("a") == ["a"]
+
+@pytest.mark.asyncio
+async def test_active_fork_marks_latest_and_direct_edits_are_seen(tmp_path):
+    agent = make_agent(tmp_path)
+    agent.user_data["u1"]["active_session"] = "a"
+    data = await agent.get_user_sessions("u1")
+    latest_b = next(s for s in data["history"] if s["uuid"] == "b")
+    assert latest_b["has_active_fork"]
+
+    # session_forks edited without going through _record_fork
+    agent.user_data["u1"]["session_forks"]["x"] = {"parent": "c", "fork_point": 0}
+    data = await agent.get_user_sessions("u1")
+    assert [s["uuid"] for s in data["history"]] == ["x", "b"] # x now groups with c
@@ -46,3 +46,39 @@ def test_admin_settings_routes():
         del app.dependency_overrides[get_user]
         # Restore original setting
         update_global_setting("interactive_mode_instructions", original_instructions)
+
+@pytest.fixture
+def settings_file(tmp_path, monkeypatch):
+    from app.core import config
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({"a": 1}))
+    monkeypatch.setattr(config, "SETTINGS_FILE", str(path))
+    monkeypatch.setattr(config, "SETTINGS_RECHECK_SECONDS", 60)
+    return path
+
+def test_settings_are_read_once(settings_file):
+    from app.core import config
+    loads = config.get_settings_metrics()["loads"]
+    for _ in range(100):
+        assert get_global_setting("a") == 1
+    assert config.get_settings_metrics()["loads"] == loads + 1
+    config.get_all_global_settings()["a"] = 2 # callers get a copy
+    assert get_global_setting("a") == 1
+
+def test_outside_edits_are_picked_up_on_recheck(settings_file, monkeypatch):
+    from app.core import config
+    assert get_global_setting("a") == 1
+    settings_file.write_text(json.dumps({"a": 22}))
+    assert get_global_setting("a") == 1 # not rechecked yet
+    monkeypatch.setattr(config, "SETTINGS_RECHECK_SECONDS", 0)
+    assert get_global_setting("a") == 22
+
+def test_batched_update_writes_once(settings_file):
+    from app.core import config
+    metrics = config.get_settings_metrics()
+    config.update_global_settings({"b": "x", "c": None})
+    assert json.loads(settings_file.read_text()) == {"a": 1, "b": "x", "c": None}
+    after = config.get_settings_metrics()
+    assert after["writes"] == metrics["writes"] + 1 and after["version"] > metrics["version"]
+    assert get_global_setting("b") == "x" and config.get_settings_metrics()["loads"] == after["loads"]
+    assert [p.name for p in settings_file.parent.iterdir()] == ["settings.json"]
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app.services.job_scheduler import JobScheduler
+from app.services.pdf_service import PDFService, estimate_page_count
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_priority_order():
+    scheduler = JobScheduler(max_concurrency=1)
+    release = threading.Event()
+    order = []
+
+    def job(name, wait=False):
+        def fn(_job):
+            if wait:
+                release.wait(5)
+            order.append(name)
+            return name
+        return fn
+
+    first = asyncio.create_task(scheduler.run(job("first", wait=True), priority=5))
+    await asyncio.sleep(0.05)
+    rest = [asyncio.create_task(scheduler.run(job(name), priority=p)) for name, p in (("big", 9), ("small-1", 1), ("small-2", 1))]
+    await asyncio.sleep(0.05)
+    metrics = scheduler.get_metrics()
+    assert (metrics["running"], metrics["queued"]) == (1, 3)
+
+    release.set()
+    assert await asyncio.gather(first, *rest) == ["first", "big", "small-1", "small-2"]
+    assert order == ["first", "small-1", "small-2", "big"]
+    assert scheduler.get_metrics()["wait"]["count"] == 4
+
+@pytest.mark.asyncio
+async def test_cancelling_the_caller_drops_queued_and_interrupts_running_jobs():
+    scheduler = JobScheduler(max_concurrency=1)
+    stop = threading.Event()
+    started = []
+
+    def blocking(job):
+        started.append(job)
+        job.on_cancel = stop.set
+        stop.wait(5)
+        return "interrupted"
+
+    running = asyncio.create_task(scheduler.run(blocking))
+    queued = asyncio.create_task(scheduler.run(blocking))
+    await asyncio.sleep(0.05)
+    queued.cancel()
+    running.cancel()
+    await asyncio.gather(running, queued, return_exceptions=True)
+    await asyncio.sleep(0.05)
+
+    assert len(started) == 1 and stop.is_set()
+    metrics = scheduler.get_metrics()
+    assert (metrics["running"], metrics["queued"], metrics["cancelled"]) == (0, 0, 2)
+
+def test_estimate_page_count(tmp_path):
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4\n1 0 obj << /Type /Pages /Kids [3 0 R] /Count 12 >> endobj\n"
+                    b"2 0 obj << /Count 3 /Type /Pages /Parent 1 0 R >> endobj\n")
+    assert estimate_page_count(str(pdf)) == 12
+    pdf.write_bytes(b"%PDF-1.5 object streams only")
+    assert estimate_page_count(str(pdf)) is None
+
+@pytest.mark.asyncio
+async def test_small_and_long_pdfs_are_not_compressed(tmp_path):
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4 << /Type /Pages /Count 900 >>" + b" " * 2048)
+    with patch("shutil.which", return_value="gs"), patch("subprocess.Popen") as mock_popen:
+        service = PDFService(min_bytes=4096)
+        assert await service.compress_pdf(str(pdf), str(tmp_path / "out.pdf")) == str(pdf)
+        service = PDFService(max_pages=500)
+        assert await service.compress_pdf(str(pdf), str(tmp_path / "out.pdf")) == str(pdf)
+    assert not mock_popen.called
+    assert service.counters["skipped_pages"] == 1
+
+@pytest.mark.asyncio
+async def test_page_count_probe_runs_off_the_loop(tmp_path):
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4 << /Type /Pages /Count 900 >>")
+    threads = []
+    def probe(path):
+        threads.append(threading.get_ident())
+        return estimate_page_count(path)
+    with patch("shutil.which", return_value="gs"), patch("app.services.pdf_service.estimate_page_count", probe):
+        service = PDFService(min_bytes=0, max_pages=500)
+        assert await service.compress_pdf(str(pdf), str(tmp_path / "out.pdf")) == str(pdf)
+    assert threads and threads[0] != threading.get_ident()
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a shell script as a stand-in for gs")
+@pytest.mark.asyncio
+async def test_ghostscript_timeout_kills_the_process(tmp_path):
+    fake_gs = tmp_path / "gs"
+    fake_gs.write_text("#!/bin/sh\nexec sleep 30\n")
+    fake_gs.chmod(0o755)
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    with patch("shutil.which", return_value=str(fake_gs)):
+        service = PDFService(timeout=0.3)
+    start = time.monotonic()
+    assert await service.compress_pdf(str(pdf), str(tmp_path / "out.pdf")) == str(pdf)
+    assert time.monotonic() - start < 5
+    assert service.counters["timeouts"] == 1
+    assert service.get_metrics()["queue"]["running"] == 0
+    assert [f for f in os.listdir(tmp_path) if f.startswith("gs_")] == []
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a shell script as a stand-in for gs")
+@pytest.mark.asyncio
+async def test_cancelled_compression_kills_ghostscript(tmp_path):
+    fake_gs = tmp_path / "gs"
+    fake_gs.write_text("#!/bin/sh\nexec sleep 30\n")
+    fake_gs.chmod(0o755)
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    with patch("shutil.which", return_value=str(fake_gs)):
+        service = PDFService(timeout=60)
+    task = asyncio.create_task(service.compress_pdf(str(pdf), str(tmp_path / "out.pdf")))
+    await asyncio.sleep(0.3)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    for _ in range(50):
+        if service.get_metrics()["queue"]["running"] == 0:
+            break
+        await asyncio.sleep(0.05)
+    assert service.get_metrics()["queue"]["running"] == 0
@@ -0,0 +1,106 @@
+import json
+import os
+import pytest
+from app.core import config
+from app.services.llm_service import GeminiAgent
+from app.services.message_index import MessageIndex, build_sidecar
+from app.services.session_index import SessionIndex
+
+UUID_A = "aaaaaaaa-1111-2222-3333-444444444444"
+
+def write_chat(path, messages, indent=2):
+    data = {"sessionId": UUID_A, "startTime": "2026-01-01T10:00:00Z", "messages": messages, "summary": "s"}
+    path.write_text(json.dumps(data, indent=indent, ensure_ascii=False), encoding="utf-8")
+
+def sample_messages(n):
+    return [{"id": str(i), "type": "user" if i % 2 == 0 else "gemini", "content": f"message {i} ünïcødé ✓ {{]\"["} for i in range(n)]
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_offsets_match_full_parse(tmp_path, indent):
+    path = tmp_path / "chat.json"
+    messages = sample_messages(25)
+    write_chat(path, messages, indent)
+    raw = path.read_bytes()
+    index = build_sidecar(str(path))
+    assert [json.loads(raw[s:e]) for s, e in index["offsets"]] == messages
+
+def test_page_equals_slice_from_the_end(tmp_path):
+    path = tmp_path / "chat.json"
+    messages = sample_messages(30)
+    write_chat(path, messages)
+    mi = MessageIndex(str(tmp_path / "cache"))
+    start, page, total = mi.read_page(str(path), limit=10, offset=5)
+    assert (start, total) == (15, 30)
+    assert page == messages[15:25]
+    assert mi.read_page(str(path), limit=10, offset=40) == (0, [], 30)
+    assert mi.read_page(str(path), limit=None)[1] == messages
+
+def test_sidecar_reused_and_rebuilt_on_change(tmp_path):
+    path = tmp_path / "chat.json"
+    write_chat(path, sample_messages(4))
+    cache = tmp_path / "cache"
+    MessageIndex(str(cache)).get(str(path))
+    assert len(os.listdir(cache)) == 1
+
+    mi = MessageIndex(str(cache))
+    mi.get(str(path))
+    assert mi.counters == {"builds": 0, "sidecar_hits": 1, "memory_hits": 0}
+    mi.get(str(path))
+    assert mi.counters["memory_hits"] == 1
+
+    write_chat(path, sample_messages(6))
+    os.utime(path, ns=(1, 10**18))
+    assert mi.read_page(str(path), limit=1)[1][0]["id"] == "5"
+    assert mi.counters["builds"] == 1
+
+def test_empty_messages(tmp_path):
+    path = tmp_path / "chat.json"
+    write_chat(path, [])
+    assert MessageIndex(str(tmp_path / "cache")).read_page(str(path), limit=5) == (0, [], 0)
+
+@pytest.mark.asyncio
+async def test_agent_get_session_messages(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "MESSAGE_INDEX_DIR", str(tmp_path / "cache"))
+    chats = tmp_path / "gemini_tmp" / "p1" / "chats"
+    chats.mkdir(parents=True)
+    messages = sample_messages(8)
+    messages[5]["content"] = "   "
+    write_chat(chats / f"session-2026-01-01T10-00-{UUID_A[:8]}.json", messages)
+    agent = GeminiAgent(working_dir=str(tmp_path))
+    agent.session_index = SessionIndex(base_dir=str(tmp_path / "gemini_tmp"))
+
+    result = await agent.get_session_messages(UUID_A, limit=4, offset=0)
+    assert result["total"] == 8
+    # Blank messages are skipped but raw_index still points into the file
+    assert [m["raw_index"] for m in result["messages"]] == [4, 6, 7]
+    assert result["messages"][0] == {"role": "user", "content": messages[4]["content"], "raw_index": 4}
+    assert await agent.get_session_messages("cccccccc-0000-0000-0000-000000000000") == {"messages": [], "total": 0}
+
+def test_page_bounds_follow_the_file_when_the_index_is_stale(tmp_path, monkeypatch):
+    path = tmp_path / "chat.json"
+    write_chat(path, sample_messages(4))
+    mi = MessageIndex(str(tmp_path / "cache"))
+    stale = mi.get(str(path))
+    write_chat(path, sample_messages(9))
+    os.utime(path, ns=(1, 10**18))
+
+    # The file changed between get() and the read: bounds come from the rebuilt index
+    calls = []
+    real_get = mi.get
+    monkeypatch.setattr(mi, "get", lambda p: calls.append(p) or (stale if len(calls) == 1 else real_get(p)))
+    assert mi.read_page(str(path), limit=3) == (6, sample_messages(9)[6:9], 9)
+
+    # It keeps changing: the page is cut from the bytes that were indexed
+    monkeypatch.setattr(mi, "get", lambda p: stale)
+    assert mi.read_page(str(path), limit=3, offset=1) == (5, sample_messages(9)[5:8], 9)
+    assert mi.read_range(str(path), 7, 20) == (sample_messages(9)[7:9], 9)
+
+def test_failed_sidecar_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    path = tmp_path / "chat.json"
+    write_chat(path, sample_messages(3))
+    cache = tmp_path / "cache"
+    def fail(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "replace", fail)
+    assert MessageIndex(str(cache)).read_page(str(path), limit=1)[2] == 3 # still served from the built index
+    assert os.listdir(cache) == []
@@ -0,0 +1,61 @@
+import json
+import os
+import pytest
+from fastapi.testclient import TestClient
+from app.core.patterns import PatternStore
+from app.main import app
+from app.routers.chat import get_user
+from app.services.pattern_catalog import PatternCatalog
+
+@pytest.fixture
+def catalog(tmp_path):
+    patterns_file = tmp_path / "patterns.json"
+    patterns_file.write_text(json.dumps({"summarize": "Summarize.", "__explanations__": "1. **summarize**: Summarizes things."}))
+    prompts_dir = tmp_path / "prompts"
+    prompts_dir.mkdir()
+    (prompts_dir / "mine.md").write_text("custom")
+    return PatternCatalog(PatternStore(str(patterns_file)), str(prompts_dir))
+
+def test_catalog_is_built_once_per_version(catalog, tmp_path):
+    body, etag = catalog.get()
+    assert json.loads(body) == [
+        {"name": "mine.md", "description": "User generated prompt", "type": "user"},
+        {"name": "summarize", "description": "Summarizes things.", "type": "system"}
+    ]
+    assert catalog.get() == (body, etag) and catalog.counters["builds"] == 1
+
+    catalog.invalidate()
+    assert catalog.get()[1] == etag and catalog.counters["builds"] == 2 # same content, same ETag
+
+    (tmp_path / "patterns.json").write_text(json.dumps({"other": "x"}))
+    catalog.patterns.reload()
+    body, new_etag = catalog.get()
+    assert new_etag != etag and [p["name"] for p in json.loads(body)] == ["mine.md"]
+
+def test_if_none_match_comparison(catalog):
+    _, etag = catalog.get()
+    assert catalog.is_fresh(etag, etag)
+    assert catalog.is_fresh(f'"other", W/{etag}', etag)
+    assert catalog.is_fresh("*", etag)
+    assert not catalog.is_fresh('"other"', etag) and not catalog.is_fresh(None, etag)
+
+def test_patterns_route_etag_and_prompt_invalidation(catalog, monkeypatch):
+    original = app.state.pattern_catalog
+    app.state.pattern_catalog = catalog
+    monkeypatch.setattr(app.state.agent, "working_dir", os.path.dirname(catalog.prompts_dir))
+    app.dependency_overrides[get_user] = lambda: "testuser"
+    try:
+        client = TestClient(app)
+        first = client.get("/patterns")
+        assert first.status_code == 200 and first.headers["cache-control"] == "no-cache"
+        etag = first.headers["etag"]
+        cached = client.get("/patterns", headers={"If-None-Match": etag})
+        assert cached.status_code == 304 and cached.content == b""
+
+        created = client.post("/prompts/new", data={"title": "Fresh", "content": "hi"}).json()
+        after = client.get("/patterns", headers={"If-None-Match": etag})
+        assert after.status_code == 200 and after.headers["etag"] != etag
+        assert created["filename"] in [p["name"] for p in after.json()]
+    finally:
+        app.dependency_overrides.clear()
+        app.state.pattern_catalog = original
@@ -0,0 +1,80 @@
+import json
+import os
+import stat
+import bcrypt
+import pytest
+from app.services.user_manager import UserManager
+
+@pytest.fixture(autouse=True)
+def cheap_bcrypt(monkeypatch):
+    gensalt = bcrypt.gensalt
+    monkeypatch.setattr(bcrypt, "gensalt", lambda rounds=4, prefix=b"2b": gensalt(4, prefix))
+
+@pytest.fixture
+def um(tmp_path, monkeypatch):
+    monkeypatch.delenv("USERS_FILE", raising=False)
+    monkeypatch.delenv("PATTERN_INDEX_KEY_FILE", raising=False)
+    return UserManager(working_dir=str(tmp_path))
+
+def count_verifies(um, monkeypatch):
+    calls = []
+    verify = um.verify_password
+    monkeypatch.setattr(um, "verify_password", lambda plain, hashed: calls.append(hashed) or verify(plain, hashed))
+    return calls
+
+def add_legacy_user(um, username, pattern):
+    """A user as stored before fingerprints existed."""
+    um.users[username] = {"password": um.get_password_hash("pw"), "pattern": um.get_password_hash(pattern), "role": "user", "passkeys": []}
+    um._save_users()
+
+def test_indexed_lookup_verifies_one_hash(um, monkeypatch):
+    for i in range(10):
+        um.register_user(f"user{i}", "pw", pattern=f"1-2-{i}")
+    calls = count_verifies(um, monkeypatch)
+    assert um.get_user_by_pattern("1-2-7") == "user7"
+    assert calls == [um.users["user7"]["pattern"]]
+
+    calls.clear()
+    assert um.get_user_by_pattern("9-9-9") is None
+    assert len(calls) == 1 # a dummy check, so a miss costs the same as a hit
+
+def test_key_is_kept_out_of_users_file(um, tmp_path):
+    um.register_user("alice", "pw", pattern="1-2-3")
+    key_file = tmp_path / ".pattern_index_key"
+    assert stat.S_IMODE(os.stat(key_file).st_mode) == 0o600
+    assert key_file.read_bytes().hex() not in (tmp_path / "users.json").read_text()
+
+def test_legacy_hashes_are_migrated_on_login(um, tmp_path, monkeypatch):
+    um.register_user("new", "pw", pattern="5-5-5")
+    add_legacy_user(um, "old", "1-4-7")
+    add_legacy_user(um, "older", "3-6-9")
+    assert um.get_pattern_index_stats() == {"users_with_pattern": 3, "indexed": 1, "unmigrated": 2}
+
+    assert um.get_user_by_pattern("3-6-9") == "older"
+    assert json.loads((tmp_path / "users.json").read_text())["older"]["pattern_fp"]
+    assert um.authenticate_with_pattern("old", "1-4-7")
+    assert um.get_pattern_index_stats()["unmigrated"] == 0
+
+    reloaded = UserManager(working_dir=str(tmp_path))
+    calls = count_verifies(reloaded, monkeypatch)
+    assert reloaded.get_user_by_pattern("1-4-7") == "old" and len(calls) == 1
+
+def test_disabled_and_changed_patterns(um, monkeypatch):
+    um.register_user("alice", "pw", pattern="1-2-3")
+    um.register_user("bob", "pw", pattern="4-5-6")
+    um.set_pattern_disabled("alice", True)
+    assert um.get_user_by_pattern("1-2-3") is None
+
+    um.set_pattern("bob", "7-8-9")
+    assert um.get_user_by_pattern("4-5-6") is None
+    assert um.get_user_by_pattern("7-8-9") == "bob"
+    um.remove_user("bob")
+    assert um.get_user_by_pattern("7-8-9") is None
+
+def test_new_key_falls_back_to_scan(um, tmp_path):
+    um.register_user("alice", "pw", pattern="1-2-3")
+    os.remove(tmp_path / ".pattern_index_key")
+    fresh = UserManager(working_dir=str(tmp_path))
+    assert fresh.get_pattern_index_stats()["unmigrated"] == 1
+    assert fresh.get_user_by_pattern("1-2-3") == "alice"
+    assert fresh.get_pattern_index_stats()["unmigrated"] == 0
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.core.patterns import PatternStore
+from app.services.pattern_sync_service import PatternSyncService
+
+class FakeGitHub:
+    """Serves a pattern list and pattern bodies with ETags, like the GitHub API and raw.githubusercontent.com."""
+    def __init__(self, patterns):
+        self.patterns = dict(patterns)
+        self.failures = {} # name -> number of 503s to answer before succeeding
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body=b"", etag=None):
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with fake.lock:
+                    fake.requests.append((self.path, self.headers.get("If-None-Match")))
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    time.sleep(0.02)
+                    if self.path == "/list":
+                        items = [{"name": n, "type": "dir"} for n in sorted(fake.patterns)] + [{"name": "README.md", "type": "file"}]
+                        body = json.dumps(items).encode()
+                    else:
+                        name = self.path.split("/")[2]
+                        with fake.lock:
+                            if fake.failures.get(name):
+                                fake.failures[name] -= 1
+                                return self.reply(503)
+                        if name not in fake.patterns:
+                            return self.reply(404)
+                        body = fake.patterns[name].encode()
+                    etag = '"%d"' % hash(body)
+                    if self.headers.get("If-None-Match") == etag:
+                        return self.reply(304, etag=etag)
+                    self.reply(200, body, etag)
+                finally:
+                    with fake.lock:
+                        fake.in_flight -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def pattern_requests(self):
+        return [r for r in self.requests if r[0] != "/list"]
+
+@pytest.fixture
+def github():
+    fake = FakeGitHub({f"p{i:02d}": f"# IDENTITY and PURPOSE\n\nPattern {i}.\n\n# STEPS\nrun fabric --pattern p{i}" for i in range(20)})
+    yield fake
+    fake.server.shutdown()
+
+def make_service(tmp_path, github, **kwargs):
+    store = PatternStore(str(tmp_path / "patterns.json"))
+    return PatternSyncService(store=store, state_path=str(tmp_path / "state.json"), api_url=github.url + "/list",
+                              raw_url_base=github.url + "/raw", backoff=0.01, **kwargs)
+
+@pytest.mark.asyncio
+async def test_sync_is_bounded_retried_and_reports_progress(tmp_path, github):
+    github.failures = {"p03": 2}
+    service = make_service(tmp_path, github, concurrency=4, retries=3)
+    events = []
+    count = await service.sync_all(progress=events.append)
+
+    assert count == 20
+    assert github.max_in_flight <= 4
+    assert service.store.get("p03").endswith("run the current pattern")
+    assert "Pattern 3." in service.store.get("__explanations__")
+    assert [e["done"] for e in events if e["stage"] == "patterns"][-1] == 20
+    assert service.progress["stage"] == "done" and service.progress["retries"] == 2 and service.progress["fetched"] == 20
+
+@pytest.mark.asyncio
+async def test_second_sync_is_conditional_and_leaves_file_alone(tmp_path, github):
+    service = make_service(tmp_path, github)
+    await service.sync_all()
+    mtime = os.stat(service.store.path).st_mtime_ns
+    github.requests.clear()
+
+    assert await service.sync_all() == 20
+    assert all(etag for _, etag in github.requests) # every request was conditional
+    assert service.progress["not_modified"] == 20 and service.progress["changed"] is False
+    assert os.stat(service.store.path).st_mtime_ns == mtime
+
+    github.patterns["p05"] = "# IDENTITY and PURPOSE\n\nChanged.\n"
+    github.patterns["new"] = "brand new"
+    await service.sync_all()
+    assert service.progress["fetched"] == 2 and service.progress["changed"] is True
+    assert service.store.get("p05").startswith("# IDENTITY") and "new" in service.store.names()
+
+@pytest.mark.asyncio
+async def test_validators_not_trusted_when_file_differs(tmp_path, github):
+    service = make_service(tmp_path, github)
+    await service.sync_all()
+    # Someone restores an older patterns file; the saved ETags no longer describe it
+    (tmp_path / "patterns.json").write_text(json.dumps({"p00": "stale"}))
+    service.store.reload()
+    github.requests.clear()
+
+    await service.sync_all()
+    assert dict(github.pattern_requests())["/raw/p00/system.md"] is None
+    assert service.store.get("p00") != "stale" and len(service.store.names()) == 20
+
+@pytest.mark.asyncio
+async def test_failing_pattern_keeps_previous_body(tmp_path, github):
+    service = make_service(tmp_path, github, retries=1)
+    await service.sync_all()
+    github.patterns["p07"] = "updated upstream"
+    github.failures = {"p07": 5}
+
+    assert await service.sync_all() == 20
+    assert service.progress["kept"] == 1
+    assert "Pattern 7." in service.store.get("p07")
+
+@pytest.mark.asyncio
+async def test_sync_publishes_only_the_diff(tmp_path, github):
+    service = make_service(tmp_path, github)
+    await service.sync_all()
+    assert len(service.last_sync["added"]) == 20
+
+    github.patterns["p01"] = "rewritten"
+    github.patterns["extra"] = "added"
+    del github.patterns["p02"]
+    await service.sync_all()
+
+    last = service.last_sync
+    assert (last["added"], last["changed"], last["removed"], last["unchanged"]) == (["extra"], ["p01"], ["p02"], 18)
+    assert last["published"] and last["bytes_reused"] > last["bytes_encoded"] > 0
+    assert service.store.get("p01") == "rewritten" and "p02" not in service.store
+    assert "**p02**" not in service.store.get("__explanations__")
+
+    # Same content behind a new ETag is a 200, but no change
+    service.state_path = None
+    await service.sync_all()
+    assert service.progress["fetched"] == 20 and service.last_sync["published"] is False
+
+def test_last_sync_survives_restart(tmp_path):
+    state = tmp_path / "state.json"
+    state.write_text(json.dumps({"list": None, "patterns": {}, "last_sync": {"added": ["a"]}}))
+    service = PatternSyncService(store=PatternStore(str(tmp_path / "p.json")), state_path=str(state))
+    assert service.get_metrics()["last_sync"] == {"added": ["a"]}
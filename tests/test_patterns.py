@@ -0,0 +1,73 @@
+import json
+import os
+import pytest
+from app.core.patterns import PatternStore, scan_string_object
+
+def write_patterns(path, patterns, **kwargs):
+    tmp = str(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(patterns, f, **kwargs)
+    os.replace(tmp, path)
+
+def test_scan_matches_json_decoding():
+    data = {"quote\"d": "a \\\" b \\\\", "unicode": "Χίος ✓", "empty": "", "__explanations__": "1. **x**: y"}
+    for kwargs in ({}, {"indent": 4}, {"ensure_ascii": False}):
+        raw = json.dumps(data, **kwargs).encode("utf-8")
+        offsets = scan_string_object(raw)
+        assert {k: json.loads(raw[a:b]) for k, (a, b) in offsets.items()} == data
+    with pytest.raises(ValueError):
+        scan_string_object(b'{"a": 1}')
+
+def test_bodies_are_read_on_demand_and_cached(tmp_path):
+    path = tmp_path / "patterns.json"
+    write_patterns(path, {f"p{i}": f"body {i}" for i in range(5)}, indent=4)
+    store = PatternStore(str(path), cache_size=2)
+    assert store.get_metrics()["loads"] == 0 # nothing read before first use
+
+    assert store.names() == ["p0", "p1", "p2", "p3", "p4"]
+    assert store.get("p1") == "body 1" and store.get("p1") == "body 1"
+    assert store.get("missing") is None and "missing" not in store
+    store.get("p2")
+    store.get("p3")
+    metrics = store.get_metrics()
+    assert metrics["cached"] == 2 and metrics["cache_hits"] == 1 and metrics["decodes"] == 3
+
+def test_reload_swaps_index_and_old_reads_stay_consistent(tmp_path):
+    path = tmp_path / "patterns.json"
+    write_patterns(path, {"a": "old a", "__explanations__": "1. **a**: first"})
+    store = PatternStore(str(path))
+    old_index = store._current()
+    assert store.descriptions() == [{"name": "a", "description": "first"}]
+
+    write_patterns(path, {"a": "new a", "b": "new b", "__explanations__": "1. **a**: first\n2. **b**: second"})
+    assert store.get("a") == "old a" # not reloaded yet
+    store.reload()
+    assert store.get("a") == "new a" and store.names() == ["a", "b"]
+    assert [d["name"] for d in store.descriptions()] == ["a", "b"]
+    assert old_index.read("a") == "old a" # a reader still holding the old index sees the old file
+
+def test_non_string_values_fall_back_to_full_load(tmp_path):
+    path = tmp_path / "patterns.json"
+    write_patterns(path, {"a": "text", "meta": {"nested": True}})
+    store = PatternStore(str(path))
+    assert store.names() == ["a"] and store.get("a") == "text"
+
+def test_missing_file_is_empty(tmp_path):
+    store = PatternStore(str(tmp_path / "none.json"))
+    assert store.names() == [] and store.descriptions() == [] and len(store) == 0
+
+def test_publish_reuses_stored_literals(tmp_path):
+    path = tmp_path / "patterns.json"
+    original = {"a": "alpha ✓", "b": "beta", "__explanations__": "1. **a**: x"}
+    write_patterns(path, original, indent=4)
+    store = PatternStore(str(path))
+    literals = sum(len(json.dumps(v)) for v in original.values())
+    assert store.publish(dict.fromkeys(original)) == {"bytes_encoded": 0, "bytes_reused": literals}
+    assert path.read_text() == json.dumps(original, indent=4) # same bytes as json.dump
+
+    old_index = store._current()
+    stats = store.publish({"b": None, "c": "gamma", "__explanations__": "2"})
+    assert json.loads(path.read_text()) == {"b": "beta", "c": "gamma", "__explanations__": "2"}
+    assert stats["bytes_encoded"] == len('"gamma"') + len('"2"') and stats["bytes_reused"] == len('"beta"')
+    assert store.names() == ["b", "c"] and store.generation == 2
+    assert old_index.read("a") == "alpha ✓"
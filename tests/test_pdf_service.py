@@ -29,7 +29,7 @@ async def test_compress_pdf_success(tmp_path):
     fake_uuid.hex = "fake_uuid"
     
     with patch("shutil.which", return_value="gs"), \
-         patch("subprocess.run") as mock_run, \
+         patch("subprocess.Popen") as mock_run, \
          patch("os.path.getsize") as mock_size, \
          patch("uuid.uuid4", return_value=fake_uuid):
         
@@ -38,6 +38,7 @@ async def test_compress_pdf_success(tmp_path):
         # Mock subprocess result
         mock_result = MagicMock()
         mock_result.returncode = 0
+        mock_result.communicate.return_value = (b"", b"")
         mock_run.return_value = mock_result
         
         # Determine the temp output path that the service will expect
@@ -81,7 +82,7 @@ async def test_compress_pdf_larger_result(tmp_path):
     fake_uuid.hex = "fake_uuid"
     
     with patch("shutil.which", return_value="gs"), \
-         patch("subprocess.run") as mock_run, \
+         patch("subprocess.Popen") as mock_run, \
          patch("os.path.getsize") as mock_size, \
          patch("uuid.uuid4", return_value=fake_uuid):
         
@@ -89,6 +90,7 @@ async def test_compress_pdf_larger_result(tmp_path):
         
         mock_result = MagicMock()
         mock_result.returncode = 0
+        mock_result.communicate.return_value = (b"", b"")
         mock_run.return_value = mock_result
         
         temp_out = tmp_path / "gs_out_fake_uuid.pdf"
@@ -119,15 +121,43 @@ async def test_compress_pdf_gs_error(tmp_path):
     fake_uuid.hex = "fake_uuid"
     
     with patch("shutil.which", return_value="gs"), \
-         patch("subprocess.run") as mock_run, \
+         patch("subprocess.Popen") as mock_run, \
          patch("uuid.uuid4", return_value=fake_uuid):
         
         pdf_service = PDFService()
         
         mock_result = MagicMock()
         mock_result.returncode = 1
-        mock_result.stderr = b"error message"
+        mock_result.communicate.return_value = (b"", b"error message")
         mock_run.return_value = mock_result
         
         result_path = await pdf_service.compress_pdf(str(input_file), str(output_file))
-        assert result_path == str(input_file)
\ No newline at end of file
+        assert result_path == str(input_file)
+
+
+@pytest.mark.asyncio
+async def test_compress_pdf_passes_input_without_copying(tmp_path):
+    input_file = tmp_path / "report.pdf"
+    input_file.write_bytes(b"original content")
+    odd_file = tmp_path / "-report.pdf"
+    odd_file.write_bytes(b"original content")
+
+    seen = []
+    def fake_popen(cmd, **kwargs):
+        gs_input = cmd[-1]
+        seen.append((gs_input, os.path.samefile(gs_input, odd_file) if "gs_in_" in gs_input else None))
+        proc = MagicMock()
+        proc.returncode = 1
+        proc.communicate.return_value = (b"", b"")
+        return proc
+
+    with patch("shutil.which", return_value="gs"), patch("subprocess.Popen", side_effect=fake_popen):
+        pdf_service = PDFService()
+        await pdf_service.compress_pdf(str(input_file), str(tmp_path / "out.pdf"))
+        await pdf_service.compress_pdf(str(odd_file), str(tmp_path / "out.pdf"))
+
+    if os.name != "nt":
+        assert seen[0] == (str(input_file), None)
+    # A name Ghostscript would take for an option gets an alias of the same file
+    assert "gs_in_" in seen[1][0] and seen[1][1] is True
+    assert sorted(os.listdir(tmp_path)) == ["-report.pdf", "report.pdf"]
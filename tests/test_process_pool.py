@@ -0,0 +1,158 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.process_pool import CLIProcessPool
+from app.services.llm_service import GeminiAgent
+
+class FakeProc:
+    def __init__(self, args):
+        self.args = args
+        self.returncode = None
+        self.terminated = False
+
+    def terminate(self):
+        self.terminated = True
+        self.returncode = -15
+
+def make_pool(**kwargs):
+    spawned = []
+    async def spawn(args):
+        proc = FakeProc(args)
+        spawned.append(proc)
+        return proc
+    return CLIProcessPool(spawn, **kwargs), spawned
+
+async def settle(pool):
+    while pool._refills:
+        await asyncio.gather(*pool._refills.values(), return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_disabled_pool_always_cold():
+    pool, spawned = make_pool(size=0)
+    proc, warm = await pool.acquire(["gemini", "a"])
+    assert warm is False
+    pool.replenish(["gemini", "a"])
+    assert pool.idle_count() == 0
+    assert len(spawned) == 1
+
+@pytest.mark.asyncio
+async def test_replenish_then_warm_hit():
+    pool, spawned = make_pool(size=1)
+    args = ["gemini", "--model", "m"]
+    pool.replenish(args)
+    await settle(pool)
+    assert pool.idle_count() == 1
+
+    proc, warm = await pool.acquire(args)
+    assert warm is True
+    assert proc is spawned[0]
+    assert pool.counters["hits"] == 1
+
+    # Different key misses and cold-starts
+    _, warm = await pool.acquire(["gemini", "--model", "other"])
+    assert warm is False
+    assert pool.counters["misses"] == 1
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_reuse_false_bypasses_pool():
+    pool, spawned = make_pool(size=1)
+    args = ["gemini"]
+    pool.replenish(args)
+    await settle(pool)
+    _, warm = await pool.acquire(args, reuse=False)
+    assert warm is False
+    assert pool.idle_count() == 1
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_unhealthy_workers_are_discarded():
+    pool, spawned = make_pool(size=1, idle_ttl=60)
+    args = ["gemini"]
+    pool.replenish(args)
+    await settle(pool)
+    spawned[0].returncode = 1 # exited while idle
+
+    proc, warm = await pool.acquire(args)
+    assert warm is False
+    assert pool.counters["discarded"] == 1
+
+@pytest.mark.asyncio
+async def test_idle_ttl_expiry():
+    pool, spawned = make_pool(size=1, idle_ttl=0)
+    pool.replenish(["gemini"])
+    await settle(pool)
+    pool.prune()
+    assert pool.idle_count() == 0
+    assert spawned[0].terminated
+
+@pytest.mark.asyncio
+async def test_max_idle_evicts_oldest_key():
+    pool, spawned = make_pool(size=1, max_idle=1)
+    pool.replenish(["gemini", "a"])
+    await settle(pool)
+    pool.replenish(["gemini", "b"])
+    await settle(pool)
+    assert pool.idle_count() == 1
+    assert spawned[0].terminated
+    _, warm = await pool.acquire(["gemini", "b"])
+    assert warm is True
+
+@pytest.mark.asyncio
+async def test_discard_matching_session():
+    pool, spawned = make_pool(size=1)
+    pool.replenish(["gemini", "--resume", "abc"])
+    await settle(pool)
+    pool.discard_matching("abc")
+    assert pool.idle_count() == 0
+    assert spawned[0].terminated
+
+def test_ttfb_metrics():
+    pool, _ = make_pool(size=1)
+    for v in (0.1, 0.2, 0.3):
+        pool.record_ttfb(v, warm=False)
+    pool.record_ttfb(0.05, warm=True)
+    metrics = pool.get_metrics()
+    assert metrics["ttfb"]["cold"]["count"] == 3
+    assert metrics["ttfb"]["cold"]["avg_ms"] == pytest.approx(200.0)
+    assert metrics["ttfb"]["warm"]["p50_ms"] == pytest.approx(50.0)
+
+@pytest.mark.asyncio
+async def test_agent_records_ttfb_and_replenishes(tmp_path):
+    agent = GeminiAgent(working_dir=str(tmp_path))
+    agent.process_pool.size = 1
+    agent._create_subprocess = AsyncMock()
+
+    def new_proc():
+        mock_proc = AsyncMock()
+        mock_proc.returncode = None
+        async def wait():
+            mock_proc.returncode = 0
+            return 0
+        mock_proc.wait = wait
+        mock_proc.stdin = MagicMock()
+        mock_proc.stdin.drain = AsyncMock()
+        mock_proc.stderr = AsyncMock()
+        mock_proc.stderr.readline = AsyncMock(return_value=b"")
+        queue = asyncio.Queue()
+        queue.put_nowait(json.dumps({"type": "message", "role": "assistant", "content": "hi"}).encode())
+        queue.put_nowait(b"")
+        mock_proc.stdout = AsyncMock()
+        mock_proc.stdout.readline = queue.get
+        mock_proc.stdout.at_eof = MagicMock(return_value=False)
+        return mock_proc
+    agent._create_subprocess.side_effect = lambda *a, **k: new_proc()
+
+    async for _ in agent.generate_response_stream("u1", "Hello", resume_session="abc"):
+        pass
+    await settle(agent.process_pool)
+
+    metrics = agent.process_pool.get_metrics()
+    assert metrics["ttfb"]["cold"]["count"] == 1
+    assert metrics["idle"] == 1
+
+    async for _ in agent.generate_response_stream("u1", "Again", resume_session="abc"):
+        pass
+    assert agent.process_pool.get_metrics()["ttfb"]["warm"]["count"] == 1
+    await agent.process_pool.close()
@@ -0,0 +1,90 @@
+import json
+import os
+import pytest
+from unittest.mock import AsyncMock
+from app.services.llm_service import GeminiAgent
+from app.services.search_index import SearchIndex, build_match_query, make_snippet
+from app.services.session_index import SessionIndex
+
+UUID_A = "aaaaaaaa-1111-2222-3333-444444444444"
+UUID_B = "bbbbbbbb-1111-2222-3333-444444444444"
+UUID_C = "cccccccc-1111-2222-3333-444444444444"
+
+def write_chat(base, session_id, contents, project="p1"):
+    chats = base / project / "chats"
+    chats.mkdir(parents=True, exist_ok=True)
+    messages = [{"type": "user" if i % 2 == 0 else "gemini", "content": c} for i, c in enumerate(contents)]
+    path = chats / f"session-2026-01-01T10-00-{session_id[:8]}.json"
+    path.write_text(json.dumps({"sessionId": session_id, "startTime": "2026-01-01T10:00:00Z", "messages": messages}))
+    return str(path)
+
+def test_query_and_highlight_helpers():
+    assert build_match_query('deploy "prod"-server!') == '"deploy"* "prod"* "server"*'
+    assert build_match_query("  ?! ") is None
+    snippet, highlights = make_snippet("We  deploy\nto Prödserver today", ["deploy", "prod"])
+    assert snippet == "We deploy to Prödserver today"
+    assert [snippet[a:b] for a, b in highlights] == ["deploy", "Prödserver"]
+    long_text = " ".join(f"w{i}" for i in range(100)) + " target " + " ".join(f"x{i}" for i in range(100))
+    snippet, highlights = make_snippet(long_text, ["target"], width=40)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert [snippet[a:b] for a, b in highlights] == ["target"]
+
+def test_ranked_prefix_search_with_snippets(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.db"))
+    a = write_chat(tmp_path, UUID_A, ["How do I deploy?", "Run the deployment script"], "p1")
+    b = write_chat(tmp_path, UUID_B, ["deploy deploy deploy now", "ok"], "p2")
+    c = write_chat(tmp_path, UUID_C, ["unrelated", [{"text": "Ünïcode deployment"}]], "p3")
+    assert index.sync({UUID_A: a, UUID_B: b, UUID_C: c}) == 3
+
+    hits = index.search("depl", [UUID_A, UUID_B, UUID_C])
+    assert [h["uuid"] for h in hits][0] == UUID_B # most occurrences ranks first
+    assert {h["uuid"] for h in hits} == {UUID_A, UUID_B, UUID_C}
+    hit_c = next(h for h in hits if h["uuid"] == UUID_C)
+    assert hit_c["raw_index"] == 1
+    start, end = hit_c["highlights"][0]
+    assert hit_c["snippet"][start:end] == "deployment"
+
+    # Snippets are only built for the first results
+    assert ["snippet" in h for h in index.search("depl", [UUID_A, UUID_B, UUID_C], snippets=1)] == [True, False, False]
+
+    # Only the requested sessions, and all terms must match
+    assert [h["uuid"] for h in index.search("deploy script", [UUID_A, UUID_B])] == [UUID_A]
+    assert index.search("unicode", [UUID_A, UUID_B]) == []
+    assert index.search("unicode", [UUID_C])[0]["uuid"] == UUID_C # diacritics folded
+
+def test_incremental_updates(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.db"))
+    a = write_chat(tmp_path, UUID_A, ["alpha"])
+    index.sync({UUID_A: a})
+    assert index.sync({UUID_A: a}) == 0 # unchanged files are not read again
+
+    write_chat(tmp_path, UUID_A, ["alpha", "beta"])
+    os.utime(a, ns=(1, 10**18))
+    assert index.sync({UUID_A: a}) == 1
+    assert index.search("beta", [UUID_A])[0]["raw_index"] == 1
+
+    index.remove(UUID_A)
+    assert index.search("alpha", [UUID_A]) == []
+    assert index.get_metrics()["documents"] == 0
+
+@pytest.mark.asyncio
+async def test_agent_search_sessions(tmp_path):
+    base = tmp_path / "gemini_tmp"
+    write_chat(base, UUID_A, ["Tell me about kubernetes", "Kubernetes is an orchestrator"], "p1")
+    write_chat(base, UUID_B, ["Recipe for bread", "Flour and water"], "p2")
+    agent = GeminiAgent(working_dir=str(tmp_path))
+    agent.session_index = SessionIndex(base_dir=str(base))
+    agent._create_subprocess = AsyncMock()
+    agent.user_data["u1"] = {"sessions": [UUID_A, UUID_B], "session_metadata": {
+        UUID_A: {"original_title": "Cluster questions", "time": "now"},
+        UUID_B: {"original_title": "Kube-free baking", "time": "now"}
+    }}
+
+    results = await agent.search_sessions("u1", "kube")
+    # The title match comes first, then content matches with their snippet
+    assert [s["uuid"] for s in results] == [UUID_B, UUID_A]
+    assert results[1]["match"]["raw_index"] == 0
+    assert "kubernetes" in results[1]["match"]["snippet"]
+    assert [s["uuid"] for s in await agent.search_sessions("u1", "flour")] == [UUID_B]
+    assert await agent.search_sessions("u1", "nothing") == []
+    await agent.search_index.aclose()
@@ -0,0 +1,160 @@
+import json
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+from app.services.llm_service import GeminiAgent
+from app.services.session_index import SessionIndex, read_chat_header, describe_session, format_relative_time
+
+UUID_A = "aaaaaaaa-1111-2222-3333-444444444444"
+UUID_B = "bbbbbbbb-1111-2222-3333-444444444444"
+
+def write_chat(base, project, session_id, first_message, extra=None, minutes_ago=5):
+    chats = base / project / "chats"
+    chats.mkdir(parents=True, exist_ok=True)
+    updated = (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat()
+    data = {
+        "sessionId": session_id,
+        "projectHash": project,
+        "startTime": updated,
+        "lastUpdated": updated,
+        "messages": [
+            {"id": "1", "type": "info", "content": "boot"},
+            {"id": "2", "type": "user", "content": first_message},
+            {"id": "3", "type": "gemini", "content": "reply " * 1000}
+        ]
+    }
+    data.update(extra or {})
+    path = chats / f"session-2026-01-01T10-00-{session_id[:8]}.json"
+    path.write_text(json.dumps(data, indent=2))
+    return path
+
+def test_header_reads_large_first_message_and_summary(tmp_path):
+    long_message = "Explain   this\n" + "x" * 50000
+    path = write_chat(tmp_path, "p1", UUID_A, long_message, extra={"summary": "Short summary"})
+    header = read_chat_header(str(path))
+    assert header["sessionId"] == UUID_A
+    assert header["firstUserMessage"] == long_message
+    assert header["summary"] == "Short summary"
+    assert describe_session(header)["original_title"] == "Short summary"
+
+    path = write_chat(tmp_path, "p2", UUID_B, [{"text": "Parts   message"}])
+    meta = describe_session(read_chat_header(str(path)))
+    assert meta == {"original_title": "Parts message", "time": "5 minutes ago"}
+
+def test_relative_time_wording():
+    now = datetime(2026, 1, 10, tzinfo=timezone.utc)
+    assert format_relative_time("2026-01-08T00:00:00Z", now) == "2 days ago"
+    assert format_relative_time("2026-01-09T23:00:00+00:00", now) == "1 hour ago"
+    assert format_relative_time("2026-01-09T23:59:30Z", now) == "Just now"
+    assert format_relative_time(None, now) == "Unknown"
+
+def test_lookup_and_mtime_cache(tmp_path):
+    write_chat(tmp_path, "p1", UUID_A, "Hello A")
+    write_chat(tmp_path, "p2", UUID_B, "Hello B")
+    index = SessionIndex(base_dir=str(tmp_path))
+    found = index.lookup([UUID_A, "cccccccc-0000-0000-0000-000000000000"])
+    assert set(found) == {UUID_A}
+    assert found[UUID_A]["firstUserMessage"] == "Hello A"
+    reads = index.counters["header_reads"]
+    index.lookup([UUID_A])
+    assert index.counters["header_reads"] == reads
+
+    path = write_chat(tmp_path, "p1", UUID_A, "Changed")
+    os.utime(path, ns=(1, 10**18))
+    assert index.lookup([UUID_A])[UUID_A]["firstUserMessage"] == "Changed"
+
+@pytest.mark.asyncio
+async def test_get_user_sessions_skips_cli_when_files_exist(tmp_path):
+    base = tmp_path / "gemini_tmp"
+    write_chat(base, "p1", UUID_A, "First chat")
+    agent = GeminiAgent(working_dir=str(tmp_path))
+    agent.session_index = SessionIndex(base_dir=str(base))
+    agent._create_subprocess = AsyncMock()
+    agent.user_data["u1"] = {"sessions": [UUID_A], "session_metadata": {}}
+
+    result = await agent.get_user_sessions("u1")
+    assert result["history"][0]["title"] == "First chat"
+    assert result["history"][0]["time"] == "5 minutes ago"
+    assert not agent._create_subprocess.called
+    assert agent.user_data["u1"]["session_metadata"][UUID_A]["original_title"] == "First chat"
+
+@pytest.mark.asyncio
+async def test_get_user_sessions_falls_back_to_cli(tmp_path):
+    agent = GeminiAgent(working_dir=str(tmp_path))
+    agent.session_index = SessionIndex(base_dir=str(tmp_path / "missing"))
+    proc = AsyncMock()
+    proc.communicate.return_value = (f"1. From CLI (2 days ago) [{UUID_B}]\n".encode(), b"")
+    agent._create_subprocess = AsyncMock(return_value=proc)
+    agent.user_data["u1"] = {"sessions": [UUID_B], "session_metadata": {}}
+
+    result = await agent.get_user_sessions("u1")
+    assert result["history"][0]["title"] == "From CLI"
+    assert agent._create_subprocess.called
+
+def test_resolve_tracks_new_and_removed_files(tmp_path):
+    index = SessionIndex(base_dir=str(tmp_path), poll_interval=3600)
+    first = write_chat(tmp_path, "p1", UUID_A, "Hello A")
+    assert index.resolve(UUID_A) == str(first)
+    scans = index.counters["dir_scans"]
+
+    # Cached: no directory is listed again within the poll interval
+    assert index.resolve(UUID_A) == str(first)
+    assert index.counters["dir_scans"] == scans
+
+    # A file created after the last poll is found through the forced refresh on a miss
+    second = write_chat(tmp_path, "p2", UUID_B, "Hello B")
+    assert index.resolve(UUID_B) == str(second)
+
+    # A deleted file is dropped from the index
+    os.remove(first)
+    assert index.resolve(UUID_A) is None
+    assert index.get_metrics()["files"] == 1
+
+def test_resolve_prefers_newest_file_and_full_uuid_names(tmp_path):
+    chats = tmp_path / "p1" / "chats"
+    chats.mkdir(parents=True)
+    old = chats / f"session-2026-01-01T10-00-{UUID_A[:8]}.json"
+    new = chats / f"session-2026-01-02T10-00-{UUID_A[:8]}.json"
+    for path in (old, new):
+        path.write_text(json.dumps({"sessionId": UUID_A, "messages": []}))
+    os.utime(old, ns=(1, 10**18))
+    os.utime(new, ns=(1, 2 * 10**18))
+    # Headerless file named after the full UUID (as other tools write them)
+    bare = chats / f"chat_{UUID_B}.json"
+    bare.write_text(json.dumps({"messages": []}))
+
+    index = SessionIndex(base_dir=str(tmp_path))
+    assert index.resolve(UUID_A) == str(new)
+    assert index.resolve(UUID_B) == str(bare)
+
+def test_concurrent_resolves_and_rescans(tmp_path):
+    import threading
+    index = SessionIndex(base_dir=str(tmp_path), poll_interval=0)
+    uuids = [f"{i:08x}-1111-2222-3333-444444444444" for i in range(40)]
+    for u in uuids[:20]:
+        write_chat(tmp_path, "p1", u, "hi")
+    errors, stop = [], threading.Event()
+
+    def churn():
+        # Files come and go while other threads resolve, so scans and drops overlap with reads
+        for u in uuids[20:]:
+            write_chat(tmp_path, "p1", u, "hi")
+        for u in uuids[20:]:
+            os.remove(tmp_path / "p1" / "chats" / f"session-2026-01-01T10-00-{u[:8]}.json")
+        stop.set()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                index.resolve_many(uuids)
+                index.latest_session()
+                index.refresh(force=True)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)] + [threading.Thread(target=churn)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert errors == []
+    assert set(index.resolve_many(uuids)) == set(uuids[:20])
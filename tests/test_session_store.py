@@ -0,0 +1,103 @@
+import json
+import sqlite3
+import pytest
+from app.core import config
+from app.services.llm_service import GeminiAgent
+from app.services.session_store import SQLiteSessionStore, JSONSessionStore, LazyUserData
+
+def sample_user(n=3):
+    uuids = [f"uuid-{i}" for i in range(n)]
+    return {
+        "active_session": uuids[0],
+        "sessions": uuids,
+        "pinned_sessions": [uuids[-1]],
+        "session_tools": {uuids[0]: ["read_file"]},
+        "session_tags": {uuids[1]: ["work"]},
+        "session_metadata": {uuids[0]: {"original_title": "Hello", "time": "now"}},
+        "custom_titles": {uuids[2]: "Renamed"},
+        "session_forks": {uuids[2]: {"parent": uuids[0], "fork_point": 3}},
+        "pending_tools": [],
+        "settings": {"show_mic": False, "interactive_mode": True, "copy_formatted": False, "default_model": "m"}
+    }
+
+def test_sqlite_round_trip(tmp_path):
+    db = str(tmp_path / "s.db")
+    store = SQLiteSessionStore(db)
+    data = store.load()
+    data["alice"] = sample_user()
+    store.save(data, "alice")
+
+    reopened = SQLiteSessionStore(db).load()
+    assert isinstance(reopened, LazyUserData)
+    assert "alice" in reopened
+    assert dict.__len__(reopened) == 0 # not loaded until touched
+    assert reopened["alice"] == sample_user()
+
+def test_only_changed_rows_are_written(tmp_path):
+    db = str(tmp_path / "s.db")
+    store = SQLiteSessionStore(db)
+    data = store.load()
+    data["alice"] = sample_user(200)
+    store.save(data, "alice")
+
+    before = store._conn.total_changes
+    data["alice"]["session_tags"]["uuid-150"] = ["new"]
+    store.save(data, "alice")
+    assert store._conn.total_changes - before == 1
+
+    data["alice"]["sessions"].remove("uuid-199")
+    store.save(data, "alice")
+    reopened = SQLiteSessionStore(db).load()
+    assert "uuid-199" not in reopened["alice"]["sessions"]
+    assert reopened["alice"]["session_tags"]["uuid-150"] == ["new"]
+
+def test_migrates_both_json_formats(tmp_path):
+    legacy = tmp_path / "legacy.json"
+    legacy.write_text(json.dumps({"bob": "uuid-b"}))
+    store = SQLiteSessionStore(str(tmp_path / "a.db"), legacy_json=str(legacy))
+    data = store.load()
+    assert data["bob"]["sessions"] == ["uuid-b"]
+    assert data["bob"]["active_session"] == "uuid-b"
+
+    current = tmp_path / "user_sessions.json"
+    current.write_text(json.dumps({"alice": sample_user()}))
+    store = SQLiteSessionStore(str(tmp_path / "b.db"), legacy_json=str(current))
+    assert store.load()["alice"] == sample_user()
+
+def test_other_owners_sees_unloaded_users(tmp_path):
+    db = str(tmp_path / "s.db")
+    store = SQLiteSessionStore(db)
+    data = store.load()
+    data["alice"] = sample_user()
+    data["bob"] = {"sessions": ["uuid-1"]}
+    store.save(data)
+
+    store = SQLiteSessionStore(db)
+    data = store.load()
+    data["alice"] # only alice is loaded
+    assert store.other_owners(data, "alice", "uuid-1") == {"bob"}
+    assert store.other_owners(data, "alice", "uuid-0") == set()
+
+def test_json_store_keeps_file_format(tmp_path):
+    path = tmp_path / "user_sessions.json"
+    store = JSONSessionStore(str(path))
+    data = store.load()
+    data["alice"] = sample_user()
+    store.save(data, "alice")
+    assert json.loads(path.read_text())["alice"]["custom_titles"] == {"uuid-2": "Renamed"}
+
+@pytest.mark.asyncio
+async def test_agent_with_sqlite_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SESSION_STORE", "sqlite")
+    agent = GeminiAgent(working_dir=str(tmp_path))
+    agent.update_user_settings("u1", {"default_model": "m"})
+    agent.user_data["u1"]["sessions"].append("abc")
+    agent.toggle_pin("u1", "abc")
+    await agent.session_store.aclose()
+
+    conn = sqlite3.connect(str(tmp_path / "user_sessions.db"))
+    assert conn.execute("SELECT pin_position FROM sessions WHERE user_id = 'u1' AND session_uuid = 'abc'").fetchone() == (0,)
+    agent2 = GeminiAgent(working_dir=str(tmp_path))
+    assert agent2.get_user_settings("u1")["default_model"] == "m"
+    assert agent2.user_data["u1"]["pinned_sessions"] == ["abc"]
+    await agent2.session_store.aclose()
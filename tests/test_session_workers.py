@@ -0,0 +1,124 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.llm_service import GeminiAgent
+from app.services.session_workers import SessionWorkerPool
+
+SESSION = "12345678-1234-1234-1234-123456789012"
+
+class FakeWorkerProc:
+    """A CLI process that answers every stdin line with one stream-json turn and never exits on its own."""
+    def __init__(self, session_id=SESSION):
+        self.session_id = session_id
+        self.returncode = None
+        self.pid = None
+        self.prompts = []
+        self.stdout_queue = asyncio.Queue()
+        self.stderr_queue = asyncio.Queue()
+        self.stdin = MagicMock()
+        self.stdin.write = self._on_write
+        self.stdin.drain = AsyncMock()
+        self.stdout = MagicMock()
+        self.stdout.readline = self.stdout_queue.get
+        self.stderr = MagicMock()
+        self.stderr.readline = self.stderr_queue.get
+
+    def _on_write(self, data):
+        self.prompts.append(json.loads(data.decode()))
+        if len(self.prompts) == 1:
+            self.stdout_queue.put_nowait(json.dumps({"type": "init", "session_id": self.session_id}).encode())
+        self.stdout_queue.put_nowait(json.dumps({"type": "message", "role": "assistant", "content": f"reply {len(self.prompts)}"}).encode())
+        self.stdout_queue.put_nowait(json.dumps({"type": "result", "status": "success"}).encode())
+
+    def terminate(self):
+        self.returncode = -15
+        self.stdout_queue.put_nowait(b"")
+        self.stderr_queue.put_nowait(b"")
+
+    async def wait(self):
+        return self.returncode
+
+@pytest.fixture
+def sticky_agent(tmp_path):
+    agent = GeminiAgent(working_dir=str(tmp_path))
+    agent.session_workers.enabled = True
+    agent.session_workers.extra_args = ["--input-format", "stream-json"]
+    procs = []
+    async def spawn(*args, **kwargs):
+        proc = FakeWorkerProc()
+        procs.append((args[0], proc))
+        return proc
+    agent._create_subprocess = AsyncMock(side_effect=spawn)
+    return agent, procs
+
+async def collect(agent, prompt):
+    return [chunk async for chunk in agent.generate_response_stream("u1", prompt)]
+
+@pytest.mark.asyncio
+async def test_worker_is_reused_across_turns(sticky_agent):
+    agent, procs = sticky_agent
+    events = await collect(agent, "first")
+    assert any(e.get("content") == "reply 1" for e in events)
+    assert agent.user_data["u1"]["active_session"] == SESSION
+
+    events = await collect(agent, "second")
+    assert any(e.get("content") == "reply 2" for e in events)
+    assert not any(e.get("type") == "error" for e in events)
+
+    # One process served both turns and was never told to resume
+    assert len(procs) == 1
+    args, proc = procs[0]
+    assert "--resume" not in args
+    assert "--input-format" in args
+    assert proc.returncode is None
+    assert proc.prompts[0]["content"].endswith("first")
+    assert proc.prompts[1]["content"].endswith("second")
+    assert agent.session_workers.get_metrics()["reused"] == 1
+    await agent.session_workers.close()
+
+@pytest.mark.asyncio
+async def test_model_change_restarts_worker_with_resume(sticky_agent):
+    agent, procs = sticky_agent
+    await collect(agent, "first")
+    async for _ in agent.generate_response_stream("u1", "second", model="other-model"):
+        pass
+    assert len(procs) == 2
+    assert procs[0][1].returncode is not None
+    assert "--resume" in procs[1][0]
+    await agent.session_workers.close()
+
+@pytest.mark.asyncio
+async def test_stop_chat_kills_sticky_worker(sticky_agent):
+    agent, procs = sticky_agent
+    await collect(agent, "first")
+    proc = procs[0][1]
+    # Make the next turn hang so it can be cancelled
+    proc._on_write = lambda data: None
+    proc.stdin.write = proc._on_write
+
+    async def run():
+        async for _ in agent.generate_response_stream("u1", "slow"):
+            pass
+    agent.active_tasks["u1"] = asyncio.create_task(run())
+    await asyncio.sleep(0.01)
+    assert await agent.stop_chat("u1") is True
+    assert proc.returncode is not None
+    assert agent.session_workers.get_metrics()["workers"] == 0
+
+@pytest.mark.asyncio
+async def test_lru_eviction_under_memory_budget():
+    async def spawn(args):
+        return FakeWorkerProc()
+    pool = SessionWorkerPool(spawn, enabled=True, memory_budget_mb=250, worker_estimate_mb=100)
+    workers = []
+    for sid in ("a", "b", "c"):
+        w = await pool.start(["gemini"], ("gemini",))
+        w.begin_turn()
+        pool.release(w, sid)
+        workers.append(w)
+    assert pool.get("a", ("gemini",)) is None
+    assert workers[0].proc.returncode is not None
+    assert pool.get("c", ("gemini",)) is workers[2]
+    assert pool.get_metrics()["evicted"] == 1
+    await pool.close()
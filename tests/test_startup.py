@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+from app.core.registry import ServiceRegistry
+from app.services.conversion_service import FileConversionService
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def test_heavy_dependencies_are_not_imported_at_startup():
+    heavy = ["eth_account", "webauthn", "pypandoc", "openpyxl", "httpx", "pandas"]
+    code = f"import json, sys, app.main; print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+def test_registry_builds_services_once_on_first_access():
+    state = ServiceRegistry()
+    factory = MagicMock(return_value="service")
+    state.register("svc", factory)
+    state.plain = 1
+
+    assert not state.loaded("svc") and factory.call_count == 0
+    assert state.svc == "service" and state.svc == "service"
+    assert factory.call_count == 1 and state.loaded("svc")
+    assert state.plain == 1
+    assert state.get_metrics()["svc"]["loaded"] is True
+    with pytest.raises(AttributeError):
+        state.missing
+
+def test_registry_assignment_overrides_factory():
+    state = ServiceRegistry()
+    factory = MagicMock()
+    state.register("svc", factory)
+    state.svc = "mock"
+    assert state.svc == "mock"
+    factory.assert_not_called()
+
+def test_pandoc_probe_is_lazy_and_cached(tmp_path):
+    exe = tmp_path / "pandoc"
+    exe.write_text("")
+    cache = tmp_path / "probe.json"
+    fake_pypandoc = MagicMock()
+    fake_pypandoc.get_pandoc_version.return_value = "3.1"
+    with patch("shutil.which", return_value=str(exe)), patch.dict(sys.modules, {"pypandoc": fake_pypandoc}):
+        service = FileConversionService(probe_cache_path=str(cache))
+        fake_pypandoc.get_pandoc_version.assert_not_called()
+        assert service.pandoc_available is True
+        assert FileConversionService(probe_cache_path=str(cache)).pandoc_available is True
+        assert fake_pypandoc.get_pandoc_version.call_count == 1 # second instance used the cache
+
+        exe.write_text("upgraded") # a different binary invalidates the cached result
+        assert FileConversionService(probe_cache_path=str(cache)).pandoc_available is True
+        assert fake_pypandoc.get_pandoc_version.call_count == 2
@@ -0,0 +1,51 @@
+import json
+from app.services.stream_parser import QuestionStreamParser
+
+QUESTION = {"type": "question", "question": "Pick {one}?", "options": ["a \"b\"", "c}"], "allow_multiple": False}
+
+def run(chunks):
+    parser = QuestionStreamParser()
+    text, questions = "", []
+    for chunk in chunks:
+        t, q = parser.feed(chunk)
+        text += t
+        questions += q
+    return text + parser.flush(), questions
+
+def char_chunks(s):
+    return list(s)
+
+def test_braces_and_escapes_inside_strings():
+    text, questions = run(["Before ", json.dumps(QUESTION), " after"])
+    assert questions == [QUESTION]
+    assert text == "Before  after"
+
+def test_char_by_char_matches_whole_feed():
+    message = "Intro `code` and {\"a\": 1}\n```json\n" + json.dumps(QUESTION) + "\n```\nOutro"
+    assert run([message]) == run(char_chunks(message))
+    text, questions = run(char_chunks(message))
+    assert questions == [QUESTION]
+    assert text == "Intro `code` and {\"a\": 1}\n\nOutro"
+
+def test_plain_code_blocks_pass_through():
+    message = "```python\ndef f():\n    return {'type': 'question'}\n```\nand ```json\n{\"k\": [1, 2]}\n```"
+    text, questions = run(char_chunks(message))
+    assert questions == []
+    assert text == message
+
+def test_non_question_json_is_released_early():
+    parser = QuestionStreamParser()
+    text, _ = parser.feed('Data: {"name": "x", "very long value that keeps streaming')
+    assert text.startswith('Data: {"name"')
+    assert not parser.is_buffering
+
+def test_unterminated_card_is_flushed():
+    text, questions = run(["Start ", '{"type": "question", "question": "never closed'])
+    assert questions == []
+    assert text == 'Start {"type": "question", "question": "never closed'
+
+def test_multiple_cards():
+    q2 = dict(QUESTION, question="Second?")
+    text, questions = run(["A ", json.dumps(QUESTION), " B ", json.dumps(q2), " C"])
+    assert [q["question"] for q in questions] == ["Pick {one}?", "Second?"]
+    assert text == "A  B  C"
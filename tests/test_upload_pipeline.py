@@ -0,0 +1,94 @@
+import asyncio
+import io
+import json
+import os
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock
+from fastapi.testclient import TestClient
+from starlette.datastructures import UploadFile
+from app.main import app
+from app.routers.chat import get_user
+from app.services.upload_pipeline import UploadIngestor, safe_upload_name
+
+def make_upload(name, data):
+    return UploadFile(io.BytesIO(data), filename=name, size=len(data))
+
+def test_safe_upload_name():
+    assert safe_upload_name("dir/CC ΧΙΟΣ.pdf") == "CC_____.pdf"
+    assert safe_upload_name("ΧΙΟΣ").startswith("upload_")
+
+@pytest.mark.asyncio
+async def test_chunked_writes_progress_and_order(tmp_path):
+    events = []
+    ingestor = UploadIngestor(str(tmp_path), MagicMock(), MagicMock(), chunk_size=4)
+    uploads = [make_upload("a.txt", b"0123456789"), make_upload("b.txt", b"xy"), make_upload("a.txt", b"second")]
+    paths = await ingestor.ingest(uploads, progress=events.append)
+
+    assert [open(p, "rb").read() for p in paths] == [b"0123456789", b"xy", b"second"]
+    assert os.path.basename(paths[0]) == "a.txt" and paths[2] != paths[0] # same name, separate files
+    first = [(e["stage"], e.get("received")) for e in events if e["index"] == 0]
+    assert first == [("receiving", 0), ("receiving", 4), ("receiving", 8), ("receiving", 10), ("done", 10)]
+
+@pytest.mark.asyncio
+async def test_conversions_run_in_parallel_off_the_loop(tmp_path):
+    conversion = MagicMock()
+    def slow_convert(path):
+        time.sleep(0.2)
+        out = path.replace(".docx", ".md")
+        with open(out, "w") as f:
+            f.write("# converted")
+        return out
+    conversion.convert_to_markdown.side_effect = slow_convert
+    ingestor = UploadIngestor(str(tmp_path), conversion, MagicMock(), executor=ThreadPoolExecutor(max_workers=2))
+
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    paths = await ingestor.ingest([make_upload("one.docx", b"a"), make_upload("two.docx", b"b")])
+    elapsed = time.perf_counter() - start
+    ticker_task.cancel()
+
+    assert [os.path.basename(p) for p in paths] == ["one.md", "two.md"]
+    assert elapsed < 0.35 # both conversions overlapped
+    assert ticks >= 5 # the event loop kept running meanwhile
+
+def test_chat_streams_upload_progress_before_the_response():
+    mock_agent = AsyncMock()
+    async def mock_stream(*args, **kwargs):
+        yield {"type": "message", "role": "assistant", "content": "Success"}
+    mock_agent.generate_response_stream = MagicMock(return_value=mock_stream())
+    app.state.agent = mock_agent
+    app.dependency_overrides[get_user] = lambda: "testuser"
+    try:
+        response = TestClient(app).post("/chat", data={"message": "hello"}, files=[("file", ("notes.txt", b"abc", "text/plain"))])
+    finally:
+        app.dependency_overrides.clear()
+
+    events = [json.loads(line[6:]) for line in response.text.splitlines() if line.startswith("data: {")]
+    stages = [e["stage"] for e in events if e["type"] == "upload_progress"]
+    assert stages[0] == "receiving" and stages[-1] == "done"
+    assert events[-1] == {"type": "message", "role": "assistant", "content": "Success"}
+    assert mock_agent.generate_response_stream.call_args.kwargs["file_paths"][0].endswith("notes.txt")
+
+def test_commands_answered_at_once_do_not_ingest(monkeypatch):
+    ingestor = MagicMock()
+    monkeypatch.setattr("app.routers.chat.UploadIngestor", ingestor)
+    original_agent = app.state.agent
+    app.state.agent = AsyncMock(yolo_mode=False)
+    app.dependency_overrides[get_user] = lambda: "testuser"
+    try:
+        client = TestClient(app)
+        for command in ("/yolo", "/pro", "/help"):
+            response = client.post("/chat", data={"message": command}, files=[("file", ("notes.txt", b"abc", "text/plain"))])
+            assert response.status_code == 200 and "response" in response.json()
+    finally:
+        app.dependency_overrides.clear()
+        app.state.agent = original_agent
+    assert not ingestor.called
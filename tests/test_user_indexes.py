@@ -0,0 +1,68 @@
+import json
+import bcrypt
+import pytest
+from app.services.user_manager import UserManager
+
+@pytest.fixture(autouse=True)
+def cheap_bcrypt(monkeypatch):
+    gensalt = bcrypt.gensalt
+    monkeypatch.setattr(bcrypt, "gensalt", lambda rounds=4, prefix=b"2b": gensalt(4, prefix))
+
+@pytest.fixture
+def um(tmp_path, monkeypatch):
+    monkeypatch.delenv("USERS_FILE", raising=False)
+    monkeypatch.delenv("PATTERN_INDEX_KEY_FILE", raising=False)
+    return UserManager(working_dir=str(tmp_path))
+
+def test_wallet_index_follows_changes(um, tmp_path):
+    um.register_user("alice", "pw", wallet="0xABC")
+    um.register_user("bob", "pw")
+    assert um.get_user_by_wallet("0xabc") == "alice"
+
+    um.set_wallet_address("alice", "0xDEF")
+    assert um.get_user_by_wallet("0xabc") is None and um.get_user_by_wallet("0xdef") == "alice"
+    um.set_wallet_address("bob", "0xdef") # a shared address resolves to its first owner, as the scan did
+    um.remove_user("alice")
+    assert um.get_user_by_wallet("0xdef") == "bob"
+    assert UserManager(working_dir=str(tmp_path)).get_user_by_wallet("0xDEF") == "bob"
+
+def test_credential_index_follows_changes(um, tmp_path):
+    um.register_user("alice", "pw")
+    um.register_user("bob", "pw")
+    um.add_passkey("alice", "cred-a", "key-a")
+    um.add_passkey("bob", "cred-b", "key-b", sign_count=3)
+    user, pk = um.get_user_by_credential_id("cred-b")
+    assert user == "bob" and pk is um.get_passkeys("bob")[0]
+
+    um.remove_user("bob")
+    assert um.get_user_by_credential_id("cred-b") == (None, None)
+    reloaded = UserManager(working_dir=str(tmp_path))
+    assert reloaded.get_user_by_credential_id("cred-a")[0] == "alice"
+    reloaded.clear_all_users()
+    assert reloaded.get_user_by_credential_id("cred-a") == (None, None)
+
+@pytest.mark.asyncio
+async def test_sign_count_updates_are_batched(um, tmp_path):
+    um.register_user("alice", "pw")
+    um.add_passkey("alice", "cred-a", "key-a")
+    writes = um.get_metrics()["writes"]
+
+    for count in range(1, 11):
+        assert um.update_passkey_sign_count("alice", "cred-a", count)
+    metrics = um.get_metrics()
+    assert metrics["writes"] == writes and metrics["pending"] # nothing written yet
+    assert json.loads((tmp_path / "users.json").read_text())["alice"]["passkeys"][0]["sign_count"] == 0
+
+    await um.aclose()
+    assert um.get_metrics()["writes"] == writes + 1
+    assert json.loads((tmp_path / "users.json").read_text())["alice"]["passkeys"][0]["sign_count"] == 10
+
+@pytest.mark.asyncio
+async def test_account_changes_are_written_at_once(um, tmp_path):
+    um.register_user("alice", "pw")
+    um.add_passkey("alice", "cred-a", "key-a")
+    um.update_passkey_sign_count("alice", "cred-a", 5)
+    um.update_role("alice", "admin") # carries the pending sign count along
+    saved = json.loads((tmp_path / "users.json").read_text())["alice"]
+    assert saved["role"] == "admin" and saved["passkeys"][0]["sign_count"] == 5
+    assert not um.get_metrics()["pending"]
@@ -7,7 +7,6 @@ def test_user_settings_interactive_mode(tmp_path):
     # Use a temporary file for sessions
     session_file = tmp_path / "user_sessions.json"
     agent = GeminiAgent(working_dir=str(tmp_path))
-    agent.session_file = str(session_file)
     
     user_id = "test_user"
     
@@ -33,7 +32,6 @@ def test_user_settings_copy_formatted(tmp_path):
     # Use a temporary file for sessions
     session_file = tmp_path / "user_sessions.json"
     agent = GeminiAgent(working_dir=str(tmp_path))
-    agent.session_file = str(session_file)
     
     user_id = "test_user"
     
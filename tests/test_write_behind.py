@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+import pytest
+from app.services.write_behind import WriteBehindJSON, atomic_write, atomic_write_json
+from app.services.llm_service import GeminiAgent
+
+def test_sync_context_writes_immediately(tmp_path):
+    path = tmp_path / "data.json"
+    data = {"a": 1}
+    store = WriteBehindJSON(str(path), lambda: data)
+    store.mark_dirty()
+    assert json.loads(path.read_text()) == {"a": 1}
+    assert not store.dirty
+
+@pytest.mark.asyncio
+async def test_burst_is_coalesced_into_one_write(tmp_path):
+    path = tmp_path / "data.json"
+    data = {}
+    store = WriteBehindJSON(str(path), lambda: data, delay=0.02, max_delay=1)
+    for i in range(50):
+        data[str(i)] = i
+        store.mark_dirty()
+    assert not path.exists()
+    await asyncio.sleep(0.1)
+    assert json.loads(path.read_text())["49"] == 49
+    assert store.counters["writes"] == 1
+    assert store.counters["changes"] == 50
+
+@pytest.mark.asyncio
+async def test_max_delay_bounds_continuous_changes(tmp_path):
+    path = tmp_path / "data.json"
+    data = {"n": 0}
+    store = WriteBehindJSON(str(path), lambda: data, delay=0.05, max_delay=0.1)
+    for i in range(15):
+        data["n"] = i
+        store.mark_dirty()
+        await asyncio.sleep(0.02)
+    # Changes never paused for `delay`, yet the max delay forced writes
+    assert path.exists()
+    assert store.counters["writes"] >= 1
+    await store.aclose()
+    assert json.loads(path.read_text())["n"] == 14
+
+@pytest.mark.asyncio
+async def test_aclose_flushes_pending_and_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "data.json"
+    data = {"k": "v"}
+    store = WriteBehindJSON(str(path), lambda: data, delay=10, max_delay=10)
+    store.mark_dirty()
+    await store.aclose()
+    assert json.loads(path.read_text()) == {"k": "v"}
+    assert os.listdir(tmp_path) == ["data.json"]
+
+@pytest.mark.asyncio
+async def test_agent_settings_persist_after_close(tmp_path):
+    agent = GeminiAgent(working_dir=str(tmp_path))
+    agent.update_user_settings("u1", {"default_model": "m"})
+    await agent.session_store.aclose()
+    agent2 = GeminiAgent(working_dir=str(tmp_path))
+    assert agent2.get_user_settings("u1")["default_model"] == "m"
+
+def test_atomic_write_keeps_mode_and_cleans_up(tmp_path):
+    path = tmp_path / "sub" / "data.json"
+    atomic_write_json(str(path), {"a": 1}, indent=4)
+    assert json.loads(path.read_text()) == {"a": 1}
+    assert os.stat(path).st_mode & 0o777 == 0o600 # new files are private
+
+    os.chmod(path, 0o644)
+    atomic_write_json(str(path), {"a": 2})
+    assert os.stat(path).st_mode & 0o777 == 0o644 # an existing file keeps its permissions
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path)) as f:
+            f.write("{partial")
+            raise RuntimeError("boom")
+    assert json.loads(path.read_text()) == {"a": 2}
+    assert os.listdir(path.parent) == ["data.json"]